@@ -0,0 +1,123 @@
+"""
+Throughput vs latency of batched Whisper decoding on CPU.
+
+A burst of utterances (the e2e WAV fixtures, repeated) is submitted to an
+ASRBatchScheduler at once for every max batch size, and compared against
+decoding them one by one with WhisperModel.transcribe. Reports utterances per
+second, realtime factor and p50/p95 per-request latency.
+
+Usage:
+    python -m benchmarks.e2e_bench --make-fixtures   # once, renders the WAVs
+    python -m benchmarks.asr_batch_bench --utterances 32
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from benchmarks.e2e_bench import load_manifest
+from src.capture_utils import load_wav
+
+
+def load_utterances(fixture_dir, count):
+    audios = [
+        load_wav(os.path.join(fixture_dir, entry["file"])).astype(np.float32) / 32768.0
+        for entry in load_manifest(fixture_dir)
+    ]
+    return [audios[i % len(audios)] for i in range(count)]
+
+
+def summarize(name, latencies, wall, audio_sec):
+    latencies = sorted(latencies)
+    result = {
+        "name": name,
+        "utterances_per_sec": len(latencies) / wall,
+        "rtf": wall / audio_sec,
+        "p50_latency_sec": latencies[len(latencies) // 2],
+        "p95_latency_sec": latencies[max(int(len(latencies) * 0.95) - 1, 0)],
+    }
+    print(
+        f"{name:<12} {result['utterances_per_sec']:6.2f} utt/s  "
+        f"RTF {result['rtf']:.3f}  p50 {result['p50_latency_sec']:.2f}s  "
+        f"p95 {result['p95_latency_sec']:.2f}s"
+    )
+    return result
+
+
+def run_sequential(model, audios, beam_size):
+    latencies = []
+    start = time.perf_counter()
+    for audio in audios:
+        segments, _ = model.transcribe(audio, beam_size=beam_size)
+        list(segments)
+        latencies.append(time.perf_counter() - start)
+    return latencies, time.perf_counter() - start
+
+
+def run_batched(model, audios, beam_size, batch_size, window):
+    from src.asr_utils import ASRBatchScheduler
+
+    scheduler = ASRBatchScheduler(
+        model, max_batch_size=batch_size, batch_window_sec=window, max_latency_sec=60
+    )
+    start = time.perf_counter()
+    futures = [scheduler.submit(audio, beam_size=beam_size) for audio in audios]
+    latencies = []
+    for future in futures:
+        future.result()
+        latencies.append(time.perf_counter() - start)
+    wall = time.perf_counter() - start
+    scheduler.close()
+    return latencies, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched ASR benchmark")
+    parser.add_argument("--fixtures", default="benchmarks/data/e2e")
+    parser.add_argument("--whisper", default="distil-small.en")
+    parser.add_argument("--compute_type", default="int8")
+    parser.add_argument("--threads", type=int, default=0, help="CPU threads (0=auto)")
+    parser.add_argument("--utterances", type=int, default=32)
+    parser.add_argument("--beam_size", type=int, default=5)
+    parser.add_argument("--batch_sizes", default="1,2,4,8,16")
+    parser.add_argument("--window", type=float, default=0.05)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    from faster_whisper import WhisperModel
+
+    model = WhisperModel(
+        args.whisper,
+        device="cpu",
+        compute_type=args.compute_type,
+        cpu_threads=args.threads,
+    )
+    audios = load_utterances(args.fixtures, args.utterances)
+    audio_sec = sum(len(a) for a in audios) / 16000
+    print(f"{len(audios)} utterances, {audio_sec:.1f}s of audio")
+
+    # warm up both paths so the first timed run doesn't pay for it
+    run_sequential(model, audios[:1], args.beam_size)
+    run_batched(model, audios[:2], args.beam_size, 2, 0)
+
+    results = [
+        summarize(
+            "sequential", *run_sequential(model, audios, args.beam_size), audio_sec
+        )
+    ]
+    for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+        latencies, wall = run_batched(
+            model, audios, args.beam_size, batch_size, args.window
+        )
+        results.append(summarize(f"batch {batch_size}", latencies, wall, audio_sec))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
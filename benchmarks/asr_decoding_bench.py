@@ -0,0 +1,176 @@
+"""
+Word error rate and latency of the Whisper decoding modes.
+
+Every utterance in benchmarks/data/asr (short commands, questions and
+follow-ups, with the silence a VAD recording keeps around them) is decoded
+with each mode:
+
+    beam              beam_size=5 on the whole recording (the previous default)
+    greedy            trimmed, greedy only
+    adaptive          trimmed, greedy with the beam search fallback
+    adaptive+context  adaptive, prompted with the previous exchange
+
+and the corpus WER, mean/p50/p95 decode latency and fallback rate are printed.
+
+Usage:
+    # render the fixtures with Kokoro (once)
+    python -m benchmarks.asr_decoding_bench --make-fixtures
+    python -m benchmarks.asr_decoding_bench --whisper small --output asr_results.json
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+
+import numpy as np
+
+from benchmarks.e2e_bench import load_manifest
+from src.asr_utils import AdaptiveDecoder, trim_silence
+from src.capture_utils import load_wav
+
+RATE = 16000
+MODES = ["beam", "greedy", "adaptive", "adaptive+context"]
+
+
+def make_fixtures(fixture_dir, voice):
+    """Render every manifest entry to a 16kHz WAV with silence around it"""
+    import soundfile as sf
+    from kokoro import KPipeline
+
+    pipeline = KPipeline(lang_code="a")
+    for entry in load_manifest(fixture_dir):
+        audio = np.concatenate(
+            [
+                np.asarray(result.audio)
+                for result in pipeline(entry["text"], voice=voice)
+            ]
+        )
+        # 24kHz -> 16kHz
+        duration = len(audio) / 24000
+        target = np.linspace(0, duration, int(duration * RATE), endpoint=False)
+        audio = np.interp(target, np.arange(len(audio)) / 24000, audio)
+        # pre-speech buffer before, the VAD's inactivity timeout after
+        audio = np.concatenate(
+            [np.zeros(int(RATE * 0.3)), audio, np.zeros(int(RATE * 1.5))]
+        )
+        path = os.path.join(fixture_dir, entry["file"])
+        sf.write(path, audio.astype(np.float32), RATE, subtype="PCM_16")
+        print(f"Wrote {path} ({len(audio) / RATE:.1f}s)")
+
+
+def normalize(text):
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def edit_distance(reference, hypothesis):
+    """Word-level Levenshtein distance"""
+    row = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        previous, row[0] = row[0], i
+        for j, hyp_word in enumerate(hypothesis, 1):
+            previous, row[j] = row[j], min(
+                row[j] + 1, row[j - 1] + 1, previous + (ref_word != hyp_word)
+            )
+    return row[-1]
+
+
+def decode(model, decoder, mode, audio, context):
+    if mode == "beam":
+        segments, _ = model.transcribe(audio, beam_size=5)
+        return " ".join(segment.text for segment in segments)
+    if mode == "greedy":
+        trimmed, _ = trim_silence(audio, RATE)
+        segments, _ = model.transcribe(trimmed, beam_size=1, temperature=0.0)
+        return " ".join(segment.text for segment in segments)
+    prompt = context if mode == "adaptive+context" else None
+    segments, _, _ = decoder.decode(audio, initial_prompt=prompt)
+    return " ".join(segment.text for segment in segments)
+
+
+def run_mode(model, mode, fixtures):
+    decoder = AdaptiveDecoder(model, rate=RATE)
+    errors = words = 0
+    latencies = []
+    rows = []
+    for entry, audio in fixtures:
+        start = time.perf_counter()
+        text = decode(model, decoder, mode, audio, entry.get("context"))
+        latency = time.perf_counter() - start
+        reference = normalize(entry["text"])
+        distance = edit_distance(reference, normalize(text))
+        errors += distance
+        words += len(reference)
+        latencies.append(latency)
+        rows.append(
+            {
+                "file": entry["file"],
+                "text": text.strip(),
+                "errors": distance,
+                "sec": latency,
+            }
+        )
+
+    latencies.sort()
+    decoded = sum(decoder.stats.values())
+    result = {
+        "mode": mode,
+        "wer": errors / words,
+        "mean_sec": sum(latencies) / len(latencies),
+        "p50_sec": latencies[len(latencies) // 2],
+        "p95_sec": latencies[max(int(len(latencies) * 0.95) - 1, 0)],
+        "fallback_rate": decoder.stats["fallback"] / decoded if decoded else None,
+        "utterances": rows,
+    }
+    fallback = (
+        f"{result['fallback_rate']:.0%}" if result["fallback_rate"] is not None else "-"
+    )
+    print(
+        f"{mode:<17} WER {result['wer']:6.1%}  mean {result['mean_sec']:.3f}s  "
+        f"p50 {result['p50_sec']:.3f}s  p95 {result['p95_sec']:.3f}s  "
+        f"fallback {fallback}"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Whisper decoding mode benchmark")
+    parser.add_argument(
+        "--fixtures", default=os.path.join(os.path.dirname(__file__), "data", "asr")
+    )
+    parser.add_argument("--make-fixtures", action="store_true")
+    parser.add_argument("--voice", default="af_heart")
+    parser.add_argument("--whisper", default="small")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    if args.make_fixtures:
+        make_fixtures(args.fixtures, args.voice)
+        return
+
+    from faster_whisper import WhisperModel
+
+    model = WhisperModel(
+        args.whisper,
+        device=args.device,
+        compute_type="float16" if args.device == "cuda" else "float32",
+    )
+    fixtures = [
+        (entry, load_wav(os.path.join(args.fixtures, entry["file"])) / 32768.0)
+        for entry in load_manifest(args.fixtures)
+    ] * args.repeat
+    fixtures = [(entry, audio.astype(np.float32)) for entry, audio in fixtures]
+    # warm up so the first mode doesn't pay for initialization
+    list(model.transcribe(fixtures[0][1], beam_size=1)[0])
+
+    results = [run_mode(model, mode, fixtures) for mode in MODES]
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Offline end-to-end latency benchmark of the voice loop.
+
+WAV fixtures (wake word followed by a question) are fed to AudioInputProcessor
+through a WavFileSource, the LLM is a local fake Ollama server with a
+configurable token rate and playback goes to a NullSink. For every fixture the
+benchmark records:
+
+    wake_to_speech_start        wake word detected -> VAD speech start
+    speech_end_to_transcript    recording finished -> transcript ready
+    transcript_to_first_token   transcript ready   -> first LLM token
+    first_token_to_first_audio  first LLM token    -> first synthesized sample
+
+Usage:
+    # render the fixtures in benchmarks/data/e2e with Kokoro (once)
+    python -m benchmarks.e2e_bench --make-fixtures
+    python -m benchmarks.e2e_bench --output e2e_results.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.fake_ollama import FakeOllamaServer
+from src.capture_utils import WavFileSource
+from src.playback_utils import NullSink
+
+STAGES = [
+    "wake_to_speech_start",
+    "speech_end_to_transcript",
+    "transcript_to_first_token",
+    "first_token_to_first_audio",
+]
+
+
+def load_manifest(fixture_dir):
+    with open(os.path.join(fixture_dir, "manifest.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def make_fixtures(fixture_dir, voice):
+    """Render every manifest entry to a 16kHz WAV with Kokoro"""
+    import soundfile as sf
+    from kokoro import KPipeline
+
+    pipeline = KPipeline(lang_code="a")
+    rate = 16000
+
+    def render(text):
+        audio = np.concatenate(
+            [np.asarray(result.audio) for result in pipeline(text, voice=voice)]
+        )
+        # 24kHz -> 16kHz
+        duration = len(audio) / 24000
+        target = np.linspace(0, duration, int(duration * rate), endpoint=False)
+        return np.interp(target, np.arange(len(audio)) / 24000, audio)
+
+    for entry in load_manifest(fixture_dir):
+        silence = np.zeros(int(rate * 1.0))
+        pause = np.zeros(int(rate * 0.4))
+        audio = np.concatenate(
+            [silence, render(entry["wakeword"]), pause, render(entry["text"])]
+        )
+        path = os.path.join(fixture_dir, entry["file"])
+        sf.write(path, audio.astype(np.float32), rate, subtype="PCM_16")
+        print(f"Wrote {path} ({len(audio) / rate:.1f}s)")
+
+
+def git_version():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def timed_stream(chunks, marks):
+    """Pass chunks through, noting when the first one arrives"""
+    for chunk in chunks:
+        marks.setdefault("first_token", time.perf_counter())
+        yield chunk
+
+
+def run_fixture(
+    entry, fixture_dir, source, input_processor, llm_processor, output_processor, args
+):
+    sink = output_processor.sink
+    sink.reset()
+
+    source.play(os.path.join(fixture_dir, entry["file"]))
+    if not input_processor.wait_for_wakeword(max_wait=args.max_wait):
+        print(f"{entry['file']}: wake word not detected")
+        return {"fixture": entry["file"], "error": "wake word not detected"}
+    marks = {"wake": time.perf_counter()}
+
+    if args.streaming_asr:
+        recorded_audio, transcript = input_processor.record_and_transcribe(
+            inactivity_sec=args.inactivity
+        )
+        marks["speech_end"] = input_processor.recording_end_time
+    else:
+        recorded_audio = input_processor.record_with_vad(inactivity_sec=args.inactivity)
+        marks["speech_end"] = time.perf_counter()
+        transcript = input_processor.transcribe_audio(recorded_audio)
+    marks["transcript"] = time.perf_counter()
+
+    starts = [t for kind, t in input_processor.vad_events if kind == "start"]
+    if starts:
+        marks["speech_start"] = starts[0]
+    if not transcript:
+        print(f"{entry['file']}: empty transcript")
+        return {"fixture": entry["file"], "error": "empty transcript"}
+
+    reply = output_processor.speak_stream(
+        timed_stream(llm_processor.chat_stream(transcript), marks)
+    )
+    marks["first_audio"] = sink.first_audio_time
+
+    def span(start, end):
+        if marks.get(start) is None or marks.get(end) is None:
+            return None
+        return marks[end] - marks[start]
+
+    result = {
+        "fixture": entry["file"],
+        "expected": entry["text"],
+        "transcript": transcript,
+        "reply": reply,
+        "audio_sec": len(recorded_audio) / input_processor.RATE,
+        "wake_to_speech_start": span("wake", "speech_start"),
+        "speech_end_to_transcript": span("speech_end", "transcript"),
+        "transcript_to_first_token": span("transcript", "first_token"),
+        "first_token_to_first_audio": span("first_token", "first_audio"),
+    }
+    print(
+        f"{entry['file']}: "
+        + "  ".join(
+            (
+                f"{stage} {result[stage]:.3f}s"
+                if result[stage] is not None
+                else f"{stage} n/a"
+            )
+            for stage in STAGES
+        )
+    )
+    return result
+
+
+def summarize(results):
+    summary = {}
+    for stage in STAGES:
+        values = [r[stage] for r in results if r.get(stage) is not None]
+        if values:
+            summary[stage] = {
+                "mean": statistics.mean(values),
+                "median": statistics.median(values),
+                "max": max(values),
+            }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end latency benchmark")
+    parser.add_argument("--fixtures", default="benchmarks/data/e2e")
+    parser.add_argument("--make-fixtures", action="store_true")
+    parser.add_argument("--wakeword", default="./drama_voice.onnx")
+    parser.add_argument("--whisper", default="distil-small.en")
+    parser.add_argument("--voice", default="af_heart")
+    parser.add_argument("--token-rate", type=float, default=20.0)
+    parser.add_argument("--inactivity", type=float, default=1.5)
+    parser.add_argument("--max-wait", type=float, default=15.0)
+    parser.add_argument("--streaming_asr", action="store_true")
+    parser.add_argument("--output", default="e2e_results.json")
+    args = parser.parse_args()
+
+    if args.make_fixtures:
+        make_fixtures(args.fixtures, args.voice)
+        return
+
+    # imported here so --make-fixtures only needs Kokoro
+    from src.input_utils import AudioInputProcessor
+    from src.output_utils import AudioOutputProcessor
+    from src.llm_utils import LLMProcessor
+    from src.drama_instruct import DRAMA_SYSTEM_PROMPT
+    from src.startup_utils import StartupTimer
+
+    server = FakeOllamaServer(token_rate=args.token_rate).start()
+    timer = StartupTimer()
+    source = WavFileSource(realtime=True)
+    input_processor = AudioInputProcessor(
+        wakeword_model_path=args.wakeword,
+        whisper_model_size=args.whisper,
+        timer=timer,
+        audio_source=source,
+    )
+    output_processor = AudioOutputProcessor(
+        voice=args.voice, cache_dir=None, timer=timer, sink=NullSink()
+    )
+    llm_processor = LLMProcessor(host=server.url)
+
+    # make sure every model is loaded before timing anything
+    for loader in timer.loaders:
+        loader.wait()
+    timer.report()
+
+    results = []
+    for entry in load_manifest(args.fixtures):
+        # every fixture starts a fresh conversation
+        llm_processor.reset_history()
+        llm_processor.add_system_prompt(DRAMA_SYSTEM_PROMPT)
+        results.append(
+            run_fixture(
+                entry,
+                args.fixtures,
+                source,
+                input_processor,
+                llm_processor,
+                output_processor,
+                args,
+            )
+        )
+
+    report = {
+        "version": git_version(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": vars(args),
+        "results": results,
+        "summary": summarize(results),
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
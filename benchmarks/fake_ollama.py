@@ -0,0 +1,215 @@
+"""
+Minimal stand-in for the Ollama HTTP API, for exercising the LLM code paths
+without a real model.
+
+Structured-output requests (the termination and action checks) are answered
+with simple keyword rules, plain chat requests stream a canned reply at a
+configurable token rate.
+
+Usage:
+    python -m benchmarks.fake_ollama --port 11435 --token-rate 20
+    python main.py --ollama_host http://localhost:11435
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = (
+    "Bruh... that's a great question. Honestly, I'd have to think about it. "
+    "But here's the short version: it depends!"
+)
+
+
+def decide_action(text):
+    text = text.lower()
+    if any(word in text for word in ("play", "song", "music")):
+        return "play_music"
+    if any(word in text for word in ("see", "holding", "look", "photo", "picture")):
+        return "capture_image_and_describe"
+    return "text_response"
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/ps":
+            self._send_json({"models": self.server.loaded_models()})
+        elif self.path == "/api/tags":
+            self._send_json({"models": []})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        self.server.requests.append((self.path, request))
+
+        if self.path == "/api/chat":
+            self._chat(request)
+        elif self.path == "/api/generate":
+            self.server.touch(request.get("model", ""))
+            self._send_json(self.server.final_message(request, "", key="response"))
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def _chat(self, request):
+        server = self.server
+        server.touch(request.get("model", ""))
+        messages = request.get("messages", [])
+        user_text = messages[-1]["content"] if messages else ""
+        # classification prompts wrap the user message in <message> tags
+        wrapped = re.search(r"<message>(.*?)</message>", user_text, re.S)
+        if wrapped:
+            user_text = wrapped.group(1).strip()
+        schema = request.get("format")
+
+        if schema:
+            properties = (
+                schema.get("properties", {}) if isinstance(schema, dict) else {}
+            )
+            if "should_terminate_conversation" in properties:
+                terminate = any(w in user_text.lower() for w in ("bye", "that's all"))
+                content = json.dumps({"should_terminate_conversation": terminate})
+            elif "action" in properties:
+                content = json.dumps({"action": decide_action(user_text)})
+            else:
+                content = json.dumps({key: "" for key in properties})
+            time.sleep(server.classify_delay)
+            self._send_json(server.final_message(request, content))
+            return
+
+        tokens = server.reply.split(" ")
+        tokens = [token + " " for token in tokens[:-1]] + tokens[-1:]
+        if not request.get("stream", True):
+            time.sleep(len(tokens) / server.token_rate)
+            self._send_json(server.final_message(request, "".join(tokens)))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for token in tokens:
+                time.sleep(1 / server.token_rate)
+                part = server.message(request, token, done=False)
+                self._write_chunk(json.dumps(part).encode() + b"\n")
+            final = server.final_message(request, "")
+            self._write_chunk(json.dumps(final).encode() + b"\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # the client cancelled the request (e.g. a cancelled speculative call)
+            server.cancelled += 1
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        reply=DEFAULT_REPLY,
+        token_rate=50.0,
+        classify_delay=0.0,
+    ):
+        super().__init__((host, port), FakeOllamaHandler)
+        self.reply = reply
+        self.token_rate = token_rate
+        self.classify_delay = classify_delay
+        self.requests = []
+        self.cancelled = 0
+        self.models = {}
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def touch(self, model):
+        self.models[model] = time.time()
+
+    def loaded_models(self):
+        return [{"name": name, "model": name} for name in self.models]
+
+    def message(self, request, content, done):
+        return {
+            "model": request.get("model", ""),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "message": {"role": "assistant", "content": content},
+            "done": done,
+        }
+
+    def final_message(self, request, content, key="message"):
+        payload = self.message(request, content, done=True)
+        if key != "message":
+            payload.pop("message")
+            payload[key] = content
+        payload.update(
+            {
+                "done_reason": "stop",
+                "total_duration": 0,
+                "load_duration": 0,
+                "prompt_eval_count": sum(
+                    len(m.get("content", "").split())
+                    for m in request.get("messages", [])
+                ),
+                "prompt_eval_duration": 0,
+                "eval_count": len(self.reply.split()),
+                "eval_duration": int(len(self.reply.split()) / self.token_rate * 1e9),
+            }
+        )
+        return payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama HTTP server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument(
+        "--token-rate", type=float, default=20.0, help="Tokens per second"
+    )
+    parser.add_argument("--reply", default=DEFAULT_REPLY)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(args.host, args.port, args.reply, args.token_rate)
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
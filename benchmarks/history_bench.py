@@ -0,0 +1,78 @@
+"""
+Prompt evaluation cost per turn as a conversation grows, against a real Ollama.
+
+Plays a scripted multi-turn conversation twice, once with the token-budgeted
+ConversationHistory and once with it effectively disabled (never folding, the
+full history is resent every turn), and prints how many prompt tokens Ollama
+evaluated and how long that took on every turn.
+
+Usage:
+    python -m benchmarks.history_bench --turns 40 --llm llama3.2
+"""
+
+import argparse
+import json
+
+from src.drama_instruct import DRAMA_SYSTEM_PROMPT
+from src.llm_utils import LLMProcessor
+
+QUESTIONS = [
+    "My name is Sam and I live in Melbourne. What's a good weekend activity here?",
+    "Tell me a short story about a lighthouse keeper.",
+    "What did I say my name was?",
+    "Explain how a refrigerator works in a few sentences.",
+    "Give me three ideas for a birthday present for my sister, she likes hiking.",
+    "Which of those would you pick and why?",
+    "What's the difference between weather and climate?",
+    "Summarize what we've talked about so far.",
+]
+
+
+def run(llm, num_ctx, turns, budgeted):
+    processor = LLMProcessor(default_model=llm, num_ctx=num_ctx, router="local")
+    processor.add_system_prompt(DRAMA_SYSTEM_PROMPT)
+    if not budgeted:
+        processor.history.fold_at = float("inf")
+        processor.history.budget = float("inf")
+
+    rows = []
+    for turn in range(turns):
+        question = QUESTIONS[turn % len(QUESTIONS)]
+        processor.chat(question)
+        tokens, seconds = processor.last_prompt_eval or (None, None)
+        rows.append({"turn": turn + 1, "prompt_tokens": tokens, "prompt_sec": seconds})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conversation history benchmark")
+    parser.add_argument("--llm", default="llama3.2")
+    parser.add_argument("--num_ctx", type=int, default=4096)
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    for name, budgeted in [("budgeted", True), ("full history", False)]:
+        print(f"--- {name} ---")
+        results[name] = run(args.llm, args.num_ctx, args.turns, budgeted)
+
+    print(f"{'turn':>4}  {'budgeted':>20}  {'full history':>20}")
+    for a, b in zip(results["budgeted"], results["full history"]):
+        cells = [
+            (
+                f"{r['prompt_tokens']:>6} tok {r['prompt_sec'] * 1000:7.0f}ms"
+                if r["prompt_tokens"] is not None
+                else "n/a"
+            )
+            for r in (a, b)
+        ]
+        print(f"{a['turn']:>4}  {cells[0]:>20}  {cells[1]:>20}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Offline accuracy and latency benchmark for the local intent router against the
+LLM termination/action prompts it replaces.
+
+Usage:
+    python -m benchmarks.intent_router_bench
+    python -m benchmarks.intent_router_bench --skip-llm
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+from src.intent_router import IntentRouter, ACTIONS
+
+
+def load_examples(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(name, decide, examples):
+    """Run decide(text) -> action over the examples and summarize accuracy/latency"""
+    latencies = []
+    correct = 0
+    confusion = {a: {b: 0 for b in ACTIONS} for a in ACTIONS}
+    for example in examples:
+        start = time.perf_counter()
+        predicted = decide(example["text"])
+        latencies.append(time.perf_counter() - start)
+        if predicted == example["action"]:
+            correct += 1
+        if predicted in ACTIONS:
+            confusion[example["action"]][predicted] += 1
+
+    latencies.sort()
+    result = {
+        "name": name,
+        "accuracy": correct / len(examples),
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "confusion": confusion,
+    }
+    print(
+        f"{name:<22} accuracy {result['accuracy']:.1%}  "
+        f"mean {result['mean_ms']:.2f}ms  p50 {result['p50_ms']:.2f}ms  "
+        f"p95 {result['p95_ms']:.2f}ms"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Intent router benchmark")
+    parser.add_argument("--data", default="benchmarks/data/intents.jsonl")
+    parser.add_argument("--llm", default="llama3.2", help="LLM model for the prompts")
+    parser.add_argument(
+        "--skip-llm", action="store_true", help="Only benchmark the local router"
+    )
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    examples = load_examples(args.data)
+    print(f"Loaded {len(examples)} labelled examples")
+
+    results = []
+    router = IntentRouter()
+    results.append(
+        evaluate("local (no fallback)", lambda t: router.route(t)[0], examples)
+    )
+
+    if not args.skip_llm:
+        # imported here so the local-only run needs neither Ollama nor the tools
+        from src.llm_utils import LLMProcessor
+
+        processor = LLMProcessor(default_model=args.llm, router="local")
+        fallbacks = []
+
+        def routed(text):
+            action, _, source = processor.router.route(text)
+            fallbacks.append(source == "llm")
+            return action
+
+        results.append(evaluate("local + llm fallback", routed, examples))
+        print(f"  llm fallback rate {sum(fallbacks) / len(fallbacks):.1%}")
+        results.append(evaluate("llm prompts", processor.llm_decide_action, examples))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Realtime factor of the Kokoro TTS backends on CPU, per voice.
+
+Every voice renders the same replies (a short acknowledgement, a typical
+sentence and a long multi-sentence answer) with each backend:
+
+    torch       KPipeline on PyTorch (the default backend)
+    onnx        the ONNX export with onnxruntime
+    onnx-int8   the ONNX export with int8 weights (quantized once, next to it)
+
+and the mean realtime factor (synthesis seconds per second of audio, below 1
+is faster than realtime), the p95 RTF and the time to the first chunk of audio
+are printed. Every reply is rendered once before timing, so the first run
+does not pay for warm-up and the ONNX backend's phoneme cache is as warm as in
+a conversation.
+
+Usage:
+    python -m benchmarks.tts_rtf_bench --voices af_heart,am_michael --threads 4
+    python -m benchmarks.tts_rtf_bench --backends onnx,onnx-int8 --output tts_results.json
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from src.tts_onnx import load_onnx_pipeline
+
+RATE = 24000
+TEXTS = [
+    "Sure thing.",
+    "The weather in Melbourne today is mild, with a light breeze in the afternoon.",
+    "A refrigerator moves heat from the inside to the outside. A refrigerant "
+    "evaporates in the coils inside, absorbing heat, and a compressor pumps it "
+    "outside, where it condenses and releases that heat into the room. That "
+    "cycle repeats as long as the thermostat asks for it.",
+]
+
+
+def load_backend(backend, args):
+    if backend == "torch":
+        import torch
+        from kokoro import KPipeline
+
+        torch.set_num_threads(args.threads)
+        return KPipeline(lang_code="a", device="cpu")
+    return load_onnx_pipeline(
+        args.onnx_model,
+        args.onnx_voices,
+        voice=args.voices.split(",")[0],
+        threads=args.threads,
+        int8=backend == "onnx-int8",
+    )
+
+
+def render(pipeline, text, voice):
+    """(seconds of synthesis, seconds to the first chunk, seconds of audio)"""
+    start = time.perf_counter()
+    first = None
+    samples = 0
+    for _, _, audio in pipeline(text, voice=voice):
+        if audio is None:
+            continue
+        if first is None:
+            first = time.perf_counter() - start
+        samples += len(audio)
+    return time.perf_counter() - start, first, samples / RATE
+
+
+def run(pipeline, backend, voice, repeat):
+    for text in TEXTS:
+        render(pipeline, text, voice)
+    rtfs, firsts = [], []
+    compute = audio = 0.0
+    for _ in range(repeat):
+        for text in TEXTS:
+            sec, first, audio_sec = render(pipeline, text, voice)
+            rtfs.append(sec / audio_sec)
+            firsts.append(first)
+            compute += sec
+            audio += audio_sec
+    result = {
+        "backend": backend,
+        "voice": voice,
+        "rtf": compute / audio,
+        "p95_rtf": float(np.percentile(rtfs, 95)),
+        "first_audio_sec": float(np.mean(firsts)),
+        "audio_sec": audio,
+    }
+    print(
+        f"{voice:<12} {backend:<10} RTF {result['rtf']:.3f}  "
+        f"p95 {result['p95_rtf']:.3f}  first audio {result['first_audio_sec']:.3f}s"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kokoro TTS backend benchmark")
+    parser.add_argument("--voices", default="af_heart")
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8")
+    parser.add_argument("--onnx_model", default="./kokoro-v1.0.onnx")
+    parser.add_argument("--onnx_voices", default="./voices-v1.0.bin")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    for backend in args.backends.split(","):
+        pipeline = load_backend(backend, args)
+        for voice in args.voices.split(","):
+            results.append(run(pipeline, backend, voice, args.repeat))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+CPU cost of the batched wakeword engine per second of audio.
+
+Runs N streams of room-noise silence and of the e2e WAV fixtures through a
+WakewordEngine with and without the energy gate, and reports the CPU seconds
+spent per second of audio together with how many chunks the gate skipped.
+
+Usage:
+    python -m benchmarks.wakeword_bench --streams 1,4,16
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from benchmarks.e2e_bench import load_manifest
+from src.capture_utils import load_wav
+from src.wakeword_utils import CHUNK, WakewordEngine
+
+
+def make_audio(kind, fixture_dir, seconds, rng):
+    if kind == "silence":
+        # low-level room noise, well below the default gate
+        return (rng.standard_normal(seconds * 16000) * 30).astype(np.int16)
+    clips = [
+        load_wav(os.path.join(fixture_dir, entry["file"]))
+        for entry in load_manifest(fixture_dir)
+    ]
+    audio = np.concatenate(clips)
+    return np.resize(audio, seconds * 16000)
+
+
+def run(engine, audios):
+    streams = [engine.add_stream() for _ in audios]
+    engine.stats = {"chunks": 0, "gated": 0, "batches": 0}
+    detections = 0
+    start = time.process_time()
+    for offset in range(0, len(audios[0]) - CHUNK + 1, CHUNK):
+        results = engine.process(
+            [(s, a[offset : offset + CHUNK]) for s, a in zip(streams, audios)]
+        )
+        detections += sum(len(d) for d in results.values())
+    cpu = time.process_time() - start
+    for stream in streams:
+        stream.close()
+    return cpu, detections
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wakeword engine CPU benchmark")
+    parser.add_argument("--fixtures", default="benchmarks/data/e2e")
+    parser.add_argument(
+        "--wakeword", nargs="+", default=["./drama_voice.onnx", "./buddy_voice.onnx"]
+    )
+    parser.add_argument("--streams", default="1,4,16")
+    parser.add_argument("--seconds", type=int, default=30)
+    parser.add_argument("--gate_rms", type=float, default=100.0)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = []
+    for kind in ["silence", "fixtures"]:
+        audio = make_audio(kind, args.fixtures, args.seconds, rng)
+        for n in [int(s) for s in args.streams.split(",")]:
+            for gate_rms in [0.0, args.gate_rms]:
+                engine = WakewordEngine(args.wakeword, gate_rms=gate_rms)
+                cpu, detections = run(engine, [audio] * n)
+                result = {
+                    "audio": kind,
+                    "streams": n,
+                    "gate_rms": gate_rms,
+                    "cpu_per_audio_sec": cpu / (args.seconds * n),
+                    "gated_fraction": engine.stats["gated"] / engine.stats["chunks"],
+                    "detections": detections,
+                }
+                results.append(result)
+                print(
+                    f"{kind:<9} {n:>3} streams  gate {gate_rms:>5.0f}  "
+                    f"{result['cpu_per_audio_sec'] * 1000:7.2f} ms CPU per audio s  "
+                    f"gated {result['gated_fraction']:.0%}  detections {detections}"
+                )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,166 @@
 from src.input_utils import AudioInputProcessor
 from src.output_utils import AudioOutputProcessor
 from src.llm_utils import LLMProcessor
+from src.llm_async import AsyncLLMProcessor
 from src.drama_instruct import DRAMA_SYSTEM_PROMPT
+from src.startup_utils import StartupTimer, BackgroundLoader
+from src.residency_utils import residency
+from src.trace_utils import tracer
+from src.archive_utils import AudioArchive
+from src.process_utils import (
+    CaptureStage,
+    KokoroStage,
+    WhisperStage,
+    apply_cpu_budget,
+    load_kokoro,
+    load_onnx_kokoro,
+    plan_budgets,
+)
+from src.tools import VISION_MODEL, configure_camera, configure_music, configure_vision
+from src.conversation import run_conversation
+from src.wakeword_utils import WakewordEngine
 import argparse
+from functools import partial
 
 
 def main():
     # Parse command line arguments
     parser = argparse.ArgumentParser(description="Voice Interactive Assistant")
     parser.add_argument(
-        "--wakeword", default="./drama_voice.onnx", help="Path to wakeword model"
+        "--wakeword",
+        nargs="+",
+        default=["./drama_voice.onnx"],
+        help="Path(s) to wakeword models, all scored in one batched pass",
+    )
+    parser.add_argument(
+        "--wakeword_threshold",
+        nargs="+",
+        type=float,
+        default=[0.8],
+        help="Detection threshold, one for all models or one per model",
+    )
+    parser.add_argument(
+        "--wakeword_gate_rms",
+        type=float,
+        default=100.0,
+        help="Skip wakeword inference on chunks quieter than this int16 RMS (0 disables)",
     )
     parser.add_argument(
         "--whisper", default="distil-small.en", help="Whisper model size"
     )
+    parser.add_argument(
+        "--vad",
+        default="streaming",
+        choices=["streaming", "window"],
+        help="VAD mode: stateful per-frame scoring or the sliding-window check",
+    )
+    parser.add_argument(
+        "--vad_backend",
+        default="onnx",
+        choices=["onnx", "torch"],
+        help="Run the bundled Silero VAD with onnxruntime, or fetch it with torch.hub",
+    )
+    parser.add_argument(
+        "--streaming_asr",
+        action="store_true",
+        help="Transcribe while the user is still speaking (requires --vad streaming)",
+    )
+    parser.add_argument(
+        "--asr_decoding",
+        default="adaptive",
+        choices=["adaptive", "beam"],
+        help="Decode greedily with a beam search fallback, or always with beam search",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream LLM tokens into sentence-level TTS and playback",
+    )
+    parser.add_argument(
+        "--barge_in",
+        action="store_true",
+        help="Keep listening while a reply plays and stop it when the user talks over it",
+    )
     parser.add_argument("--llm", default="llama3.2", help="LLM model to use")
+    parser.add_argument(
+        "--ollama_host", default="http://localhost:11434", help="Ollama server URL"
+    )
+    parser.add_argument(
+        "--num_ctx",
+        type=int,
+        default=4096,
+        help="Context size of conversation requests, older turns are summarized to fit",
+    )
+    parser.add_argument(
+        "--keep_alive",
+        default="30m",
+        help="How long Ollama keeps the models loaded after a request",
+    )
+    parser.add_argument(
+        "--async_llm",
+        action="store_true",
+        help="Run the LLM checks concurrently with a speculative reply on one pooled client",
+    )
+    parser.add_argument(
+        "--router",
+        default="local",
+        choices=["local", "llm"],
+        help="Decide termination/tool use locally (LLM only when unsure) or always via the LLM",
+    )
     parser.add_argument("--voice", default="af_heart", help="TTS voice to use")
+    parser.add_argument(
+        "--tts_backend",
+        default="torch",
+        choices=["torch", "onnx"],
+        help="Run Kokoro with PyTorch (KPipeline) or an ONNX export with onnxruntime",
+    )
+    parser.add_argument(
+        "--onnx_model",
+        default="./kokoro-v1.0.onnx",
+        help="ONNX Kokoro model for --tts_backend onnx",
+    )
+    parser.add_argument(
+        "--onnx_voices",
+        default="./voices-v1.0.bin",
+        help="Voice style vectors (npz) for --tts_backend onnx",
+    )
+    parser.add_argument(
+        "--onnx_int8",
+        action="store_true",
+        help="Quantize the ONNX model's weights to int8 (once) and use that",
+    )
+    parser.add_argument(
+        "--tts_cache_dir",
+        default="./tts_cache",
+        help="Directory for cached TTS audio of short phrases ('' to disable)",
+    )
+    parser.add_argument(
+        "--music_library",
+        default=None,
+        help="Play songs from this directory of audio files instead of YouTube Music",
+    )
+    parser.add_argument(
+        "--music_cache",
+        default="./music_cache.json",
+        help="File caching music searches and stream URLs ('' to disable)",
+    )
+    parser.add_argument(
+        "--camera",
+        default="on_demand",
+        choices=["on_demand", "background"],
+        help="Open the camera for each capture, or keep grabbing frames in the background",
+    )
+    parser.add_argument(
+        "--camera_headless",
+        action="store_true",
+        help="Never show a camera preview window",
+    )
+    parser.add_argument(
+        "--camera_countdown",
+        type=float,
+        default=0,
+        help="Seconds of preview countdown before a capture (0 to capture at once)",
+    )
     parser.add_argument(
         "--system_prompt",
         default=DRAMA_SYSTEM_PROMPT,
@@ -27,16 +172,145 @@ def main():
         default=10.0,
         help="Seconds to wait for follow-up speech before returning to wake word mode",
     )
+    parser.add_argument(
+        "--archive_dir",
+        default=None,
+        help="Keep utterances, replies and transcripts in compressed files in this directory",
+    )
+    parser.add_argument(
+        "--archive_format",
+        default="flac",
+        choices=["flac", "opus"],
+        help="Audio format of the archive",
+    )
+    parser.add_argument(
+        "--archive_max_mb",
+        type=float,
+        default=50,
+        help="Size at which archive audio files and the index are rotated",
+    )
+    parser.add_argument(
+        "--processes",
+        action="store_true",
+        help="Run capture/wakeword, ASR and TTS in separate worker processes",
+    )
+    parser.add_argument(
+        "--stage_cpus",
+        nargs="+",
+        default=None,
+        help="Cores per stage with --processes, e.g. main=0 wakeword=1 asr=2-3 tts=4-5",
+    )
+    parser.add_argument(
+        "--trace_file",
+        default=None,
+        help="Append per-turn stage timings (spans) to this JSON lines file",
+    )
+    parser.add_argument(
+        "--metrics_port",
+        type=int,
+        default=None,
+        help="Serve Prometheus-style stage metrics at http://host:PORT/metrics",
+    )
     args = parser.parse_args()
 
-    # Initialize processors
+    # stage tracing costs nothing unless one of the exports is requested
+    if args.trace_file or args.metrics_port:
+        tracer.enable(jsonl_path=args.trace_file, metrics_port=args.metrics_port)
+
+    # Initialize processors, heavy models keep loading in the background
+    # while the wake word listener is already live
+    timer = StartupTimer()
+    whisper_model = pipeline = capture_stage = None
+    if args.processes:
+        # every stage gets its own process, thread pools and cores, audio
+        # moves between them through shared memory
+        budgets = plan_budgets(args.stage_cpus)
+        for stage, (threads, cores) in budgets.items():
+            print(f"Stage {stage}: {threads} threads, cores {cores or 'any'}")
+        with timer.track("Capture process"):
+            capture_stage = CaptureStage(
+                args.wakeword,
+                thresholds=args.wakeword_threshold,
+                gate_rms=args.wakeword_gate_rms,
+                budget=budgets["wakeword"],
+            )
+        whisper_model = WhisperStage(args.whisper, budget=budgets["asr"])
+        load_tts = load_kokoro
+        if args.tts_backend == "onnx":
+            load_tts = partial(
+                load_onnx_kokoro, args.onnx_model, args.onnx_voices, args.onnx_int8
+            )
+        pipeline = KokoroStage(voice=args.voice, budget=budgets["tts"], load=load_tts)
+        BackgroundLoader("ASR process", whisper_model.wait_ready, timer)
+        BackgroundLoader("TTS process", pipeline.wait_ready, timer)
+        # after starting the children, they would inherit it
+        apply_cpu_budget(*budgets["main"])
+        wakeword_engine = None
+    else:
+        with timer.track("Wakeword (openWakeWord)"):
+            wakeword_engine = WakewordEngine(
+                args.wakeword,
+                thresholds=args.wakeword_threshold,
+                gate_rms=args.wakeword_gate_rms,
+            )
     input_processor = AudioInputProcessor(
-        wakeword_model_path=args.wakeword, whisper_model_size=args.whisper
+        wakeword_engine=wakeword_engine,
+        whisper_model_size=args.whisper,
+        vad_mode=args.vad,
+        vad_backend=args.vad_backend,
+        timer=timer,
+        whisper_model=whisper_model,
+        asr_decoding=args.asr_decoding,
+        capture_stage=capture_stage,
     )
 
-    output_processor = AudioOutputProcessor(voice=args.voice)
+    archive = None
+    if args.archive_dir:
+        archive = AudioArchive(
+            args.archive_dir,
+            audio_format=args.archive_format,
+            max_file_mb=args.archive_max_mb,
+        )
+    output_processor = AudioOutputProcessor(
+        voice=args.voice,
+        cache_dir=args.tts_cache_dir or None,
+        timer=timer,
+        pipeline=pipeline,
+        archive=archive,
+        tts_backend=args.tts_backend,
+        onnx_model=args.onnx_model,
+        onnx_voices=args.onnx_voices,
+        onnx_int8=args.onnx_int8,
+    )
 
-    llm_processor = LLMProcessor(default_model=args.llm)
+    with timer.track("LLM client and router"):
+        llm_class = AsyncLLMProcessor if args.async_llm else LLMProcessor
+        llm_processor = llm_class(
+            default_model=args.llm,
+            host=args.ollama_host,
+            router=args.router,
+            num_ctx=args.num_ctx,
+        )
+
+    # load the LLM and the vision model with the context sizes every request
+    # will use, so the first turn does not pay for loading them
+    residency.keep_alive = args.keep_alive
+    BackgroundLoader(
+        "Ollama models",
+        lambda: residency.warm(llm_processor.client, [args.llm, VISION_MODEL]),
+        timer,
+    )
+
+    configure_music(args.music_library, args.music_cache or None)
+    # the vision model is warmed up above through the same client
+    configure_vision(llm_processor.client)
+    camera_options = dict(
+        headless=args.camera_headless, countdown=args.camera_countdown
+    )
+    # in the background the camera opens while the rest starts up
+    configure_camera(
+        background=args.camera == "background", timer=timer, **camera_options
+    )
 
     # Add system prompt if provided
     if args.system_prompt:
@@ -45,47 +319,30 @@ def main():
     print("#" * 100)
     print("Interactive voice assistant initialized!")
     print(f"Say the wake word to begin. Using LLM: {args.llm}, Voice: {args.voice}")
+    timer.report("Ready for wake word")
     print("#" * 100)
-
-    wake_word_required = True
+    timer.report_when_ready()
 
     try:
-        while True:
-            if wake_word_required and not input_processor.wait_for_wakeword():
-                print("Waiting for wake word...")
-                continue
-            else:
-                # conversation loop
-                print("Recording speech in conversation mode...")
-                recorded_audio = input_processor.record_with_vad(inactivity_sec=1.5)
-                if recorded_audio.size == 0:
-                    print("No audio recorded. Ending conversation.")
-                    wake_word_required = True
-                    continue
-
-                # if data exists, use it to do transcription
-                transcript = input_processor.transcribe_audio(recorded_audio)
-                if not transcript:
-                    print("Empty transcript. Ending conversation.")
-                    wake_word_required = True
-                    continue
-
-                print(f"User said: '{transcript}'")
-                response = llm_processor.chat(transcript)
-
-                if response == "":
-                    wake_word_required = True
-                    continue
-
-                print(f"Assistant response: '{response}'")
-                output_processor.speak_text(response)
-
-                wake_word_required = False
-
+        run_conversation(
+            input_processor,
+            llm_processor,
+            output_processor,
+            stream=args.stream,
+            streaming_asr=args.streaming_asr,
+            barge_in=args.barge_in,
+        )
     except KeyboardInterrupt:
         print("User Program Termination")
     finally:
         print("Cleaning up resources...")
+        if archive is not None:
+            archive.close()
+        if args.processes:
+            capture_stage.stop()
+            whisper_model.close()
+            pipeline.close()
+        tracer.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,337 @@
+from src.server_utils import VoiceServer, SharedPipeline
+from src.llm_utils import LLMProcessor
+from src.llm_async import AsyncLLMProcessor
+from src.drama_instruct import DRAMA_SYSTEM_PROMPT
+from src.startup_utils import StartupTimer, BackgroundLoader
+from src.residency_utils import residency
+from src.trace_utils import tracer
+from src.archive_utils import AudioArchive
+from src.tools import VISION_MODEL, configure_vision
+from src.wakeword_utils import WakewordEngine
+from ollama import Client
+import argparse
+import asyncio
+
+
+def load_models(args, timer):
+    """Load the one Whisper model and Kokoro pipeline every session shares"""
+    import ctranslate2
+    import numpy as np
+    from faster_whisper import WhisperModel
+    from src.tts_onnx import load_onnx_pipeline
+
+    # torch is only needed for the KPipeline backend, ask CTranslate2 instead
+    device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+    print(f"Using device: {device}")
+
+    with timer.track(f"Whisper ({args.whisper})"):
+        whisper_model = WhisperModel(
+            args.whisper,
+            device=device,
+            compute_type="float16" if device == "cuda" else "float32",
+        )
+        segments, _ = whisper_model.transcribe(
+            np.zeros(16000, dtype=np.float32), beam_size=1
+        )
+        list(segments)
+
+    with timer.track(f"Kokoro TTS ({args.tts_backend})"):
+        if args.tts_backend == "onnx":
+            # onnxruntime sessions take concurrent runs from the TTS workers
+            pipeline = load_onnx_pipeline(
+                args.onnx_model,
+                args.onnx_voices,
+                voice=args.voice,
+                threads=args.tts_workers,
+                int8=args.onnx_int8,
+            )
+        else:
+            import torch
+            from kokoro import KPipeline
+
+            tts_device = "cuda" if torch.cuda.is_available() else "cpu"
+            pipeline = KPipeline(lang_code="a", device=tts_device)
+            for _ in pipeline("Hello.", voice=args.voice):
+                pass
+
+    return whisper_model, pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-session voice assistant server")
+    parser.add_argument("--host", default="0.0.0.0", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port to listen on")
+    parser.add_argument(
+        "--wakeword",
+        nargs="+",
+        default=["./drama_voice.onnx"],
+        help="Path(s) to wakeword models, all scored in one batched pass",
+    )
+    parser.add_argument(
+        "--wakeword_threshold",
+        nargs="+",
+        type=float,
+        default=[0.8],
+        help="Detection threshold, one for all models or one per model",
+    )
+    parser.add_argument(
+        "--wakeword_gate_rms",
+        type=float,
+        default=100.0,
+        help="Skip wakeword inference on chunks quieter than this int16 RMS (0 disables)",
+    )
+    parser.add_argument(
+        "--whisper", default="distil-small.en", help="Whisper model size"
+    )
+    parser.add_argument(
+        "--vad",
+        default="streaming",
+        choices=["streaming", "window"],
+        help="VAD mode: stateful per-frame scoring or the sliding-window check",
+    )
+    parser.add_argument(
+        "--vad_backend",
+        default="onnx",
+        choices=["onnx", "torch"],
+        help="Run the bundled Silero VAD with onnxruntime, or fetch it with torch.hub",
+    )
+    parser.add_argument(
+        "--streaming_asr",
+        action="store_true",
+        help="Transcribe while the user is still speaking (requires --vad streaming)",
+    )
+    parser.add_argument(
+        "--asr_decoding",
+        default="adaptive",
+        choices=["adaptive", "beam"],
+        help="Decode greedily with a beam search fallback, or always with beam search",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream LLM tokens into sentence-level TTS and playback",
+    )
+    parser.add_argument("--llm", default="llama3.2", help="LLM model to use")
+    parser.add_argument(
+        "--ollama_host", default="http://localhost:11434", help="Ollama server URL"
+    )
+    parser.add_argument(
+        "--num_ctx",
+        type=int,
+        default=4096,
+        help="Context size of conversation requests, older turns are summarized to fit",
+    )
+    parser.add_argument(
+        "--keep_alive",
+        default="30m",
+        help="How long Ollama keeps the models loaded after a request",
+    )
+    parser.add_argument(
+        "--async_llm",
+        action="store_true",
+        help="Run the LLM checks concurrently with a speculative reply",
+    )
+    parser.add_argument(
+        "--router",
+        default="local",
+        choices=["local", "llm"],
+        help="Decide termination/tool use locally or always via the LLM",
+    )
+    parser.add_argument("--voice", default="af_heart", help="TTS voice to use")
+    parser.add_argument(
+        "--tts_backend",
+        default="torch",
+        choices=["torch", "onnx"],
+        help="Run Kokoro with PyTorch (KPipeline) or an ONNX export with onnxruntime",
+    )
+    parser.add_argument(
+        "--onnx_model",
+        default="./kokoro-v1.0.onnx",
+        help="ONNX Kokoro model for --tts_backend onnx",
+    )
+    parser.add_argument(
+        "--onnx_voices",
+        default="./voices-v1.0.bin",
+        help="Voice style vectors (npz) for --tts_backend onnx",
+    )
+    parser.add_argument(
+        "--onnx_int8",
+        action="store_true",
+        help="Quantize the ONNX model's weights to int8 (once) and use that",
+    )
+    parser.add_argument(
+        "--tts_cache_dir",
+        default="./tts_cache",
+        help="Directory for cached TTS audio of short phrases ('' to disable)",
+    )
+    parser.add_argument(
+        "--system_prompt",
+        default=DRAMA_SYSTEM_PROMPT,
+        help="System prompt for the LLM",
+    )
+    parser.add_argument(
+        "--asr_workers", type=int, default=1, help="Threads serving Whisper requests"
+    )
+    parser.add_argument(
+        "--tts_workers", type=int, default=1, help="Threads serving Kokoro requests"
+    )
+    parser.add_argument(
+        "--asr_batch_size",
+        type=int,
+        default=1,
+        help="Batch up to this many utterances from different sessions per Whisper pass",
+    )
+    parser.add_argument(
+        "--asr_batch_window",
+        type=float,
+        default=0.05,
+        help="Seconds an utterance may wait for others to join its batch",
+    )
+    parser.add_argument(
+        "--asr_max_latency",
+        type=float,
+        default=2.0,
+        help="Latest an utterance's batch is started, in seconds after it was queued",
+    )
+    parser.add_argument(
+        "--max_sessions", type=int, default=8, help="Maximum concurrent sessions"
+    )
+    parser.add_argument(
+        "--archive_dir",
+        default=None,
+        help="Keep utterances, replies and transcripts in compressed files in this directory",
+    )
+    parser.add_argument(
+        "--archive_format",
+        default="flac",
+        choices=["flac", "opus"],
+        help="Audio format of the archive",
+    )
+    parser.add_argument(
+        "--archive_max_mb",
+        type=float,
+        default=50,
+        help="Size at which archive audio files and the index are rotated",
+    )
+    parser.add_argument(
+        "--trace_file",
+        default=None,
+        help="Append per-turn stage timings (spans) to this JSON lines file",
+    )
+    parser.add_argument(
+        "--metrics_port",
+        type=int,
+        default=None,
+        help="Serve Prometheus-style stage metrics at http://host:PORT/metrics",
+    )
+    args = parser.parse_args()
+
+    # stage tracing costs nothing unless one of the exports is requested
+    if args.trace_file or args.metrics_port:
+        tracer.enable(jsonl_path=args.trace_file, metrics_port=args.metrics_port)
+
+    timer = StartupTimer()
+    whisper_model, pipeline = load_models(args, timer)
+    # one engine scores the wakeword models for all sessions in batches
+    with timer.track("Wakeword (openWakeWord)"):
+        wakeword_engine = WakewordEngine(
+            args.wakeword,
+            thresholds=args.wakeword_threshold,
+            gate_rms=args.wakeword_gate_rms,
+        )
+
+    def make_llm_processor():
+        llm_class = AsyncLLMProcessor if args.async_llm else LLMProcessor
+        llm_processor = llm_class(
+            default_model=args.llm,
+            host=args.ollama_host,
+            router=args.router,
+            num_ctx=args.num_ctx,
+        )
+        if args.system_prompt:
+            llm_processor.add_system_prompt(args.system_prompt)
+        return llm_processor
+
+    # load the LLM and the vision model with the context sizes every request
+    # will use, so no session's first turn pays for loading them
+    residency.keep_alive = args.keep_alive
+    ollama_client = Client(host=args.ollama_host)
+    configure_vision(ollama_client)
+    BackgroundLoader(
+        "Ollama models",
+        lambda: residency.warm(ollama_client, [args.llm, VISION_MODEL]),
+        timer,
+    )
+
+    asr_scheduler = None
+    if args.asr_batch_size > 1:
+        from src.asr_utils import ASRBatchScheduler
+
+        asr_scheduler = ASRBatchScheduler(
+            whisper_model,
+            max_batch_size=args.asr_batch_size,
+            batch_window_sec=args.asr_batch_window,
+            max_latency_sec=args.asr_max_latency,
+        )
+
+    tts_options = {
+        "tts_backend": args.tts_backend,
+        "onnx_model": args.onnx_model,
+        "onnx_int8": args.onnx_int8,
+    }
+    archive = None
+    if args.archive_dir:
+        archive = AudioArchive(
+            args.archive_dir,
+            audio_format=args.archive_format,
+            max_file_mb=args.archive_max_mb,
+        )
+
+    server = VoiceServer(
+        whisper_model,
+        pipeline,
+        make_llm_processor,
+        wakeword_engine=wakeword_engine,
+        vad_mode=args.vad,
+        vad_backend=args.vad_backend,
+        voice=args.voice,
+        tts_cache_dir=args.tts_cache_dir or None,
+        stream=args.stream,
+        streaming_asr=args.streaming_asr,
+        asr_decoding=args.asr_decoding,
+        asr_workers=args.asr_workers,
+        tts_workers=args.tts_workers,
+        max_sessions=args.max_sessions,
+        asr_scheduler=asr_scheduler,
+        archive=archive,
+        tts_options=tts_options,
+    )
+
+    # render the common phrases into the shared cache once, not per session
+    if args.tts_cache_dir:
+        from src.output_utils import AudioOutputProcessor
+        from src.playback_utils import NullSink
+
+        AudioOutputProcessor(
+            voice=args.voice,
+            cache_dir=args.tts_cache_dir,
+            timer=timer,
+            sink=NullSink(),
+            pipeline=SharedPipeline(server.tts_worker),
+            **tts_options,
+        )
+    timer.report("Shared models loaded")
+    timer.report_when_ready()
+
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("Server stopped")
+    finally:
+        if archive is not None:
+            archive.close()
+        tracer.close()
+
+
+if __name__ == "__main__":
+    main()
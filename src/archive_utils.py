@@ -0,0 +1,222 @@
+import glob
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from src.playback_utils import to_int16
+from src.trace_utils import current_turn
+
+# soundfile (format, subtype, extension), Opus only takes 8/12/16/24/48kHz
+FORMATS = {
+    "flac": ("FLAC", "PCM_16", ".flac"),
+    "opus": ("OGG", "OPUS", ".opus"),
+}
+
+
+class AudioArchive:
+    """
+    Keeps the user's utterances and the assistant's replies, with their
+    transcripts, in compressed audio files without slowing the voice loop.
+
+    add() only queues the audio. A writer thread appends the audio of each role
+    to that role's current FLAC (or Opus) file and one JSON line per item to
+    index.jsonl (file, offset, duration, text, turn), writing whatever has
+    queued up in one batch and flushing every flush_sec. The queue is bounded:
+    when the disk falls behind the oldest queued item is dropped instead of
+    blocking the caller. Audio files and the index are rotated once they grow
+    past max_file_mb, and the newest max_files of each kind are kept.
+    """
+
+    def __init__(
+        self,
+        directory,
+        audio_format="flac",
+        max_queued=64,
+        max_file_mb=50,
+        max_files=20,
+        flush_sec=2.0,
+    ):
+        if audio_format not in FORMATS:
+            raise ValueError(f"Unknown archive format: {audio_format}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.format, self.subtype, self.extension = FORMATS[audio_format]
+        self.max_file_bytes = int(max_file_mb * 1024 * 1024)
+        self.max_files = max_files
+        self.flush_sec = flush_sec
+        self.index_path = os.path.join(directory, "index.jsonl")
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.dropped = 0
+        # role -> [SoundFile, path, frames written]
+        self.files = {}
+        self._sequence = itertools.count(1)
+        self.thread = threading.Thread(target=self._write, name="archive", daemon=True)
+        self.thread.start()
+
+    def add(self, role, audio, sample_rate, text=None, **attrs):
+        """Queue audio (int16 or float) for the archive, never blocks"""
+        turn = current_turn()
+        if turn is not None:
+            attrs.setdefault("turn", turn)
+        item = (time.time(), role, audio, sample_rate, text, attrs)
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                pass
+            # the writer is behind, make room by dropping the oldest item
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                continue
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                print(f"Audio archive is falling behind, dropped {self.dropped} items")
+
+    def tagged(self, **attrs):
+        """View of the archive that adds attrs (e.g. session=3) to every item"""
+        return TaggedArchive(self, attrs)
+
+    def close(self):
+        """Write what is queued, then close the files"""
+        while True:
+            try:
+                self.queue.put(None, timeout=1)
+                break
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+        self.thread.join(timeout=10)
+        if self.dropped:
+            print(f"Audio archive dropped {self.dropped} items in total")
+
+    def _write(self):
+        index = open(self.index_path, "a", encoding="utf-8")
+        last_flush = time.monotonic()
+        closing = False
+        try:
+            while not closing:
+                try:
+                    item = self.queue.get(timeout=self.flush_sec)
+                except queue.Empty:
+                    item = ()
+                batch = []
+                if item is None:
+                    closing = True
+                elif item:
+                    batch.append(item)
+                    # everything queued meanwhile goes into the same write
+                    while True:
+                        try:
+                            item = self.queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if item is None:
+                            closing = True
+                            break
+                        batch.append(item)
+
+                try:
+                    lines = [self._append(*item) for item in batch]
+                    index.write("".join(lines))
+                    now = time.monotonic()
+                    if closing or now - last_flush >= self.flush_sec:
+                        last_flush = now
+                        for sound_file, _, _ in self.files.values():
+                            sound_file.flush()
+                        index.flush()
+                    if index.tell() > self.max_file_bytes:
+                        index.close()
+                        index = self._rotate_index()
+                except Exception as e:
+                    # a full disk must not take the voice loop down with it
+                    print(f"Audio archive write failed: {e}")
+        finally:
+            index.close()
+            for sound_file, _, _ in self.files.values():
+                sound_file.close()
+            self.files.clear()
+
+    def _append(self, created, role, audio, sample_rate, text, attrs):
+        """Append one item to its role's file and return its index line"""
+        audio = to_int16(audio)
+        current = self.files.get(role)
+        if (
+            current is None
+            or current[0].samplerate != sample_rate
+            or os.path.getsize(current[1]) > self.max_file_bytes
+        ):
+            current = self._open(role, sample_rate)
+        sound_file, path, frames = current
+        sound_file.write(audio)
+        current[2] = frames + len(audio)
+        entry = {
+            "time": created,
+            "role": role,
+            "file": os.path.basename(path),
+            "start_sec": frames / sample_rate,
+            "duration_sec": len(audio) / sample_rate,
+            "text": text,
+            **attrs,
+        }
+        return json.dumps(entry) + "\n"
+
+    def _open(self, role, sample_rate):
+        import soundfile as sf
+
+        if role in self.files:
+            self.files.pop(role)[0].close()
+        path = self._new_path(role, self.extension)
+        sound_file = sf.SoundFile(
+            path,
+            "w",
+            samplerate=sample_rate,
+            channels=1,
+            format=self.format,
+            subtype=self.subtype,
+        )
+        self.files[role] = [sound_file, path, 0]
+        self._prune(f"{role}-*{self.extension}")
+        return self.files[role]
+
+    def _rotate_index(self):
+        os.replace(self.index_path, self._new_path("index", ".jsonl"))
+        self._prune("index-*.jsonl")
+        return open(self.index_path, "a", encoding="utf-8")
+
+    def _new_path(self, prefix, extension):
+        """Unused file name that sorts by creation time, also within a second"""
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        while True:
+            path = os.path.join(
+                self.directory,
+                f"{prefix}-{stamp}-{next(self._sequence):04d}{extension}",
+            )
+            if not os.path.exists(path):
+                return path
+
+    def _prune(self, pattern):
+        """Delete the oldest files matching pattern beyond max_files"""
+        paths = sorted(glob.glob(os.path.join(self.directory, pattern)))
+        for path in paths[: max(len(paths) - self.max_files, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class TaggedArchive:
+    """AudioArchive view adding the same attributes to every item"""
+
+    def __init__(self, archive, attrs):
+        self.archive = archive
+        self.attrs = attrs
+
+    def add(self, role, audio, sample_rate, text=None, **attrs):
+        self.archive.add(role, audio, sample_rate, text, **self.attrs, **attrs)
@@ -0,0 +1,423 @@
+import threading
+from concurrent.futures import Future
+import time
+import numpy as np
+
+
+def trim_silence(audio, rate=16000, frame_sec=0.02, threshold_db=-35.0, pad_sec=0.15):
+    """
+    Cut the leading and trailing frames of float audio that are threshold_db
+    quieter than its loudest frame, keeping pad_sec around the speech.
+
+    Returns:
+        tuple: (trimmed audio, index of its first sample in audio)
+    """
+    frame = int(rate * frame_sec)
+    frames = len(audio) // frame
+    if frames == 0:
+        return audio, 0
+    rms = np.sqrt(
+        np.mean(np.square(audio[: frames * frame].reshape(frames, frame)), axis=1)
+    )
+    # never treat near-digital silence (about -60 dBFS) as speech
+    threshold = max(rms.max() * 10 ** (threshold_db / 20), 1e-3)
+    voiced = np.flatnonzero(rms > threshold)
+    if voiced.size == 0:
+        return audio, 0
+    pad = int(pad_sec * rate)
+    start = max(voiced[0] * frame - pad, 0)
+    end = min((voiced[-1] + 1) * frame + pad, len(audio))
+    return audio[start:end], start
+
+
+class AdaptiveDecoder:
+    """
+    Greedy-first Whisper decoding with a beam search fallback.
+
+    Silence around the utterance is trimmed and it is decoded greedily at
+    temperature 0. Only when the result looks unreliable (average token log
+    probability below log_prob_threshold, or a segment's compression ratio
+    above compression_ratio_threshold, i.e. repetitive) it is decoded again
+    with beam search. Short commands, most turns, then cost one greedy pass.
+    """
+
+    def __init__(
+        self,
+        whisper_model,
+        rate=16000,
+        beam_size=5,
+        log_prob_threshold=-0.5,
+        compression_ratio_threshold=2.4,
+        trim=True,
+    ):
+        self.whisper_model = whisper_model
+        self.rate = rate
+        self.beam_size = beam_size
+        self.log_prob_threshold = log_prob_threshold
+        self.compression_ratio_threshold = compression_ratio_threshold
+        self.trim = trim
+        self.stats = {"greedy": 0, "fallback": 0}
+
+    def decode(self, audio, initial_prompt=None):
+        """
+        Transcribe float audio.
+
+        Returns:
+            tuple: (segments, info, offset) where segment times are relative to
+            audio[offset:] after trimming
+        """
+        offset = 0
+        if self.trim:
+            audio, offset = trim_silence(audio, self.rate)
+
+        segments, info = self.whisper_model.transcribe(
+            audio, beam_size=1, temperature=0.0, initial_prompt=initial_prompt
+        )
+        segments = list(segments)
+        reason = self.needs_fallback(segments)
+        if reason is None:
+            self.stats["greedy"] += 1
+            return segments, info, offset
+
+        self.stats["fallback"] += 1
+        print(f"Greedy transcript rejected ({reason}), decoding with beam search")
+        segments, info = self.whisper_model.transcribe(
+            audio, beam_size=self.beam_size, initial_prompt=initial_prompt
+        )
+        return list(segments), info, offset
+
+    def needs_fallback(self, segments):
+        """Why the greedy segments should be decoded again, or None"""
+        tokens = sum(len(segment.tokens) for segment in segments)
+        if not tokens:
+            return None
+        avg_logprob = (
+            sum(segment.avg_logprob * len(segment.tokens) for segment in segments)
+            / tokens
+        )
+        if avg_logprob < self.log_prob_threshold:
+            return f"avg_logprob {avg_logprob:.2f}"
+        compression_ratio = max(segment.compression_ratio for segment in segments)
+        if compression_ratio > self.compression_ratio_threshold:
+            return f"compression ratio {compression_ratio:.2f}"
+        return None
+
+
+class StreamingTranscriber:
+    """
+    Transcribes an utterance while it is still being recorded.
+
+    A worker thread re-decodes the audio after the last committed segment every
+    step_sec of new audio. Segments that end more than unstable_sec before the
+    live edge are committed and never decoded again, so once speech ends only
+    the short unstable tail is left for the final decode.
+    """
+
+    def __init__(
+        self,
+        whisper_model,
+        ring,
+        rate=16000,
+        beam_size=5,
+        step_sec=1.0,
+        unstable_sec=2.0,
+        decoder=None,
+    ):
+        self.whisper_model = whisper_model
+        # AdaptiveDecoder to use instead of beam search, if any
+        self.decoder = decoder
+        # conversation context (e.g. the previous reply) that prompts Whisper
+        # until text of the utterance has been committed
+        self.context = None
+        self.ring = ring
+        self.rate = rate
+        self.beam_size = beam_size
+        self.step_samples = int(step_sec * rate)
+        self.unstable_samples = int(unstable_sec * rate)
+        self.active = False
+        self.last_stats = {}
+
+    def start(self, start_index):
+        """Begin transcribing the utterance that starts at sample start_index"""
+        self.utterance_start = start_index
+        self.committed_index = start_index
+        self.committed_text = []
+        self.end_index = start_index
+        self.decoded_end = start_index
+        self.decode_time = 0.0
+        self.decoded_audio = 0.0
+        self._lock = threading.Lock()
+        self._new_audio = threading.Event()
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.active = True
+
+    def update(self, end_index):
+        """Tell the worker that audio up to end_index has been recorded"""
+        with self._lock:
+            self.end_index = end_index
+        if end_index - self.decoded_end >= self.step_samples:
+            self._new_audio.set()
+
+    def finish(self, end_index):
+        """
+        Stop the worker, decode what is left after the committed segments and
+        return the full transcript.
+        """
+        speech_end_time = time.perf_counter()
+        self._stop.set()
+        self._new_audio.set()
+        self.thread.join()
+        self.active = False
+
+        final_start = time.perf_counter()
+        tail_text, _ = self._decode(self.committed_index, end_index)
+        final_decode = time.perf_counter() - final_start
+
+        transcript = " ".join(self.committed_text + tail_text).strip()
+
+        # A batch call would decode the whole utterance after speech ends, estimate
+        # its cost from the realtime factor measured on the incremental decodes
+        total_audio = (end_index - self.utterance_start) / self.rate
+        rtf = self.decode_time / self.decoded_audio if self.decoded_audio else 0.0
+        estimated_batch = total_audio * rtf
+        latency = time.perf_counter() - speech_end_time
+        self.last_stats = {
+            "audio_sec": total_audio,
+            "committed_sec": (self.committed_index - self.utterance_start) / self.rate,
+            "final_decode_sec": final_decode,
+            "latency_sec": latency,
+            "estimated_batch_sec": estimated_batch,
+            "saved_sec": max(estimated_batch - latency, 0.0),
+        }
+        print(
+            f"Streaming ASR: {latency:.2f}s after end of speech "
+            f"(final decode {final_decode:.2f}s), estimated batch {estimated_batch:.2f}s, "
+            f"saved {self.last_stats['saved_sec']:.2f}s"
+        )
+        return transcript
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._new_audio.wait()
+            self._new_audio.clear()
+            if self._stop.is_set():
+                break
+
+            with self._lock:
+                end = self.end_index
+            if end - self.decoded_end < self.step_samples:
+                continue
+
+            _, segments = self._decode(self.committed_index, end)
+            self.decoded_end = end
+
+            stable_until = end - self.unstable_samples
+            for _, seg_end, text in segments:
+                if seg_end > stable_until:
+                    break
+                self.committed_text.append(text)
+                self.committed_index = seg_end
+
+    def _decode(self, start, end):
+        """Decode samples [start, end), returning texts and absolute segment bounds"""
+        if end - start <= 0:
+            return [], []
+
+        audio = self.ring.view(start, end).astype(np.float32) / 32768.0
+        prompt = " ".join(self.committed_text)[-200:] or self.context
+
+        t0 = time.perf_counter()
+        if self.decoder is not None:
+            segments, _, offset = self.decoder.decode(audio, initial_prompt=prompt)
+            start_offset = start + offset
+        else:
+            segments, _ = self.whisper_model.transcribe(
+                audio, beam_size=self.beam_size, initial_prompt=prompt
+            )
+            start_offset = start
+        results = []
+        for segment in segments:
+            seg_start = start_offset + int(segment.start * self.rate)
+            seg_end = min(start_offset + int(segment.end * self.rate), end)
+            results.append((seg_start, seg_end, segment.text.strip()))
+        self.decode_time += time.perf_counter() - t0
+        self.decoded_audio += (end - start) / self.rate
+
+        return [text for _, _, text in results], results
+
+
+class ASRBatchScheduler:
+    """
+    Decodes utterances submitted from many threads in batches.
+
+    Requests wait until max_batch_size of them are pending, the oldest has
+    waited batch_window_sec, or waiting any longer would make a request miss
+    its max_latency_sec given the measured batch decode time. A batch is
+    encoded and decoded in one pass through the faster-whisper model.
+    """
+
+    def __init__(
+        self,
+        whisper_model,
+        max_batch_size=8,
+        batch_window_sec=0.05,
+        max_latency_sec=2.0,
+        language="en",
+    ):
+        from faster_whisper.tokenizer import Tokenizer
+
+        self.whisper_model = whisper_model
+        self.max_batch_size = max_batch_size
+        self.batch_window_sec = batch_window_sec
+        self.max_latency_sec = max_latency_sec
+        self.tokenizer = Tokenizer(
+            whisper_model.hf_tokenizer,
+            whisper_model.model.is_multilingual,
+            task="transcribe",
+            language=language,
+        )
+        # measured decode seconds per batched utterance, used for the deadline
+        self.sec_per_item = 0.0
+        self.pending = []
+        self.cond = threading.Condition()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name="asr-batch", daemon=True)
+        self.thread.start()
+
+    def submit(self, audio, beam_size=5, initial_prompt=None, max_latency_sec=None):
+        """Queue float32 16kHz audio, returns a Future for its transcript"""
+        now = time.perf_counter()
+        request = {
+            "audio": audio,
+            "beam_size": beam_size,
+            "prompt": initial_prompt,
+            "arrival": now,
+            "deadline": now + (max_latency_sec or self.max_latency_sec),
+            "future": Future(),
+        }
+        with self.cond:
+            if self.closed:
+                raise RuntimeError("ASR batch scheduler is closed")
+            self.pending.append(request)
+            self.cond.notify_all()
+        return request["future"]
+
+    def transcribe(self, audio, beam_size=5, initial_prompt=None, max_latency_sec=None):
+        return self.submit(audio, beam_size, initial_prompt, max_latency_sec).result()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.thread.join()
+
+    def _next_batch(self):
+        """Wait for a batch to become due, None once closed and drained"""
+        with self.cond:
+            while True:
+                if not self.pending:
+                    if self.closed:
+                        return None
+                    self.cond.wait()
+                    continue
+
+                now = time.perf_counter()
+                due = min(
+                    self.pending[0]["arrival"] + self.batch_window_sec,
+                    min(r["deadline"] for r in self.pending)
+                    - self.sec_per_item * min(len(self.pending), self.max_batch_size),
+                )
+                if (
+                    len(self.pending) >= self.max_batch_size
+                    or now >= due
+                    or self.closed
+                ):
+                    break
+                self.cond.wait(due - now)
+
+            # one batch shares the beam size of the oldest request
+            beam_size = self.pending[0]["beam_size"]
+            batch = [r for r in self.pending if r["beam_size"] == beam_size][
+                : self.max_batch_size
+            ]
+            self.pending = [r for r in self.pending if r not in batch]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            start = time.perf_counter()
+            try:
+                texts = self.decode_batch(
+                    [r["audio"] for r in batch],
+                    batch[0]["beam_size"],
+                    [r["prompt"] for r in batch],
+                )
+            except Exception as e:
+                for r in batch:
+                    r["future"].set_exception(e)
+                continue
+            elapsed = time.perf_counter() - start
+            self.sec_per_item = 0.8 * self.sec_per_item + 0.2 * elapsed / len(batch)
+            for r, text in zip(batch, texts):
+                r["future"].set_result(text)
+
+    def decode_batch(self, audios, beam_size=5, prompts=None):
+        """Transcribe a list of float32 utterances in one encoder/decoder pass"""
+        from faster_whisper.audio import pad_or_trim
+        from faster_whisper.transcribe import get_suppressed_tokens
+
+        model = self.whisper_model
+        prompts = prompts or [None] * len(audios)
+        texts = [None] * len(audios)
+
+        # the encoder sees 30s windows, longer utterances take the regular path
+        max_samples = model.feature_extractor.n_samples
+        batched = [i for i, audio in enumerate(audios) if len(audio) <= max_samples]
+        for i in range(len(audios)):
+            if i not in batched:
+                segments, _ = model.transcribe(
+                    audios[i], beam_size=beam_size, initial_prompt=prompts[i]
+                )
+                texts[i] = " ".join(s.text.strip() for s in segments).strip()
+        if not batched:
+            return texts
+
+        features = np.stack(
+            [pad_or_trim(model.feature_extractor(audios[i])[..., :-1]) for i in batched]
+        )
+        encoder_output = model.encode(features)
+        results = model.model.generate(
+            encoder_output,
+            [
+                model.get_prompt(
+                    self.tokenizer,
+                    (
+                        self.tokenizer.encode(" " + prompts[i].strip())
+                        if prompts[i]
+                        else []
+                    ),
+                    without_timestamps=True,
+                )
+                for i in batched
+            ],
+            beam_size=beam_size,
+            max_length=model.max_length,
+            suppress_blank=True,
+            suppress_tokens=get_suppressed_tokens(self.tokenizer, [-1]),
+            return_scores=True,
+            return_no_speech_prob=True,
+        )
+        for i, result in zip(batched, results):
+            tokens = result.sequences_ids[0]
+            # same silence rule as faster-whisper's no_speech_threshold
+            avg_logprob = result.scores[0] * len(tokens) / (len(tokens) + 1)
+            if result.no_speech_prob > 0.6 and avg_logprob < -1.0:
+                texts[i] = ""
+            else:
+                texts[i] = self.tokenizer.decode(tokens).strip()
+        return texts
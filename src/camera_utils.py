@@ -0,0 +1,167 @@
+import threading
+import time
+
+
+class CameraService:
+    """
+    Camera frames for the vision tool, without temporary files.
+
+    With start() a background thread keeps reading the camera, so a capture is
+    just the latest frame and the camera has already settled its exposure.
+    Without it every capture opens the camera, drops a few warm-up frames and
+    releases it again. Frames are downscaled to the vision model's input size
+    and JPEG-encoded in memory, ready to be sent to Ollama as bytes.
+    """
+
+    def __init__(
+        self,
+        device=0,
+        input_size=896,
+        jpeg_quality=85,
+        headless=False,
+        warmup_frames=5,
+    ):
+        self.device = device
+        self.input_size = input_size
+        self.jpeg_quality = jpeg_quality
+        self.headless = headless
+        self.warmup_frames = warmup_frames
+        self.frame = None
+        self.frame_time = 0.0
+        self.cap = None
+        self.thread = None
+        self.running = False
+        self.lock = threading.Lock()
+        self.new_frame = threading.Condition(self.lock)
+
+    def start(self):
+        """Keep the camera open and grab frames in the background"""
+        if self.thread is not None:
+            return
+        self.cap = self._open()
+        self.running = True
+        self.thread = threading.Thread(target=self._grab, name="camera", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+        with self.lock:
+            self.frame = None
+
+    def latest_frame(self, timeout=2.0):
+        """The newest frame, waiting for the first one if needed"""
+        if self.thread is None:
+            return self._read_once()
+        with self.new_frame:
+            if self.frame is None:
+                self.new_frame.wait(timeout)
+            return self.frame
+
+    def capture(self, countdown=0):
+        """JPEG bytes of a frame taken now, or after a countdown; None if cancelled"""
+        # the preview needs a stream of frames, keep the camera open for it
+        opened = countdown > 0 and not self.headless and self.thread is None
+        if opened:
+            self.start()
+        try:
+            if countdown > 0 and not self._countdown(countdown):
+                return None
+            frame = self.latest_frame()
+        finally:
+            if opened:
+                self.stop()
+        if frame is None:
+            raise Exception("Could not read from video device")
+        return self.encode(frame)
+
+    def encode(self, frame):
+        """Downscale frame to fit input_size and JPEG-encode it in memory"""
+        import cv2
+
+        height, width = frame.shape[:2]
+        scale = self.input_size / max(height, width)
+        if scale < 1:
+            frame = cv2.resize(
+                frame,
+                (round(width * scale), round(height * scale)),
+                interpolation=cv2.INTER_AREA,
+            )
+        ok, buffer = cv2.imencode(
+            ".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]
+        )
+        if not ok:
+            raise Exception("Could not encode the captured image")
+        return buffer.tobytes()
+
+    def _open(self):
+        import cv2
+
+        cap = cv2.VideoCapture(self.device)
+        if not cap.isOpened():
+            raise Exception("Could not open video device")
+        return cap
+
+    def _grab(self):
+        while self.running:
+            ret, frame = self.cap.read()
+            if not ret:
+                time.sleep(0.05)
+                continue
+            with self.new_frame:
+                self.frame = frame
+                self.frame_time = time.time()
+                self.new_frame.notify_all()
+
+    def _read_once(self):
+        cap = self._open()
+        try:
+            frame = None
+            # the first frames are often dark while auto-exposure settles
+            for _ in range(self.warmup_frames + 1):
+                ret, latest = cap.read()
+                if ret:
+                    frame = latest
+            return frame
+        finally:
+            cap.release()
+
+    def _countdown(self, seconds):
+        """Show a preview with a countdown (or just wait when headless)"""
+        if self.headless:
+            print(f"Capturing in {seconds} seconds...")
+            time.sleep(seconds)
+            return True
+
+        import cv2
+
+        try:
+            start_time = time.time()
+            while (elapsed := time.time() - start_time) < seconds:
+                frame = self.latest_frame()
+                if frame is None:
+                    continue
+                frame = frame.copy()
+                remaining = max(int(seconds - elapsed) + 1, 0)
+                cv2.putText(
+                    frame,
+                    f"{remaining}",
+                    (50, 50),
+                    cv2.FONT_HERSHEY_SCRIPT_SIMPLEX,
+                    1.5,
+                    (0, 255, 0),
+                    4,
+                    cv2.LINE_AA,
+                )
+                cv2.imshow("Camera Preview", frame)
+                # Allow early exit by pressing 'q'
+                if cv2.waitKey(30) & 0xFF == ord("q"):
+                    return False
+            return True
+        finally:
+            cv2.destroyAllWindows()
@@ -0,0 +1,224 @@
+import threading
+import time
+import numpy as np
+
+
+class AudioRingBuffer:
+    """
+    Preallocated int16 ring buffer addressed by absolute sample index.
+
+    The writer appends whole chunks, readers keep their own cursor and read
+    slices by index. The capacity is a multiple of the chunk size, so
+    chunk-aligned reads never wrap and come back as views into the buffer.
+    """
+
+    def __init__(self, chunk_size, num_chunks):
+        self.chunk_size = chunk_size
+        self.num_chunks = num_chunks
+        self.capacity = chunk_size * num_chunks
+        self.buffer = np.zeros(self.capacity, dtype=np.int16)
+        # capture time (time.time()) of the end of every chunk slot
+        self.timestamps = np.zeros(num_chunks, dtype=np.float64)
+        self.write_index = 0  # total samples written so far
+        self.closed = False
+        self.cond = threading.Condition()
+
+    @property
+    def oldest_index(self):
+        """Smallest sample index that has not been overwritten yet"""
+        return max(self.write_index - self.capacity, 0)
+
+    def write(self, samples, timestamp=None):
+        """Append samples (at most one chunk at a time) and wake up waiting readers"""
+        timestamp = time.time() if timestamp is None else timestamp
+        n = len(samples)
+        with self.cond:
+            start = self.write_index % self.capacity
+            first = min(n, self.capacity - start)
+            self.buffer[start : start + first] = samples[:first]
+            if first < n:
+                self.buffer[: n - first] = samples[first:]
+            self.write_index += n
+            slot = ((self.write_index - 1) // self.chunk_size) % self.num_chunks
+            self.timestamps[slot] = timestamp
+            self.cond.notify_all()
+
+    def close(self):
+        """Stop the buffer, waking readers so they can exit"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def wait_for(self, index, timeout=None):
+        """Block until the sample at index - 1 has been written, False on timeout/close"""
+        with self.cond:
+            return self.cond.wait_for(
+                lambda: self.write_index >= index or self.closed, timeout
+            ) and (self.write_index >= index)
+
+    def view(self, start, end):
+        """
+        Return samples [start, end), as a view when the range does not wrap.
+        Callers that keep the data beyond the ring's capacity should copy it.
+        """
+        if start < self.oldest_index or end > self.write_index:
+            raise IndexError(
+                f"Samples [{start}, {end}) not in buffer "
+                f"[{self.oldest_index}, {self.write_index})"
+            )
+        s = start % self.capacity
+        e = s + (end - start)
+        if e <= self.capacity:
+            return self.buffer[s:e]
+        return np.concatenate((self.buffer[s:], self.buffer[: e - self.capacity]))
+
+    def time_of(self, index):
+        """Capture timestamp of the chunk holding sample index"""
+        return self.timestamps[(index // self.chunk_size) % self.num_chunks]
+
+
+class AudioCapture:
+    """Background thread that reads chunks from an audio source into a ring buffer"""
+
+    def __init__(self, source, ring, chunk_size):
+        self.source = source
+        self.ring = ring
+        self.chunk_size = chunk_size
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.ring.close()
+        if self.thread.is_alive():
+            self.thread.join(timeout=1)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                data = self.source.read(self.chunk_size, exception_on_overflow=False)
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                print(f"Error reading audio source: {e}")
+                time.sleep(0.01)
+                continue
+
+            if not data:
+                # finite sources (e.g. files) signal the end with an empty read
+                break
+            self.ring.write(np.frombuffer(data, dtype=np.int16), time.time())
+        self.ring.close()
+
+
+class WavFileSource:
+    """
+    Audio source that plays queued WAV files (or int16 arrays) instead of a mic.
+
+    It produces silence while nothing is queued and, in realtime mode, paces
+    reads like a live device, so it can stand in for the PyAudio stream.
+    """
+
+    def __init__(self, rate=16000, realtime=True):
+        self.rate = rate
+        self.realtime = realtime
+        self.pending = []
+        self.lock = threading.Lock()
+        self.closed = False
+        self._next_time = None
+
+    def play(self, audio):
+        """Queue a WAV path or int16 array for playback after what is already queued"""
+        if isinstance(audio, str):
+            audio = load_wav(audio, self.rate)
+        with self.lock:
+            self.pending.append(np.asarray(audio, dtype=np.int16))
+
+    @property
+    def idle(self):
+        with self.lock:
+            return not self.pending
+
+    def read(self, num_frames, exception_on_overflow=False):
+        if self.closed:
+            return b""
+
+        if self.realtime:
+            now = time.perf_counter()
+            if self._next_time is None:
+                self._next_time = now
+            self._next_time += num_frames / self.rate
+            if self._next_time > now:
+                time.sleep(self._next_time - now)
+
+        out = np.zeros(num_frames, dtype=np.int16)
+        filled = 0
+        with self.lock:
+            while self.pending and filled < num_frames:
+                current = self.pending[0]
+                take = min(len(current), num_frames - filled)
+                out[filled : filled + take] = current[:take]
+                filled += take
+                if take == len(current):
+                    self.pending.pop(0)
+                else:
+                    self.pending[0] = current[take:]
+        return out.tobytes()
+
+    def stop_stream(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+def load_wav(path, rate=16000):
+    """Read an audio file as mono int16 at the given sample rate"""
+    import soundfile as sf
+
+    audio, file_rate = sf.read(path, dtype="float32", always_2d=True)
+    audio = audio.mean(axis=1)
+    if file_rate != rate:
+        duration = len(audio) / file_rate
+        target = np.linspace(0, duration, int(duration * rate), endpoint=False)
+        audio = np.interp(target, np.arange(len(audio)) / file_rate, audio)
+    return np.int16(np.clip(audio, -1.0, 1.0) * 32767)
+
+
+class PushAudioSource:
+    """
+    Audio source fed with raw int16 PCM bytes by someone else (e.g. a network
+    connection). read() blocks until enough audio has been pushed.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.cond = threading.Condition()
+        self.closed = False
+
+    def feed(self, data):
+        with self.cond:
+            self.buffer.extend(data)
+            self.cond.notify_all()
+
+    def read(self, num_frames, exception_on_overflow=False):
+        num_bytes = num_frames * 2
+        with self.cond:
+            self.cond.wait_for(lambda: len(self.buffer) >= num_bytes or self.closed)
+            if len(self.buffer) < num_bytes:
+                return b""
+            data = bytes(self.buffer[:num_bytes])
+            del self.buffer[:num_bytes]
+            return data
+
+    def stop_stream(self):
+        self.close()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
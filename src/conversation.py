@@ -0,0 +1,120 @@
+from src.duplex_utils import BargeInMonitor, EchoGate
+from src.tools import duck_music
+from src.trace_utils import tracer
+
+
+def run_conversation(
+    input_processor,
+    llm_processor,
+    output_processor,
+    stream=False,
+    streaming_asr=False,
+    barge_in=False,
+):
+    """
+    Wake word -> record -> transcribe -> LLM -> speak loop.
+
+    After a reply the next turn is recorded without the wake word, until the user
+    stays silent, says nothing useful or asks to end the conversation. Returns
+    when the audio source has been closed. With barge_in the mic is monitored
+    while the reply plays, and talking over it starts the next turn at once.
+    Utterances and replies go to the output processor's archive, if it has one.
+    """
+    wake_word_required = True
+    if barge_in:
+        input_processor.echo_gate = EchoGate(
+            getattr(output_processor.sink, "reference", None),
+            rate=input_processor.RATE,
+        )
+
+    while True:
+        # background music stays ducked while the assistant listens or speaks
+        duck_music(not wake_word_required)
+        if wake_word_required and not input_processor.wait_for_wakeword():
+            if input_processor.ring.closed:
+                print("Audio source closed. Leaving conversation loop.")
+                return
+            print("Waiting for wake word...")
+            continue
+        else:
+            duck_music(True)
+            # one turn: recording, transcription, reply and playback
+            with tracer.turn(follow_up=not wake_word_required):
+                if wake_word_required:
+                    tracer.record("wakeword", **input_processor.wakeword_stats)
+                wake_word_required = run_turn(
+                    input_processor,
+                    llm_processor,
+                    output_processor,
+                    stream,
+                    streaming_asr,
+                    barge_in,
+                )
+
+
+def run_turn(
+    input_processor,
+    llm_processor,
+    output_processor,
+    stream,
+    streaming_asr,
+    barge_in=False,
+):
+    """Record, transcribe, reply and speak once, returns whether the wake word is needed next"""
+    print("Recording speech in conversation mode...")
+    # the last exchange helps Whisper with names and follow-up questions
+    context = llm_processor.asr_context()
+    if streaming_asr:
+        recorded_audio, transcript = input_processor.record_and_transcribe(
+            inactivity_sec=1.5, prompt=context
+        )
+    else:
+        recorded_audio = input_processor.record_with_vad(inactivity_sec=1.5)
+    if recorded_audio.size == 0:
+        print("No audio recorded. Ending conversation.")
+        return True
+
+    # if data exists, use it to do transcription
+    if not streaming_asr:
+        transcript = input_processor.transcribe_audio(recorded_audio, prompt=context)
+    if not transcript:
+        print("Empty transcript. Ending conversation.")
+        return True
+
+    print(f"User said: '{transcript}'")
+    if output_processor.archive is not None:
+        output_processor.archive.add(
+            "user", recorded_audio, input_processor.RATE, text=transcript
+        )
+    monitor = None
+    interrupt = None
+    if barge_in:
+        monitor = BargeInMonitor(
+            input_processor, output_processor.sink, input_processor.echo_gate
+        ).start()
+        interrupt = monitor.interrupted
+    try:
+        if stream:
+            response = output_processor.speak_stream(
+                llm_processor.chat_stream(transcript), interrupt=interrupt
+            )
+        else:
+            response = llm_processor.chat(transcript)
+            if response != "":
+                print(f"Assistant response: '{response}'")
+                output_processor.speak_text(response, interrupt=interrupt)
+    finally:
+        if monitor is not None:
+            monitor.stop()
+
+    if monitor is not None and monitor.interrupted.is_set():
+        # record the speech that interrupted the reply, from its onset
+        input_processor.rewind_to(monitor.onset_index)
+        return False
+    if response == "":
+        return True
+    if stream:
+        print(f"Assistant response: '{response}'")
+    # don't treat our own reply, still in the capture buffer, as speech
+    input_processor.flush_mic_stream()
+    return False
@@ -0,0 +1,135 @@
+import threading
+import time
+import numpy as np
+from src.trace_utils import tracer
+
+
+class EchoGate:
+    """
+    Keeps the assistant's own voice, picked up by the mic, away from the VAD
+    and the wakeword model.
+
+    A mic chunk captured while audio was playing is only passed on if it is
+    clearly louder (margin) than the echo expected from the playback level,
+    otherwise it is replaced with silence. The expected echo is the playback
+    level times the speaker-to-mic coupling, learned from the gated chunks.
+    """
+
+    def __init__(
+        self,
+        reference,
+        rate=16000,
+        margin=2.5,
+        coupling=1.0,
+        tail_sec=0.25,
+        adapt=0.05,
+    ):
+        # PlaybackReference of the output sink, None when playback isn't heard
+        # locally (e.g. server sessions), then the gate is always open
+        self.reference = reference
+        self.rate = rate
+        self.margin = margin
+        # start high and let it adapt down, an underestimate lets echo through
+        self.coupling = coupling
+        self.tail_sec = tail_sec
+        self.adapt = adapt
+
+    def filter(self, chunk, capture_time):
+        """chunk, or silence if it is explained by the playback's echo"""
+        if self.reference is None:
+            return chunk
+        chunk_sec = len(chunk) / self.rate
+        # output and input latency plus the room's reverb tail
+        playing = self.reference.level(
+            capture_time - chunk_sec - self.tail_sec, capture_time
+        )
+        if playing <= 0:
+            return chunk
+        level = float(np.sqrt(np.mean(np.square(chunk, dtype=np.float64))))
+        if level > self.margin * self.coupling * playing:
+            return chunk
+        self.coupling += self.adapt * (level / playing - self.coupling)
+        return np.zeros_like(chunk)
+
+
+class BargeInMonitor:
+    """
+    Listens to the mic while the assistant speaks.
+
+    Echo-gated chunks go through the streaming VAD and the wakeword model; as
+    soon as either fires, playback is cleared (it stops after the sink's
+    current block), interrupted is set so synthesis stops, and onset_index
+    marks where the user's speech begins in the ring buffer for recording.
+    """
+
+    def __init__(self, input_processor, sink, echo_gate, use_wakeword=True):
+        self.input_processor = input_processor
+        self.sink = sink
+        self.echo_gate = echo_gate
+        self.use_wakeword = use_wakeword
+        self.interrupted = threading.Event()
+        self.onset_index = None
+        self._stop = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="barge-in", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+
+    def _run(self):
+        processor = self.input_processor
+        ring = processor.ring
+        chunk_size = processor.CHUNK
+        # wait for the models here rather than in the caller, playback goes on
+        vad = processor.vad
+        vad.reset()
+        live = ring.write_index
+        start = live - live % chunk_size
+        index = start
+        while not self._stop.is_set():
+            if not ring.wait_for(index + chunk_size, timeout=0.05):
+                if ring.closed:
+                    return
+                continue
+            chunk = ring.view(index, index + chunk_size)
+            capture_time = ring.time_of(index + chunk_size - 1)
+            index += chunk_size
+            gated = self.echo_gate.filter(chunk, capture_time)
+
+            onset = None
+            # with a CaptureStage the wakeword is scored in its process, on ungated audio
+            wakeword = (
+                self.use_wakeword
+                and processor.wakeword is not None
+                and bool(processor.wakeword.predict(gated))
+            )
+            if wakeword:
+                # the request follows the wake word, record from here
+                processor.wakeword.reset()
+                onset = index
+            else:
+                for kind, sample_index in vad.process(gated):
+                    if kind == "start":
+                        onset = start + sample_index
+            if onset is None:
+                continue
+
+            detect_time = time.perf_counter()
+            self.onset_index = onset
+            self.interrupted.set()
+            self.sink.clear()
+            tracer.record(
+                "barge_in",
+                time.perf_counter() - detect_time,
+                # from the end of the chunk that triggered it to playback cleared
+                detection_delay_sec=time.time() - capture_time,
+                wakeword=wakeword,
+            )
+            print("User started speaking, stopping playback.")
+            return
@@ -0,0 +1,156 @@
+import threading
+
+SUMMARY_PROMPT = """
+Summarize the earlier part of a conversation between a user and a voice assistant.
+Keep names, facts about the user, preferences, decisions and anything still unresolved.
+Reply with the summary only, in at most {words} words.
+
+<previous_summary>
+{summary}
+</previous_summary>
+
+<conversation>
+{turns}
+</conversation>
+"""
+
+
+def estimate_tokens(messages, chars_per_token=3.5):
+    """Rough token count of chat messages (content plus per-message overhead)"""
+    return sum(
+        int(len(message.get("content") or "") / chars_per_token) + 4
+        for message in messages
+    )
+
+
+class ConversationHistory:
+    """
+    Chat history that stays within a token budget without breaking Ollama's
+    prompt cache.
+
+    The messages sent to the model are the system prompt (with the rolling
+    summary of older turns) followed by the recent turns, so between folds the
+    prompt only grows at the end and the processed prefix is reused. Once the
+    prompt passes fold_at of the budget, the oldest turns are summarized on a
+    background thread and swapped for the new summary in one step before the
+    next request, bringing the prompt back to about keep_ratio of the budget.
+    """
+
+    def __init__(
+        self,
+        summarize,
+        num_ctx=4096,
+        reserve_tokens=768,
+        fold_at=0.75,
+        keep_ratio=0.4,
+    ):
+        # summarize(previous_summary, turns) -> new summary text or None
+        self.summarize = summarize
+        self.budget = num_ctx - reserve_tokens
+        self.fold_at = fold_at
+        self.keep_ratio = keep_ratio
+        self.lock = threading.Lock()
+        self.system_prompt = None
+        self.reset()
+
+    def reset(self):
+        """Forget all turns and the summary, keeping the system prompt"""
+        with self.lock:
+            self.summary = ""
+            self.turns = []
+            self.generation = getattr(self, "generation", 0) + 1
+            self._fold_thread = None
+            self._fold_result = None
+
+    def set_system(self, system_prompt):
+        self.system_prompt = system_prompt
+
+    def append(self, message):
+        with self.lock:
+            self.turns.append(message)
+        if message.get("role") == "assistant":
+            self.maybe_fold()
+
+    def messages(self, wait=True):
+        """The messages to send: system prompt and summary, then recent turns"""
+        self._apply_fold()
+        if wait and self._over(self.budget) and self._fold_thread is not None:
+            # out of room, the summary has to land before this request
+            self._fold_thread.join()
+            self._apply_fold()
+        with self.lock:
+            prefix = self._prefix()
+            # still too long, drop the oldest turns from the history itself so
+            # the next prompt starts the same way and its prefix is reused
+            while (
+                len(self.turns) > 1
+                and estimate_tokens(prefix + self.turns) > self.budget
+            ):
+                self.turns.pop(0)
+            return prefix + list(self.turns)
+
+    def to_list(self):
+        with self.lock:
+            return self._prefix() + list(self.turns)
+
+    def load(self, messages):
+        """Replace the history with a plain list of chat messages"""
+        self.reset()
+        with self.lock:
+            for message in messages:
+                if message.get("role") == "system" and not self.turns:
+                    self.system_prompt = message["content"]
+                else:
+                    self.turns.append(message)
+
+    def maybe_fold(self):
+        """Start summarizing the oldest turns once the prompt gets too long"""
+        if self._fold_thread is not None or not self._over(self.fold_at * self.budget):
+            return
+        with self.lock:
+            keep = self.keep_ratio * self.budget - estimate_tokens(self._prefix())
+            cut = len(self.turns)
+            while cut > 0 and estimate_tokens(self.turns[cut - 1 :]) <= keep:
+                cut -= 1
+            # fold whole exchanges, the kept part starts with a user turn
+            while cut < len(self.turns) and self.turns[cut].get("role") != "user":
+                cut += 1
+            if cut == 0 or cut >= len(self.turns):
+                return
+            folded = self.turns[:cut]
+            summary = self.summary
+            generation = self.generation
+
+        def fold():
+            result = self.summarize(summary, folded)
+            with self.lock:
+                if generation == self.generation:
+                    self._fold_result = (cut, result)
+
+        self._fold_thread = threading.Thread(target=fold, daemon=True)
+        self._fold_thread.start()
+
+    def _apply_fold(self):
+        with self.lock:
+            if self._fold_result is None:
+                return
+            cut, summary = self._fold_result
+            self._fold_result = None
+            self._fold_thread = None
+            self.turns = self.turns[cut:]
+            if summary is None:
+                # drop them once rather than trimming a little every request
+                print(f"Summarizing the conversation failed, dropped {cut} messages")
+                return
+            self.summary = summary
+            print(f"Folded {cut} older messages into the conversation summary")
+
+    def _over(self, limit):
+        with self.lock:
+            return estimate_tokens(self._prefix() + self.turns) > limit
+
+    def _prefix(self):
+        content = self.system_prompt or ""
+        if self.summary:
+            content += f"\n\nSummary of the conversation so far:\n{self.summary}"
+        return [{"role": "system", "content": content.strip()}] if content else []
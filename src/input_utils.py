@@ -1,93 +1,286 @@
 import numpy as np
 import pyaudio
-import torch
 from collections import deque
-from openwakeword.model import Model
-from faster_whisper import WhisperModel
-import threading
+from src.capture_utils import AudioRingBuffer, AudioCapture
+from src.asr_utils import AdaptiveDecoder, StreamingTranscriber, trim_silence
+from src.startup_utils import StartupTimer, BackgroundLoader
+from src.wakeword_utils import WakewordEngine
+from src.trace_utils import tracer
 import time
 
 
 class AudioInputProcessor:
     def __init__(
-        self, wakeword_model_path="./drama_voice.onnx", whisper_model_size="small"
+        self,
+        wakeword_model_path="./drama_voice.onnx",
+        whisper_model_size="small",
+        vad_mode="streaming",
+        vad_backend="onnx",
+        buffer_seconds=60,
+        timer=None,
+        audio_source=None,
+        whisper_model=None,
+        asr_scheduler=None,
+        wakeword_engine=None,
+        asr_decoding="adaptive",
+        capture_stage=None,
     ):
+        timer = timer or StartupTimer()
+
         # Audio stream configuration
         self.FORMAT = pyaudio.paInt16
         self.CHANNELS = 1
         self.RATE = 16000
         self.CHUNK = 1280
 
-        # Initialize PyAudio
-        self.audio_interface = pyaudio.PyAudio()
-        self.mic_stream = self.audio_interface.open(
-            format=self.FORMAT,
-            channels=self.CHANNELS,
-            rate=self.RATE,
-            input=True,
-            frames_per_buffer=self.CHUNK,
+        # Silero VAD and Whisper load (and warm up) in the background while
+        # the mic and wakeword model come up, first use waits for them
+        self.vad_mode = vad_mode
+        # "onnx" runs the bundled Silero model through onnxruntime, "torch"
+        # fetches it with torch.hub
+        self.vad_backend = vad_backend
+        self._vad_loader = BackgroundLoader("Silero VAD", self._load_vad, timer)
+        # an already loaded (e.g. shared) Whisper model can be passed in instead
+        self._whisper_loader = BackgroundLoader(
+            f"Whisper ({whisper_model_size})",
+            lambda: (
+                whisper_model
+                if whisper_model is not None
+                else self._load_whisper(whisper_model_size)
+            ),
+            timer,
         )
-        self.mic_lock = threading.Lock()
-
-        # Load wakeword detection model
-        self.owwModel = Model(
-            wakeword_models=[wakeword_model_path], inference_framework="onnx"
+        self._streaming_transcriber = None
+        # "adaptive" decodes greedily and falls back to beam search when the
+        # result looks unreliable, "beam" always uses beam search
+        self.asr_decoding = asr_decoding
+        self._decoder = None
+        # shared ASRBatchScheduler for whole-utterance transcription, if any
+        self.asr_scheduler = asr_scheduler
+        # (kind, time.perf_counter()) of the VAD events of the last recording,
+        # and when that recording ended
+        self.vad_events = []
+        self.recording_end_time = None
+        # listening time, audio and model time of the last wakeword detection
+        self.wakeword_stats = {"duration": 0.0}
+        # EchoGate applied before the VAD when replies can be interrupted
+        self.echo_gate = None
+
+        # Mic capture and wakeword scoring can run in a CaptureStage process,
+        # then its shared-memory ring stands in for the local one
+        if capture_stage is not None:
+            self.audio_interface = None
+            self.mic_stream = None
+            self.ring = capture_stage.ring
+            self.read_index = 0
+            self.capture = capture_stage
+            self.wakeword = None
+            return
+
+        # Initialize PyAudio, unless another source (e.g. WavFileSource) is given
+        if audio_source is not None:
+            self.audio_interface = None
+            self.mic_stream = audio_source
+        else:
+            with timer.track("Microphone (PyAudio)"):
+                self.audio_interface = pyaudio.PyAudio()
+                self.mic_stream = self.audio_interface.open(
+                    format=self.FORMAT,
+                    channels=self.CHANNELS,
+                    rate=self.RATE,
+                    input=True,
+                    frames_per_buffer=self.CHUNK,
+                )
+
+        # A single capture thread owns the mic and writes into the ring buffer,
+        # wakeword, VAD and ASR read from it by sample index via self.read_index
+        self.ring = AudioRingBuffer(
+            self.CHUNK, int(buffer_seconds * self.RATE / self.CHUNK)
         )
-
-        # Load Silero VAD model
-        self.vad_model, utils = torch.hub.load("snakers4/silero-vad", "silero_vad")
-        (self.get_speech_ts, _, _, _, _) = utils
-
-        # Load Whisper model for transcription
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.whisper_model = WhisperModel(
+        self.read_index = 0
+        self.capture = AudioCapture(self.mic_stream, self.ring, self.CHUNK).start()
+
+        # Load the wakeword models (one path or a list), unless a shared engine
+        # scoring several streams is given, and register this stream with it
+        if wakeword_engine is None:
+            with timer.track("Wakeword (openWakeWord)"):
+                wakeword_engine = WakewordEngine(wakeword_model_path)
+        self.wakeword = wakeword_engine.add_stream()
+
+    def _load_vad(self):
+        """Load Silero VAD and run one frame through it"""
+        from src.vad_utils import StreamingVAD
+
+        if self.vad_backend == "onnx":
+            from src.vad_utils import OnnxSileroVAD, get_speech_timestamps
+
+            vad_model = OnnxSileroVAD(sampling_rate=self.RATE)
+            get_speech_ts = get_speech_timestamps
+        else:
+            import torch
+
+            vad_model, utils = torch.hub.load("snakers4/silero-vad", "silero_vad")
+            get_speech_ts, _, _, _, _ = utils
+        # "streaming" scores each new frame with recurrent state,
+        # "window" re-runs get_speech_ts over a sliding window every chunk
+        vad = StreamingVAD(vad_model, sampling_rate=self.RATE)
+        vad.process(np.zeros(vad.frame_size, dtype=np.int16))
+        vad.reset()
+        return vad_model, get_speech_ts, vad
+
+    def _load_whisper(self, whisper_model_size):
+        """Load Whisper and run a dummy transcription so the first real one is fast"""
+        import ctranslate2
+        from faster_whisper import WhisperModel
+
+        self.device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+        whisper_model = WhisperModel(
             whisper_model_size,
             device=self.device,
             compute_type="float16" if self.device == "cuda" else "float32",
         )
+        segments, _ = whisper_model.transcribe(
+            np.zeros(self.RATE, dtype=np.float32), beam_size=1
+        )
+        list(segments)
+        return whisper_model
+
+    @property
+    def vad_model(self):
+        return self._vad_loader.get()[0]
+
+    @property
+    def get_speech_ts(self):
+        return self._vad_loader.get()[1]
+
+    @property
+    def vad(self):
+        return self._vad_loader.get()[2]
+
+    @property
+    def whisper_model(self):
+        return self._whisper_loader.get()
+
+    @property
+    def decoder(self):
+        """AdaptiveDecoder in adaptive mode, otherwise None"""
+        if self._decoder is None and self.asr_decoding == "adaptive":
+            self._decoder = AdaptiveDecoder(self.whisper_model, rate=self.RATE)
+        return self._decoder
+
+    @property
+    def streaming_transcriber(self):
+        if self._streaming_transcriber is None:
+            self._streaming_transcriber = StreamingTranscriber(
+                self.whisper_model, self.ring, rate=self.RATE, decoder=self.decoder
+            )
+        return self._streaming_transcriber
 
     def __del__(self):
         """Clean up resources when object is destroyed"""
+        if hasattr(self, "capture"):
+            self.capture.stop()
+        if getattr(self, "wakeword", None) is not None:
+            self.wakeword.close()
         if hasattr(self, "mic_stream") and self.mic_stream is not None:
             self.mic_stream.stop_stream()
             self.mic_stream.close()
         if hasattr(self, "audio_interface") and self.audio_interface is not None:
             self.audio_interface.terminate()
 
-    def flush_mic_stream(self, flush_time=1):
-        """Flush the microphone stream by reading and discarding audio"""
-        num_chunks = int(self.RATE * flush_time / self.CHUNK)
-        print("Flushing microphone stream...")
-        for _ in range(num_chunks):
-            try:
-                with self.mic_lock:
-                    self.mic_stream.read(self.CHUNK)
-            except Exception as e:
-                print(f"Error flushing mic stream: {e}")
-
-    def wait_for_wakeword(self, threshold=0.8):
-        """Listen for the wakeword and return when detected"""
+    def flush_mic_stream(self):
+        """Skip audio captured so far by moving the read cursor to the live edge"""
+        live = self.ring.write_index
+        self.read_index = live - live % self.CHUNK
+
+    def rewind_to(self, index, pre_speech_chunks=3):
+        """
+        Move the read cursor back to index (minus a few chunks), so the next
+        recording starts with speech that was captured during playback
+        """
+        index -= index % self.CHUNK + pre_speech_chunks * self.CHUNK
+        oldest = self.ring.oldest_index
+        self.read_index = max(index, oldest + (-oldest) % self.CHUNK)
+
+    def next_chunk(self):
+        """
+        Return the next CHUNK of captured audio as a view into the ring buffer,
+        blocking until it has been captured. Returns None once capture has stopped.
+        """
+        if self.read_index < self.ring.oldest_index:
+            print("Audio reader fell behind the capture buffer, skipping ahead.")
+            self.flush_mic_stream()
+        end = self.read_index + self.CHUNK
+        if not self.ring.wait_for(end):
+            return None
+        chunk = self.ring.view(self.read_index, end)
+        self.read_index = end
+        return chunk
+
+    def wait_for_wakeword(self, max_wait=None):
+        """
+        Listen for the wakeword and return True when detected, or False once
+        max_wait seconds of audio (if given) passed without it
+        """
         print("Listening for wakewords...")
+        # audio from before this call is stale, start from the live edge
+        self.flush_mic_stream()
+        deadline = (
+            self.read_index + int(max_wait * self.RATE)
+            if max_wait is not None
+            else None
+        )
+        listen_start = self.read_index
+        start_time = time.perf_counter()
+        if self.wakeword is None:
+            return self._wait_for_remote_wakeword(listen_start, deadline, start_time)
+        compute_sec = 0.0
         while True:
-            with self.mic_lock:
-                data = self.mic_stream.read(self.CHUNK)
-            audio_data = np.frombuffer(data, dtype=np.int16)
-            _ = self.owwModel.predict(audio_data)
-
-            # Check if wake word was detected
-            wake_detected = False
-            for mdl in self.owwModel.prediction_buffer.keys():
-                scores = list(self.owwModel.prediction_buffer[mdl])
-                if scores and scores[-1] > threshold:
-                    wake_detected = True
-                    print(f"Wakeword detected! Score: {scores[-1]:.4f}")
-                    break
-
-            if wake_detected:
-                # Reset the wake word model's internal state
-                self.owwModel.reset()
+            if deadline is not None and self.read_index >= deadline:
+                return False
+            audio_data = self.next_chunk()
+            if audio_data is None:
+                return False
+
+            # quiet chunks are skipped by the engine's energy gate
+            if tracer.enabled:
+                predict_start = time.perf_counter()
+                detections = self.wakeword.predict(audio_data)
+                compute_sec += time.perf_counter() - predict_start
+            else:
+                detections = self.wakeword.predict(audio_data)
+            if detections:
+                name, score = detections[0]
+                print(f"Wakeword '{name}' detected! Score: {score:.4f}")
+                self.wakeword_stats = {
+                    "duration": time.perf_counter() - start_time,
+                    "audio_sec": (self.read_index - listen_start) / self.RATE,
+                    "compute_sec": compute_sec,
+                    "model": name,
+                    "score": float(score),
+                }
+                # Reset the wake word stream's internal state
+                self.wakeword.reset()
                 return True
 
+    def _wait_for_remote_wakeword(self, listen_start, deadline, start_time):
+        """wait_for_wakeword when the CaptureStage process scores the chunks"""
+        detection = self.capture.wait_for_wakeword(listen_start, deadline)
+        if detection is None:
+            return False
+        index, name, score, compute_sec = detection
+        print(f"Wakeword '{name}' detected! Score: {score:.4f}")
+        # the request follows the wake word
+        self.read_index = index
+        self.wakeword_stats = {
+            "duration": time.perf_counter() - start_time,
+            "audio_sec": (index - listen_start) / self.RATE,
+            "compute_sec": compute_sec,
+            "model": name,
+            "score": score,
+        }
+        return True
+
     def record_with_vad(
         self, inactivity_sec=3, pre_speech_buffer_size=3, max_initial_wait=10
     ):
@@ -100,6 +293,124 @@ class AudioInputProcessor:
             pre_speech_buffer_size (int): Number of chunks to keep before speech starts
             max_initial_wait (float): Maximum seconds to wait for initial speech
         """
+        if self.vad_mode == "streaming":
+            return self._record_with_streaming_vad(
+                inactivity_sec, pre_speech_buffer_size, max_initial_wait
+            )
+        with tracer.span("record", vad="window") as span:
+            audio = self._record_with_window_vad(
+                inactivity_sec, pre_speech_buffer_size, max_initial_wait
+            )
+            span.set(speech_sec=audio.size / self.RATE)
+            return audio
+
+    def _record_with_streaming_vad(
+        self,
+        inactivity_sec,
+        pre_speech_buffer_size,
+        max_initial_wait,
+        transcriber=None,
+    ):
+        """
+        Record using the stateful streaming VAD, each chunk is scored once so the
+        per-chunk cost stays constant and the loop is paced by the capture thread.
+        The utterance is cut from the ring buffer by sample index, including
+        pre_speech_buffer_size chunks before speech started.
+        Silence and initial-wait limits are counted in samples rather than wall time.
+        If a transcriber is given it is started at speech onset and fed the growing
+        recording, so transcription runs while the user is still speaking.
+        """
+        inactivity_samples = int(self.RATE * inactivity_sec)
+        max_wait_samples = int(self.RATE * max_initial_wait)
+
+        listen_start = self.read_index
+        last_voice_index = listen_start
+        utterance_start = None
+
+        self.vad.reset()
+        self.vad_events = []
+        print("Entering streaming VAD mode and listening for speech...")
+        start_time = time.perf_counter()
+        compute_sec = 0.0
+
+        while True:
+            chunk = self.next_chunk()
+            if chunk is None:
+                break
+
+            if self.echo_gate is not None:
+                # after a barge-in the first chunks overlap the reply's echo
+                chunk_for_vad = self.echo_gate.filter(
+                    chunk, self.ring.time_of(self.read_index - 1)
+                )
+            else:
+                chunk_for_vad = chunk
+            vad_start = time.perf_counter()
+            events = self.vad.process(chunk_for_vad)
+            compute_sec += time.perf_counter() - vad_start
+            for kind, sample_index in events:
+                self.vad_events.append((kind, time.perf_counter()))
+                seconds = sample_index / self.RATE
+                if kind == "start":
+                    print(f"Speech started at {seconds:.2f}s")
+                else:
+                    print(f"Speech ended at {seconds:.2f}s")
+
+            if self.vad.triggered:
+                last_voice_index = self.read_index
+                if utterance_start is None:
+                    print("Voice activity started - recording...")
+                    utterance_start = max(
+                        self.read_index - (pre_speech_buffer_size + 1) * self.CHUNK,
+                        listen_start,
+                        self.ring.oldest_index,
+                    )
+                    if transcriber is not None:
+                        transcriber.start(utterance_start)
+            elif utterance_start is None:
+                if self.read_index - listen_start > max_wait_samples:
+                    print(
+                        f"No initial speech detected for {max_initial_wait} seconds. Ending listening."
+                    )
+                    return np.array([], dtype=np.int16)
+            elif self.read_index - last_voice_index > inactivity_samples:
+                print(
+                    f"No voice activity for {inactivity_sec} seconds. Ending recording."
+                )
+                break
+
+            if utterance_start is not None and transcriber is not None:
+                transcriber.update(self.read_index)
+
+        self.recording_end_time = time.perf_counter()
+        tracer.record(
+            "record",
+            self.recording_end_time - start_time,
+            vad="streaming",
+            audio_sec=(self.read_index - listen_start) / self.RATE,
+            compute_sec=compute_sec,
+            speech_sec=(
+                (self.read_index - utterance_start) / self.RATE
+                if utterance_start is not None
+                else 0.0
+            ),
+        )
+        if utterance_start is None:
+            return np.array([], dtype=np.int16)
+
+        return self.ring.view(utterance_start, self.read_index).copy()
+
+    def _record_with_window_vad(
+        self, inactivity_sec, pre_speech_buffer_size, max_initial_wait
+    ):
+        """Record by re-running get_speech_ts over a sliding window of recent chunks"""
+        if self.vad_backend == "torch":
+            import torch
+
+            to_input = torch.tensor
+        else:
+            to_input = np.asarray
+
         recorded_chunks = []
         audio_buffer = deque(maxlen=20)  # Sliding window for VAD detection
         pre_speech_buffer = deque(
@@ -117,14 +428,11 @@ class AudioInputProcessor:
         start_time = time.time()
 
         while True:
-            try:
-                with self.mic_lock:
-                    data = self.mic_stream.read(self.CHUNK)
-            except Exception as e:
-                print(f"Error reading microphone in VAD recording: {e}")
-                continue
-
-            chunk = np.frombuffer(data, dtype=np.int16)
+            chunk = self.next_chunk()
+            if chunk is None:
+                break
+            # the ring slot is reused once the buffer wraps, keep a copy
+            chunk = chunk.copy()
 
             # Always keep recent chunks in pre-speech buffer
             pre_speech_buffer.append(chunk)
@@ -133,11 +441,9 @@ class AudioInputProcessor:
             chunk_float = chunk.astype(np.float32) / 32768.0
             audio_buffer.append(chunk_float)
             audio_np = np.concatenate(list(audio_buffer))
-            audio_tensor = torch.tensor(audio_np)
-
             # Check for speech
             speech_timestamps = self.get_speech_ts(
-                audio_tensor, self.vad_model, sampling_rate=self.RATE
+                to_input(audio_np), self.vad_model, sampling_rate=self.RATE
             )
 
             if speech_timestamps:
@@ -178,16 +484,17 @@ class AudioInputProcessor:
                     )
                     break
 
-            time.sleep(0.05)
-
         if not recorded_chunks:
             return np.array([], dtype=np.int16)
 
         recorded_audio = np.concatenate(recorded_chunks)
         return recorded_audio
 
-    def transcribe_audio(self, audio_data):
-        """Transcribe the recorded audio using Whisper"""
+    def transcribe_audio(self, audio_data, prompt=None):
+        """
+        Transcribe the recorded audio using Whisper, prompt (e.g. the previous
+        reply) gives it the conversation context
+        """
         if audio_data.size == 0:
             return ""
 
@@ -195,15 +502,74 @@ class AudioInputProcessor:
         audio_float = audio_data.astype(np.float32) / 32768.0
 
         print("Transcribing recorded audio...")
-        segments, _ = self.whisper_model.transcribe(audio_float, beam_size=5)
-
-        # Collect all segment texts
-        transcript = []
-        for segment in segments:
-            transcript.append(segment.text)
-            print(f"[{segment.start:.2f}s - {segment.end:.2f}s]: {segment.text}")
+        with tracer.span("asr", audio_sec=audio_data.size / self.RATE) as span:
+            if self.asr_scheduler is not None:
+                span.set(batched=True)
+                # batches are decoded with beam search, trimming still shortens them
+                if self.asr_decoding == "adaptive":
+                    audio_float, _ = trim_silence(audio_float, self.RATE)
+                transcript = self.asr_scheduler.transcribe(
+                    audio_float, beam_size=5, initial_prompt=prompt
+                )
+                print(f"[batched]: {transcript}")
+                return transcript
+
+            offset = 0
+            if self.decoder is not None:
+                fallbacks = self.decoder.stats["fallback"]
+                segments, _, offset = self.decoder.decode(
+                    audio_float, initial_prompt=prompt
+                )
+                span.set(fallback=self.decoder.stats["fallback"] > fallbacks)
+            else:
+                segments, _ = self.whisper_model.transcribe(
+                    audio_float, beam_size=5, initial_prompt=prompt
+                )
+
+            # Collect all segment texts
+            transcript = []
+            offset_sec = offset / self.RATE
+            for segment in segments:
+                transcript.append(segment.text)
+                print(
+                    f"[{segment.start + offset_sec:.2f}s - "
+                    f"{segment.end + offset_sec:.2f}s]: {segment.text}"
+                )
+
+            return " ".join(transcript).strip()
+
+    def record_and_transcribe(
+        self,
+        inactivity_sec=3,
+        pre_speech_buffer_size=3,
+        max_initial_wait=10,
+        prompt=None,
+    ):
+        """
+        Streaming ASR mode: record with the streaming VAD while committed segments
+        are transcribed in the background, then decode only the unstable tail.
+        prompt gives Whisper the conversation context.
 
-        return " ".join(transcript).strip()
+        Returns:
+            tuple: (recorded int16 audio, transcript)
+        """
+        transcriber = self.streaming_transcriber
+        transcriber.context = prompt
+        recorded_audio = self._record_with_streaming_vad(
+            inactivity_sec,
+            pre_speech_buffer_size,
+            max_initial_wait,
+            transcriber=transcriber,
+        )
+        if not transcriber.active:
+            return recorded_audio, ""
+
+        # only the tail decode after the user stopped is on the critical path
+        with tracer.span(
+            "asr", audio_sec=recorded_audio.size / self.RATE, streaming=True
+        ):
+            transcript = transcriber.finish(self.read_index)
+        return recorded_audio, transcript
 
     def listen_and_transcribe(self):
         """Complete pipeline: wait for wakeword, record speech, and transcribe"""
@@ -0,0 +1,221 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+TERMINATE = "terminate"
+PLAY_MUSIC = "play_music"
+CAPTURE_IMAGE = "capture_image_and_describe"
+TEXT_RESPONSE = "text_response"
+
+ACTIONS = [TERMINATE, PLAY_MUSIC, CAPTURE_IMAGE, TEXT_RESPONSE]
+
+# High precision patterns checked before the classifier
+KEYWORD_PATTERNS = [
+    (
+        TERMINATE,
+        re.compile(
+            r"^\W*(?:ok(?:ay)?\W+|thanks?\W+|thank you\W+)?"
+            r"(?:bye|goodbye|bye bye|good night|see you(?: later)?|that'?s all|"
+            r"that'?s it|we'?re done|i'?m done|end (?:the )?conversation|"
+            r"stop listening|go to sleep|never ?mind)\W*(?:for now|then)?\W*$"
+        ),
+    ),
+    (
+        PLAY_MUSIC,
+        re.compile(
+            r"\b(?:play|put on|queue up|blast)\b.*\b(?:song|songs|music|track|album|"
+            r"playlist|tunes|by)\b|\b(?:play|put on)\s+(?:some|a|the)\b|"
+            r"\blisten to\b.*\b(?:song|music|track|album)\b|"
+            r"\b(?:pause|resume|stop|skip|mute|unmute)\b.*\b(?:music|song|track|playback)\b|"
+            r"\b(?:next|another) (?:song|track)\b|\bturn (?:it|the music|the volume) (?:up|down)\b"
+        ),
+    ),
+    (
+        CAPTURE_IMAGE,
+        re.compile(
+            r"\b(?:take|snap|capture) (?:a |my )?(?:photo|picture|pic|image|selfie)\b|"
+            r"\bcan you see (?:me|my|what i'?m)\b|"
+            r"\bwhat (?:am i|i'?m) (?:holding|wearing|showing)\b|"
+            r"\blook at me\b|^\W*what(?:'s| is) this\W*$|"
+            r"\bwhat(?:'s| is) in front of (?:you|me|the camera)\b|"
+            r"\bhow do i look\b|\bdescribe (?:what you see|this|my)\b"
+        ),
+    ),
+]
+
+# Seed examples the classifier is trained on at construction
+SEED_EXAMPLES = {
+    TERMINATE: [
+        "bye",
+        "goodbye for now",
+        "okay that's all thanks",
+        "we are done here",
+        "i don't need anything else",
+        "stop the conversation",
+        "talk to you later",
+        "see you tomorrow",
+        "thanks that will be all",
+        "you can go now",
+        "end this chat",
+        "i'm finished thank you",
+        "no more questions",
+        "leave me alone now",
+        "shut down",
+        "good night drama",
+    ],
+    PLAY_MUSIC: [
+        "play never gonna give you up",
+        "play some jazz",
+        "put on something relaxing",
+        "i want to listen to taylor swift",
+        "play the latest song by drake",
+        "can you play music",
+        "play my favourite song",
+        "start some lofi beats",
+        "i feel like hearing some rock",
+        "queue up bohemian rhapsody",
+        "play a song for me",
+        "put on some classical music",
+        "let's have some tunes",
+        "play despacito",
+        "can you play the weeknd",
+        "i wanna hear some music",
+    ],
+    CAPTURE_IMAGE: [
+        "can you see what i'm holding",
+        "what am i holding right now",
+        "take a picture",
+        "look at this",
+        "what does my shirt say",
+        "what color is this",
+        "do you see my cat",
+        "describe what you see",
+        "what is in my hand",
+        "how do i look today",
+        "can you read this label",
+        "what is this thing",
+        "tell me what's in front of you",
+        "check out my new shoes",
+        "snap a photo",
+        "what brand is this bottle",
+        "what do you see right now",
+        "read what this paper says",
+        "look at my new haircut",
+    ],
+    TEXT_RESPONSE: [
+        "what is snapchat",
+        "tell me a joke",
+        "how are you doing",
+        "what's the capital of france",
+        "explain quantum computing",
+        "what time is it in tokyo",
+        "who won the world cup",
+        "give me a recipe for pancakes",
+        "how far is the moon",
+        "what do you think about cats",
+        "translate hello to spanish",
+        "what's your name",
+        "help me write an email",
+        "why is the sky blue",
+        "what should i eat for dinner",
+        "how do i fix a flat tire",
+        "what's the weather like",
+        "who are you",
+        "tell me something interesting",
+        "what is the meaning of life",
+        "what is this book about",
+        "can you see a pattern in these numbers",
+        "what does democracy mean",
+        "can you see why that happened",
+        "can you see why this does not work",
+        "what is this story about",
+        "can you look at my resume",
+        "look at my email draft",
+        "review my code for bugs",
+        "proofread my essay",
+    ],
+}
+
+
+def tokenize(text):
+    """Lowercase word unigrams plus bigrams"""
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class IntentRouter:
+    """
+    Decides terminate / play_music / capture_image_and_describe / text_response
+    locally in well under a millisecond.
+
+    A keyword fast path catches the obvious phrasings, everything else goes to a
+    multinomial naive Bayes classifier trained on SEED_EXAMPLES. When the
+    classifier is not confident enough the decision is handed to the LLM
+    fallback, if one was given.
+    """
+
+    def __init__(self, examples=None, confidence_threshold=0.7, llm_fallback=None):
+        self.confidence_threshold = confidence_threshold
+        self.llm_fallback = llm_fallback
+        self.fit(examples or SEED_EXAMPLES)
+
+    def fit(self, examples):
+        """Train the classifier from a {action: [texts]} mapping"""
+        self.token_counts = {action: Counter() for action in examples}
+        doc_counts = {}
+        for action, texts in examples.items():
+            doc_counts[action] = len(texts)
+            for text in texts:
+                self.token_counts[action].update(tokenize(text))
+
+        total_docs = sum(doc_counts.values())
+        self.vocab = set()
+        for counts in self.token_counts.values():
+            self.vocab.update(counts)
+
+        self.log_prior = {
+            action: math.log(count / total_docs) for action, count in doc_counts.items()
+        }
+        # Laplace smoothed log likelihoods, unseen tokens get the per-class default
+        self.log_likelihood = defaultdict(dict)
+        self.log_unseen = {}
+        for action, counts in self.token_counts.items():
+            denom = sum(counts.values()) + len(self.vocab)
+            self.log_unseen[action] = math.log(1 / denom)
+            for token, count in counts.items():
+                self.log_likelihood[action][token] = math.log((count + 1) / denom)
+
+    def classify(self, text):
+        """Return (action, probability) from the classifier alone"""
+        tokens = [t for t in tokenize(text) if t in self.vocab]
+        if not tokens:
+            return TEXT_RESPONSE, 0.0
+
+        scores = {}
+        for action, prior in self.log_prior.items():
+            likelihood = self.log_likelihood[action]
+            unseen = self.log_unseen[action]
+            scores[action] = prior + sum(likelihood.get(t, unseen) for t in tokens)
+
+        best = max(scores, key=scores.get)
+        norm = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1 / norm
+
+    def route(self, text):
+        """
+        Decide the action for a user message.
+
+        Returns:
+            tuple: (action, confidence, source) where source is "keyword",
+            "classifier" or "llm"
+        """
+        normalized = text.lower().strip()
+        for action, pattern in KEYWORD_PATTERNS:
+            if pattern.search(normalized):
+                return action, 1.0, "keyword"
+
+        action, confidence = self.classify(normalized)
+        if confidence >= self.confidence_threshold or self.llm_fallback is None:
+            return action, confidence, "classifier"
+
+        return self.llm_fallback(text), confidence, "llm"
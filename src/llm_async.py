@@ -0,0 +1,294 @@
+import asyncio
+import queue
+import threading
+import time
+from ollama import AsyncClient
+from src.llm_utils import (
+    LLMProcessor,
+    TerminateConversation,
+    DecideAction,
+    termination_message_check,
+    check_user_action,
+)
+from src.intent_router import TERMINATE, TEXT_RESPONSE
+from src.trace_utils import tracer, current_turn, set_turn
+
+LLM_ERROR_REPLY = (
+    "I'm having trouble connecting to the language model. Please try again."
+)
+
+
+class AsyncLLMProcessor(LLMProcessor):
+    """
+    LLMProcessor that runs every Ollama request through one pooled keep-alive
+    AsyncClient on a background event loop.
+
+    The termination and action checks run concurrently, and the main reply is
+    started speculatively (without tools) at the same time. It is cancelled if
+    the user wants to stop, or restarted with tools if a tool was chosen.
+    chat() and chat_stream() keep the blocking LLMProcessor interface.
+    """
+
+    def __init__(
+        self,
+        default_model="llama3.2",
+        host="http://localhost:11434",
+        router="local",
+        num_ctx=4096,
+    ):
+        super().__init__(
+            default_model=default_model, host=host, router=router, num_ctx=num_ctx
+        )
+        if self.router is not None:
+            # low-confidence routes are resolved by the concurrent checks below
+            self.router.llm_fallback = None
+
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.loop_thread.start()
+        # created on the loop so its connection pool belongs to it
+        self.async_client = self._run(self._create_client(host))
+
+    async def _create_client(self, host):
+        return AsyncClient(host=host)
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(
+            self._in_turn(coroutine), self.loop
+        ).result()
+
+    def _in_turn(self, coroutine):
+        """Run coroutine on the loop under the calling thread's trace turn"""
+        turn = current_turn()
+
+        async def run():
+            set_turn(turn)
+            return await coroutine
+
+        return run()
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join(timeout=1)
+
+    def chat(self, user_input, model=None):
+        """Blocking chat, returns "" if the user wants to end the conversation"""
+        return self._run(self.achat(user_input, model))
+
+    def chat_stream(self, user_input, model=None):
+        """Blocking generator over the streamed reply, see LLMProcessor.chat_stream"""
+        chunks = queue.Queue()
+        finished = threading.Event()
+
+        async def run():
+            try:
+                await self._achat(user_input, model, chunks.put)
+            finally:
+                finished.set()
+
+        future = asyncio.run_coroutine_threadsafe(self._in_turn(run()), self.loop)
+        future.add_done_callback(lambda _: chunks.put(None))
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is None:
+                    break
+                yield chunk
+        except GeneratorExit:
+            # the user talked over the reply, stop it and wait until the partial
+            # reply is in the history so the next turn starts after it
+            future.cancel()
+            finished.wait(timeout=5)
+            raise
+        future.result()
+
+    async def achat(self, user_input, model=None):
+        """Coroutine version of chat()"""
+        parts = []
+        await self._achat(user_input, model, parts.append)
+        return "".join(parts)
+
+    async def _achat(self, user_input, model, emit):
+        """
+        Decide the action and produce the reply, passing reply text to emit() as
+        it becomes available.
+        """
+        model = model or self.default_model
+        messages = self.history.messages() + [{"role": "user", "content": user_input}]
+        speculative_parts = asyncio.Queue()
+        speculative = None
+
+        action = self._route(user_input)
+        if action is None:
+            # start the likely tool-less reply while the LLM checks run
+            speculative = asyncio.create_task(
+                self._stream_reply(messages, model, speculative_parts)
+            )
+            try:
+                action = await self._llm_decide_action(user_input, model)
+            except BaseException:
+                speculative.cancel()
+                raise
+
+        llm_tools = self.get_tools_for_action(action)
+        if speculative is not None and (action == TERMINATE or llm_tools):
+            speculative.cancel()
+        if action == TERMINATE:
+            return
+
+        self.history.append({"role": "user", "content": user_input})
+        if llm_tools:
+            emit(await self._complete_with_tools(model, llm_tools))
+            return
+
+        if speculative is None:
+            speculative = asyncio.create_task(
+                self._stream_reply(messages, model, speculative_parts)
+            )
+        reply = []
+        try:
+            while True:
+                part = await speculative_parts.get()
+                if part is None:
+                    break
+                reply.append(part)
+                emit(part)
+            await speculative
+        except asyncio.CancelledError:
+            # chat_stream was closed, keep what was generated so far
+            speculative.cancel()
+            self.history.append({"role": "assistant", "content": "".join(reply)})
+            raise
+        except Exception as e:
+            print(f"Error querying LLM: {e}")
+            reply.append(LLM_ERROR_REPLY)
+            emit(LLM_ERROR_REPLY)
+        self.history.append({"role": "assistant", "content": "".join(reply)})
+
+    def _route(self, user_input):
+        """Local router decision, or None when it is missing or unsure"""
+        if self.router is None:
+            return None
+        with tracer.span("route") as span:
+            action, confidence, source = self.router.route(user_input)
+            span.set(action=action, source=source)
+        if confidence < self.router.confidence_threshold:
+            return None
+        print(f"Routed to '{action}' by {source} (confidence {confidence:.2f})")
+        return action
+
+    async def _llm_decide_action(self, user_input, model):
+        """Run the termination and action checks concurrently"""
+        terminate, action = await asyncio.gather(
+            self._should_terminate(user_input, model),
+            self._tool_action(user_input, model),
+        )
+        return TERMINATE if terminate else action
+
+    async def _should_terminate(self, user_input, model):
+        with tracer.span("llm", model=model, call="terminate") as span:
+            response = await self.async_client.chat(
+                model=model,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": termination_message_check.format(user_input),
+                    }
+                ],
+                format=TerminateConversation.model_json_schema(),
+                **self.residency.request(model),
+            )
+            span.llm(response)
+        self.residency.observe(model, response)
+        return TerminateConversation.model_validate_json(
+            response.message.content
+        ).should_terminate_conversation
+
+    async def _tool_action(self, user_input, model):
+        with tracer.span("llm", model=model, call="action") as span:
+            response = await self.async_client.chat(
+                model=model,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": check_user_action.format(user_input),
+                    }
+                ],
+                format=DecideAction.model_json_schema(),
+                **self.residency.request(model),
+            )
+            span.llm(response)
+        self.residency.observe(model, response)
+        action = DecideAction.model_validate_json(response.message.content).action
+        return action or TEXT_RESPONSE
+
+    async def _stream_reply(self, messages, model, parts):
+        """Stream a tool-less reply into parts, ending with a None sentinel"""
+        span = tracer.span("llm", model=model, call="reply", stream=True)
+        start_time = time.perf_counter()
+        try:
+            with span:
+                stream = await self.async_client.chat(
+                    model=model,
+                    messages=messages,
+                    stream=True,
+                    **self.residency.request(model, temperature=0.1),
+                )
+                first = True
+                async for part in stream:
+                    if part.message.content:
+                        if first:
+                            first = False
+                            span.set(first_token_sec=time.perf_counter() - start_time)
+                        await parts.put(part.message.content)
+                    if part.done:
+                        span.llm(part)
+                        self.residency.observe(model, part)
+                        self.record_prompt_eval(part)
+        finally:
+            parts.put_nowait(None)
+
+    async def _complete_with_tools(self, model, llm_tools):
+        """Async counterpart of LLMProcessor._complete, tools run in a worker thread"""
+        try:
+            with tracer.span("llm", model=model, call="reply") as span:
+                response = await self.async_client.chat(
+                    model=model,
+                    messages=self.history.messages(),
+                    tools=llm_tools,
+                    **self.residency.request(model, temperature=0.1),
+                )
+                span.llm(response)
+            self.residency.observe(model, response)
+            self.record_prompt_eval(response)
+            for tool_call in response.message.get("tool_calls") or []:
+                tool_res = await asyncio.to_thread(self.execute_tool_call, tool_call)
+                if tool_res:
+                    self.history.append({"role": "tool", "content": tool_res})
+                    with tracer.span("llm", model=model, call="tool_reply") as span:
+                        response = await self.async_client.chat(
+                            model=model,
+                            messages=self.history.messages(),
+                            tools=llm_tools,
+                            **self.residency.request(model, temperature=0.1),
+                        )
+                        span.llm(response)
+                    self.residency.observe(model, response)
+                else:
+                    # music tools start in the background and return at once
+                    self.history.append(
+                        {"role": "tool", "content": "Started in the background"}
+                    )
+                    self.history.append(
+                        {"role": "assistant", "content": "Tool call executed."}
+                    )
+                    return "Tool call executed."
+
+            assistant_reply = response.message.get(
+                "content", "Sorry, I did not understand that."
+            )
+        except Exception as e:
+            print(f"Error querying LLM: {e}")
+            assistant_reply = LLM_ERROR_REPLY
+        self.history.append({"role": "assistant", "content": assistant_reply})
+        return assistant_reply
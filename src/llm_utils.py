@@ -1,12 +1,11 @@
-import os
-import ollama
 from ollama import Client, ChatResponse  # assuming ollama is installed and configured
-from src.tools import play_music, capture_image_and_describe
+from src.tools import play_music, control_music, capture_image_and_describe
+from src.intent_router import IntentRouter, TERMINATE
+from src.history_utils import ConversationHistory, SUMMARY_PROMPT
+from src.residency_utils import residency
+from src.trace_utils import tracer
 from pydantic import BaseModel
-
-# Ensure VLC’s DLLs are in the search path (adjust path as needed)
-os.add_dll_directory(r"C:\Program Files\VideoLAN\VLC")
-
+import time
 
 termination_message_check = """
 check if this message suggests that the user wants to terminate the conversation
@@ -50,6 +49,7 @@ Analyze the user message below and determine which of the following actions is m
 
 REGISTERED_TOOLS = {
     "play_music": play_music,
+    "control_music": control_music,
     "capture_image_and_describe": capture_image_and_describe,
 }
 
@@ -64,79 +64,230 @@ class DecideAction(BaseModel):
 
 
 class LLMProcessor:
-    def __init__(self, default_model="llama3.2", host="http://localhost:11434"):
+    def __init__(
+        self,
+        default_model="llama3.2",
+        host="http://localhost:11434",
+        router="local",
+        num_ctx=4096,
+    ):
         self.default_model = default_model
         self.client = Client(host=host)
-        self.history = []
+        # every request for the model uses the same context size and keep_alive,
+        # a different num_ctx makes Ollama reload it and drop its prompt cache
+        self.num_ctx = num_ctx
+        self.residency = residency
+        self.residency.register(default_model, num_ctx)
+        self.history = ConversationHistory(self.summarize_turns, num_ctx=num_ctx)
+        # (tokens, seconds) Ollama spent on prompt evaluation for the last reply
+        self.last_prompt_eval = None
         # Register available tools in a dictionary:
         self.tools = REGISTERED_TOOLS
+        # "local" decides terminate/tool actions with IntentRouter and only asks
+        # the LLM when unsure, "llm" always makes the two pre-chat calls
+        self.router = (
+            IntentRouter(llm_fallback=self.llm_decide_action)
+            if router == "local"
+            else None
+        )
 
     def reset_history(self):
-        self.history = []
+        self.history.reset()
+
+    def summarize_turns(self, summary, turns):
+        """Fold turns into the running summary, returns None on failure"""
+        transcript = "\n".join(
+            f"{m['role']}: {m.get('content') or ''}"
+            for m in turns
+            if m.get("role") in ("user", "assistant", "tool")
+        )
+        try:
+            with tracer.span("llm", model=self.default_model, call="summary") as span:
+                response = self.client.chat(
+                    model=self.default_model,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": SUMMARY_PROMPT.format(
+                                words=150, summary=summary or "(none)", turns=transcript
+                            ),
+                        }
+                    ],
+                    **self.residency.request(self.default_model, temperature=0.1),
+                )
+                span.llm(response)
+            self.residency.observe(self.default_model, response)
+            return response.message.content.strip()
+        except Exception as e:
+            print(f"Error summarizing conversation: {e}")
+            return None
+
+    def record_prompt_eval(self, response):
+        """Note how much of the prompt Ollama had to evaluate for a reply"""
+        count = getattr(response, "prompt_eval_count", None)
+        duration = getattr(response, "prompt_eval_duration", None)
+        if count is None or duration is None:
+            return
+        self.last_prompt_eval = (count, duration / 1e9)
+        print(f"Prompt eval: {count} tokens in {duration / 1e6:.0f}ms")
 
     def get_tool_support_for_chat(self, user_input: str):
         model = self.default_model
 
-        response = ollama.chat(
-            model=model,
-            messages=[
-                {
-                    "role": "user",
-                    "content": check_user_action.format(user_input),
-                }
-            ],
-            format=DecideAction.model_json_schema(),
-            options={"num_ctx": 4096},
-        )
+        with tracer.span("llm", model=model, call="action") as span:
+            response = self.client.chat(
+                model=model,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": check_user_action.format(user_input),
+                    }
+                ],
+                format=DecideAction.model_json_schema(),
+                **self.residency.request(model),
+            )
+            span.llm(response)
+        self.residency.observe(model, response)
 
         llm_action = DecideAction.model_validate_json(response.message.content).action
         return llm_action
 
-    def chat(self, user_input, model=None):
-        """
-        Sends the user input to the LLM and returns the assistant's reply.
-        """
+    def should_terminate(self, user_input, model=None):
+        """Ask the LLM whether the user wants to end the conversation"""
         model = model or self.default_model
 
-        response = ollama.chat(
-            model=model,
-            messages=[
-                {
-                    "role": "user",
-                    "content": termination_message_check.format(user_input),
-                }
-            ],
-            format=TerminateConversation.model_json_schema(),
-            options={"num_ctx": 1024},
-        )
+        with tracer.span("llm", model=model, call="terminate") as span:
+            response = self.client.chat(
+                model=model,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": termination_message_check.format(user_input),
+                    }
+                ],
+                format=TerminateConversation.model_json_schema(),
+                **self.residency.request(model),
+            )
+            span.llm(response)
+        self.residency.observe(model, response)
 
-        terminate = TerminateConversation.model_validate_json(
+        return TerminateConversation.model_validate_json(
             response.message.content
         ).should_terminate_conversation
 
-        if terminate:
-            return ""
+    def llm_decide_action(self, user_input, model=None):
+        """Decide the action with the termination and action-check prompts"""
+        if self.should_terminate(user_input, model):
+            return TERMINATE
+        return self.get_tool_support_for_chat(user_input)
+
+    def decide_action(self, user_input, model=None):
+        """
+        Returns one of terminate / play_music / capture_image_and_describe /
+        text_response for the user input.
+        """
+        if self.router is None:
+            return self.llm_decide_action(user_input, model)
 
-        llm_action = self.get_tool_support_for_chat(user_input)
+        with tracer.span("route") as span:
+            action, confidence, source = self.router.route(user_input)
+            span.set(action=action, source=source)
+        print(f"Routed to '{action}' by {source} (confidence {confidence:.2f})")
+        return action
 
+    def get_tools_for_action(self, llm_action):
+        """Map a decided action to the tools offered to the main completion"""
         llm_tools = []
 
         if llm_action == "play_music":
             llm_tools.append(REGISTERED_TOOLS["play_music"])
+            llm_tools.append(REGISTERED_TOOLS["control_music"])
         elif llm_action == "capture_image_and_describe":
             llm_tools.append(REGISTERED_TOOLS["capture_image_and_describe"])
 
+        return llm_tools
+
+    def chat(self, user_input, model=None):
+        """
+        Sends the user input to the LLM and returns the assistant's reply.
+        """
+        model = model or self.default_model
+
+        llm_action = self.decide_action(user_input, model)
+        if llm_action == TERMINATE:
+            return ""
+
+        llm_tools = self.get_tools_for_action(llm_action)
+
+        return self._complete(user_input, model, llm_tools)
+
+    def chat_stream(self, user_input, model=None):
+        """
+        Like chat, but yields the assistant's reply in pieces as Ollama streams it.
+        Yields nothing if the user wants to end the conversation. Turns that need a
+        tool go through the blocking path and yield the final reply once.
+        """
+        model = model or self.default_model
+
+        llm_action = self.decide_action(user_input, model)
+        if llm_action == TERMINATE:
+            return
+
+        llm_tools = self.get_tools_for_action(llm_action)
+        if llm_tools:
+            yield self._complete(user_input, model, llm_tools)
+            return
+
         self.history.append({"role": "user", "content": user_input})
+        reply = []
+        span = tracer.span("llm", model=model, call="reply", stream=True)
+        start_time = time.perf_counter()
         try:
-            response: ChatResponse = self.client.chat(
-                model=model,
-                messages=self.history,
-                options={
-                    "num_ctx": 4096 if len(user_input) > 50 else 2048,
-                    "temperature": 0.1,
-                },
-                tools=llm_tools,
+            with span:
+                stream = self.client.chat(
+                    model=model,
+                    messages=self.history.messages(),
+                    stream=True,
+                    **self.residency.request(model, temperature=0.1),
+                )
+                for part in stream:
+                    content = part.message.content
+                    if content:
+                        if not reply:
+                            span.set(first_token_sec=time.perf_counter() - start_time)
+                        reply.append(content)
+                        yield content
+                    if part.done:
+                        span.llm(part)
+                        self.residency.observe(model, part)
+                        self.record_prompt_eval(part)
+        except GeneratorExit:
+            # the user talked over the reply, keep what was generated so far
+            self.history.append({"role": "assistant", "content": "".join(reply)})
+            raise
+        except Exception as e:
+            print(f"Error querying LLM: {e}")
+            fallback = (
+                "I'm having trouble connecting to the language model. Please try again."
             )
+            reply.append(fallback)
+            yield fallback
+        self.history.append({"role": "assistant", "content": "".join(reply)})
+
+    def _complete(self, user_input, model, llm_tools):
+        """Run the main completion, executing any tool calls the model makes"""
+        self.history.append({"role": "user", "content": user_input})
+        try:
+            with tracer.span("llm", model=model, call="reply") as span:
+                response: ChatResponse = self.client.chat(
+                    model=model,
+                    messages=self.history.messages(),
+                    tools=llm_tools,
+                    **self.residency.request(model, temperature=0.1),
+                )
+                span.llm(response)
+            self.residency.observe(model, response)
+            self.record_prompt_eval(response)
 
             tool_calls = response.message.get("tool_calls", [])
 
@@ -150,20 +301,22 @@ class LLMProcessor:
                                 "content": tool_res,
                             }
                         )
-                        response: ChatResponse = self.client.chat(
-                            model=model,
-                            messages=self.history,
-                            options={
-                                "temperature": 0.1,
-                            },
-                            tools=llm_tools,
-                        )
+                        with tracer.span("llm", model=model, call="tool_reply") as span:
+                            response: ChatResponse = self.client.chat(
+                                model=model,
+                                messages=self.history.messages(),
+                                tools=llm_tools,
+                                **self.residency.request(model, temperature=0.1),
+                            )
+                            span.llm(response)
+                        self.residency.observe(model, response)
                     else:
+                        # music tools start in the background and return at once
                         self.history.append(
-                            {"role": "tool", "content": "Playing the requested Song"}
+                            {"role": "tool", "content": "Started in the background"}
                         )
                         self.history.append(
-                            {"role": "assistant", "content": "Finished Playing Song"}
+                            {"role": "assistant", "content": "Tool call executed."}
                         )
                         return "Tool call executed."
 
@@ -195,22 +348,31 @@ class LLMProcessor:
             func = self.tools[tool_name]
             print(f"Auto-executing tool '{tool_name}' with arguments: {arguments}")
             # Call the function with the arguments unpacked
-            return func(**arguments)
+            with tracer.span("tool", tool=tool_name):
+                return func(**arguments)
         else:
             print(f"No registered tool named '{tool_name}'.")
             return
 
+    def asr_context(self, max_chars=200):
+        """Text of the last exchange, to prompt Whisper with the conversation context"""
+        with self.history.lock:
+            turns = list(self.history.turns)
+        recent = [
+            m.get("content") or ""
+            for m in turns
+            if m.get("role") in ("user", "assistant")
+        ][-2:]
+        return " ".join(recent)[-max_chars:].strip() or None
+
     def get_history(self):
-        return self.history.copy()
+        return self.history.to_list()
 
     def set_history(self, new_history):
-        self.history = new_history
+        self.history.load(new_history)
 
     def add_system_prompt(self, system_prompt):
-        if self.history and self.history[0].get("role") == "system":
-            self.history[0] = {"role": "system", "content": system_prompt}
-        else:
-            self.history.insert(0, {"role": "system", "content": system_prompt})
+        self.history.set_system(system_prompt)
 
 
 # Example usage:
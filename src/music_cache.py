@@ -0,0 +1,258 @@
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse
+
+AUDIO_EXTENSIONS = (".mp3", ".m4a", ".flac", ".ogg", ".opus", ".wav", ".webm")
+
+
+def normalize_query(query):
+    """Lowercase, drop punctuation and filler words, collapse whitespace"""
+    text = re.sub(r"[^\w\s]", " ", query.lower())
+    text = re.sub(r"^\s*(?:please\s+)?(?:play|put on|queue(?: up)?)\s+", "", text)
+    text = re.sub(r"\b(?:the song|song|please|for me)\b", " ", text)
+    return " ".join(text.split())
+
+
+class YTMusicSearch:
+    """Search backend: YouTube Music song search"""
+
+    def __init__(self, get_client):
+        self.get_client = get_client
+
+    def search(self, query, limit=3):
+        results = self.get_client().search(query, filter="songs", limit=limit)
+        return [
+            {
+                "video_id": r["videoId"],
+                "title": r.get("title", "Unknown Title"),
+                "artist": ", ".join(a["name"] for a in r.get("artists") or []),
+            }
+            for r in results[:limit]
+            if r.get("videoId")
+        ]
+
+
+class YtDlpStreams:
+    """Stream backend: audio stream URL of a YouTube video via yt-dlp"""
+
+    # googlevideo URLs carry their expiry, this is used when one doesn't
+    default_ttl = 3 * 3600
+
+    def __init__(self, ydl_opts):
+        self.ydl_opts = ydl_opts
+
+    def resolve(self, video_id):
+        from yt_dlp import YoutubeDL
+
+        url = f"https://www.youtube.com/watch?v={video_id}"
+        with YoutubeDL(self.ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=False)
+        stream_url = info.get("url")
+        expire = parse_qs(urlparse(stream_url or "").query).get("expire")
+        return {
+            "stream_url": stream_url,
+            "expires_at": (
+                float(expire[0]) if expire else time.time() + self.default_ttl
+            ),
+            "duration": info.get("duration"),
+        }
+
+
+class LocalLibrary:
+    """
+    Search and stream backend over a directory of audio files, matching
+    queries against file names. Works offline, e.g. to test the cache.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _files(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.lower().endswith(AUDIO_EXTENSIONS):
+                    yield os.path.join(root, name)
+
+    def search(self, query, limit=3):
+        words = set(normalize_query(query).split())
+        scored = []
+        for path in self._files():
+            title = os.path.splitext(os.path.basename(path))[0]
+            overlap = len(words & set(normalize_query(title).split()))
+            if overlap:
+                scored.append((overlap, path, title))
+        scored.sort(key=lambda s: -s[0])
+        return [
+            {"video_id": path, "title": title, "artist": ""}
+            for _, path, title in scored[:limit]
+        ]
+
+    def resolve(self, video_id):
+        return {"stream_url": video_id, "expires_at": float("inf"), "duration": None}
+
+
+class MusicResolver:
+    """
+    Resolves music queries to playable tracks through a persistent cache.
+
+    The JSON cache maps a normalized query to the search results (kept for
+    query_ttl) and a video id to its title and stream URL (kept until the URL
+    expires). Expired stream URLs are revalidated with the stream backend only,
+    without searching again. prefetch() resolves on a background thread, so
+    queued and frequently played tracks are ready when they are needed.
+    """
+
+    def __init__(
+        self,
+        search_backend,
+        stream_backend,
+        cache_path="./music_cache.json",
+        query_ttl=7 * 24 * 3600,
+        expiry_margin=300,
+        prefetch_workers=2,
+    ):
+        self.search_backend = search_backend
+        self.stream_backend = stream_backend
+        self.cache_path = cache_path
+        self.query_ttl = query_ttl
+        self.expiry_margin = expiry_margin
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.cache = {"queries": {}, "tracks": {}}
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, encoding="utf-8") as f:
+                    self.cache = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable music cache {cache_path}: {e}")
+        self.prefetcher = ThreadPoolExecutor(
+            max_workers=prefetch_workers, thread_name_prefix="music-prefetch"
+        )
+        self.pending = {}
+        self.stats = {"query_hits": 0, "url_hits": 0, "searches": 0, "resolves": 0}
+
+    def resolve(self, query):
+        """Track dict (query, video_id, title, stream_url, ...) or None"""
+        key = normalize_query(query)
+        with self.lock:
+            pending = self.pending.get(key)
+        if pending is not None:
+            # already being prefetched, wait for it instead of racing it
+            pending.result()
+        track = self._resolve(query, key)
+        if track is not None:
+            with self.lock:
+                entry = self.cache["tracks"][track["video_id"]]
+                entry["plays"] = entry.get("plays", 0) + 1
+            self._save()
+        return track
+
+    def prefetch(self, query):
+        """Resolve query in the background so a later resolve() is a cache hit"""
+        key = normalize_query(query)
+
+        def job():
+            try:
+                self._resolve(query, key)
+                self._save()
+            except Exception as e:
+                print(f"Prefetching '{query}' failed: {e}")
+            finally:
+                with self.lock:
+                    self.pending.pop(key, None)
+
+        with self.lock:
+            if key in self.pending and not self.pending[key].done():
+                return self.pending[key]
+            future = self.pending[key] = self.prefetcher.submit(job)
+        return future
+
+    def prefetch_favourites(self, count=3):
+        """Revalidate the stream URLs of the most played tracks in the background"""
+        with self.lock:
+            tracks = sorted(
+                self.cache["tracks"].items(), key=lambda t: -t[1].get("plays", 0)
+            )
+        for video_id, entry in tracks[:count]:
+            if entry.get("plays"):
+                self.prefetcher.submit(self._revalidate, video_id)
+
+    def _resolve(self, query, key):
+        video_id = self._video_id(query, key)
+        if video_id is None:
+            return None
+        track = self._stream(video_id)
+        return {"query": query, **track} if track is not None else None
+
+    def _revalidate(self, video_id):
+        try:
+            if self._stream(video_id) is not None:
+                self._save()
+        except Exception as e:
+            print(f"Prefetching {video_id} failed: {e}")
+
+    def _video_id(self, query, key):
+        """First search result for query, searching only if it isn't cached"""
+        with self.lock:
+            entry = self.cache["queries"].get(key)
+            if entry and time.time() - entry["time"] < self.query_ttl:
+                self.stats["query_hits"] += 1
+                return entry["video_ids"][0]
+
+        start_time = time.perf_counter()
+        results = self.search_backend.search(query)
+        self.stats["searches"] += 1
+        if not results:
+            return None
+        with self.lock:
+            self.cache["queries"][key] = {
+                "video_ids": [r["video_id"] for r in results],
+                "time": time.time(),
+            }
+            for r in results:
+                self.cache["tracks"].setdefault(r["video_id"], {}).update(
+                    title=r["title"], artist=r.get("artist", "")
+                )
+        print(f"Searched '{query}' in {time.perf_counter() - start_time:.2f}s")
+        return results[0]["video_id"]
+
+    def _stream(self, video_id):
+        """Track with a stream URL valid for a while, revalidating if expired"""
+        with self.lock:
+            entry = dict(self.cache["tracks"].get(video_id, {}))
+        if entry.get("stream_url") and (
+            entry.get("expires_at", 0) - self.expiry_margin > time.time()
+        ):
+            self.stats["url_hits"] += 1
+        else:
+            start_time = time.perf_counter()
+            stream = self.stream_backend.resolve(video_id)
+            self.stats["resolves"] += 1
+            if not stream.get("stream_url"):
+                return None
+            with self.lock:
+                self.cache["tracks"].setdefault(video_id, {}).update(stream)
+                entry = dict(self.cache["tracks"][video_id])
+            print(
+                f"Resolved stream for {entry.get('title', video_id)} "
+                f"in {time.perf_counter() - start_time:.2f}s"
+            )
+        return {"video_id": video_id, "title": entry.get("title", video_id), **entry}
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        with self.lock:
+            data = json.dumps(self.cache)
+        tmp_path = f"{self.cache_path}.tmp"
+        with self.save_lock:
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(data)
+                os.replace(tmp_path, self.cache_path)
+            except OSError as e:
+                print(f"Could not write music cache {self.cache_path}: {e}")
@@ -0,0 +1,173 @@
+import queue
+import threading
+
+
+class MusicPlayer:
+    """
+    Background music playback through VLC.
+
+    Requests are resolved and started on a worker thread, so the caller (and
+    the conversation loop) continues right away. The worker also watches the
+    player and starts the next queued track when one ends. Queued queries are
+    handed to prefetch() so they resolve in the background before their
+    turn, and the next one is prefetched again when a track starts, in case
+    its stream URL expired while waiting. While the
+    assistant listens or speaks the volume is ducked, duck()/unduck() calls
+    nest.
+    """
+
+    def __init__(
+        self,
+        resolve,
+        vlc_backend,
+        prefetch=None,
+        volume=80,
+        duck_volume=15,
+        poll_sec=0.5,
+    ):
+        # resolve(query) -> {"title", "stream_url", ...} or None
+        self.resolve = resolve
+        self.prefetch = prefetch
+        self.vlc, self.vlc_instance, self.player = vlc_backend
+        self.volume = volume
+        self.duck_volume = duck_volume
+        self.poll_sec = poll_sec
+        self.current = None
+        self.upcoming = []
+        self.paused = False
+        self._duck_depth = 0
+        self.lock = threading.Lock()
+        self.jobs = queue.Queue()
+        self.thread = threading.Thread(target=self._worker, name="music", daemon=True)
+        self.thread.start()
+
+    def play(self, query):
+        """Play query now, replacing the current track (the queue is kept)"""
+        self.jobs.put(lambda: self._start(self.resolve(query), query))
+
+    def enqueue(self, query):
+        """Add query after the queued tracks, starting it if nothing is playing"""
+
+        def job():
+            with self.lock:
+                self.upcoming.append(query)
+                idle = self.current is None
+            print(f"Queued: {query}")
+            if idle:
+                self._next()
+            elif self.prefetch is not None:
+                self.prefetch(query)
+
+        self.jobs.put(job)
+
+    def pause(self):
+        with self.lock:
+            if self.current is not None and not self.paused:
+                self.player.set_pause(1)
+                self.paused = True
+
+    def resume(self):
+        with self.lock:
+            if self.current is not None and self.paused:
+                self.player.set_pause(0)
+                self.paused = False
+
+    def stop(self):
+        """Stop playback and clear the queue"""
+        with self.lock:
+            self.upcoming.clear()
+            self.current = None
+            self.paused = False
+        self.player.stop()
+
+    def skip(self):
+        self.jobs.put(self._next)
+
+    def set_volume(self, volume):
+        with self.lock:
+            self.volume = max(0, min(100, int(volume)))
+            self._apply_volume()
+
+    def duck(self):
+        """Lower the volume while the assistant listens or speaks"""
+        with self.lock:
+            self._duck_depth += 1
+            self._apply_volume()
+
+    def unduck(self):
+        with self.lock:
+            self._duck_depth = max(self._duck_depth - 1, 0)
+            self._apply_volume()
+
+    def status(self):
+        with self.lock:
+            return {
+                "playing": self.current["title"] if self.current else None,
+                "paused": self.paused,
+                "queued": list(self.upcoming),
+                "volume": self.volume,
+                "ducked": self._duck_depth > 0,
+            }
+
+    def _apply_volume(self):
+        ducked = self._duck_depth > 0
+        self.player.audio_set_volume(
+            min(self.duck_volume, self.volume) if ducked else self.volume
+        )
+
+    def _start(self, track, query=None):
+        if track is None:
+            print(f"No track found for query: {query}")
+            return
+        media = self.vlc_instance.media_new(track["stream_url"])
+        with self.lock:
+            self.player.set_media(media)
+            self.player.play()
+            self.current = track
+            self.paused = False
+            self._apply_volume()
+        print(f"Now playing: {track['title']}")
+        with self.lock:
+            following = self.upcoming[0] if self.upcoming else None
+        if following is not None and self.prefetch is not None:
+            self.prefetch(following)
+
+    def _next(self):
+        while True:
+            with self.lock:
+                query = self.upcoming.pop(0) if self.upcoming else None
+            if query is None:
+                with self.lock:
+                    self.current = None
+                self.player.stop()
+                return
+            track = self.resolve(query)
+            if track is not None:
+                self._start(track)
+                return
+            print(f"No track found for query: {query}")
+
+    def _worker(self):
+        while True:
+            try:
+                job = self.jobs.get(timeout=self.poll_sec)
+            except queue.Empty:
+                job = None
+            if job is not None:
+                try:
+                    job()
+                except Exception as e:
+                    print(f"Music playback error: {e}")
+                continue
+
+            with self.lock:
+                active = self.current is not None
+            if not active:
+                continue
+            state = self.player.get_state()
+            if state == self.vlc.State.Ended:
+                print("Playback finished.")
+                self._next()
+            elif state == self.vlc.State.Error:
+                print("Error during playback.")
+                self._next()
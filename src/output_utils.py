@@ -1,68 +1,195 @@
+import contextvars
 import os
+import queue
+import threading
 import time
 import numpy as np
-import simpleaudio as sa
 import soundfile as sf
-import torch
-from kokoro import KPipeline
+from src.text_utils import iter_sentences
+from src.playback_utils import AudioSink
+from src.tts_cache import TTSCache, COMMON_PHRASES
+from src.tts_onnx import load_onnx_pipeline, onnx_model_version
+from src.startup_utils import StartupTimer, BackgroundLoader
+from src.trace_utils import tracer
 
 
 class AudioOutputProcessor:
-    def __init__(self, sample_rate=24000, voice="af_heart"):
-        # Detect device
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"Using device for TTS: {self.device}")
-
-        # Initialize TTS pipeline
-        self.pipeline = KPipeline(lang_code="a", device=self.device)
+    def __init__(
+        self,
+        sample_rate=24000,
+        voice="af_heart",
+        cache_dir="./tts_cache",
+        prerender_phrases=COMMON_PHRASES,
+        max_cached_chars=80,
+        timer=None,
+        sink=None,
+        pipeline=None,
+        responses_dir="./responses",
+        archive=None,
+        tts_backend="torch",
+        onnx_model="./kokoro-v1.0.onnx",
+        onnx_voices="./voices-v1.0.bin",
+        onnx_int8=False,
+    ):
+        timer = timer or StartupTimer()
 
         # Settings
         self.sample_rate = sample_rate
         self.default_voice = voice
+        # "torch" runs KPipeline, "onnx" an ONNX export of Kokoro with onnxruntime
+        self.tts_backend = tts_backend
+        self.onnx_model = onnx_model
+        self.onnx_voices = onnx_voices
+        self.onnx_int8 = onnx_int8
+
+        # Kokoro loads and warms up in the background, first use waits for it,
+        # unless an already loaded (e.g. shared) pipeline is passed in
+        self._pipeline_loader = BackgroundLoader(
+            "Kokoro TTS",
+            lambda: pipeline if pipeline is not None else self._load_pipeline(),
+            timer,
+        )
+
+        # One persistent output stream fed through a bounded jitter queue
+        if sink is not None:
+            self.sink = sink
+        else:
+            with timer.track("Audio output (PyAudio)"):
+                self.sink = AudioSink(sample_rate=sample_rate)
+
+        # Rendered audio for short texts (fixed replies, greetings, short sentences)
+        # is cached in memory and on disk, set cache_dir to None to disable
+        self.max_cached_chars = max_cached_chars
+        model_version = (
+            onnx_model_version(onnx_model, onnx_int8) if tts_backend == "onnx" else None
+        )
+        self.tts_cache = (
+            TTSCache(cache_dir, model_version=model_version) if cache_dir else None
+        )
+        if self.tts_cache is not None and prerender_phrases:
+            BackgroundLoader(
+                "TTS phrase cache", lambda: self.prerender(prerender_phrases), timer
+            )
 
         # Message counter for unique filenames
+        self.responses_dir = responses_dir
         self.message_count = 0
 
+        # AudioArchive (or a tagged view of one) every synthesized sentence is
+        # queued to, None to keep nothing
+        self.archive = archive
+
+    def _load_pipeline(self):
+        """Load Kokoro and synthesize a short phrase to load the voice and warm up"""
+        if self.tts_backend == "onnx":
+            print(f"Using ONNX Kokoro for TTS: {self.onnx_model}")
+            return load_onnx_pipeline(
+                self.onnx_model,
+                self.onnx_voices,
+                voice=self.default_voice,
+                int8=self.onnx_int8,
+            )
+
+        import torch
+        from kokoro import KPipeline
+
+        # Detect device
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        print(f"Using device for TTS: {self.device}")
+
+        pipeline = KPipeline(lang_code="a", device=self.device)
+        for _ in pipeline("Hello.", voice=self.default_voice):
+            pass
+        return pipeline
+
+    @property
+    def pipeline(self):
+        return self._pipeline_loader.get()
+
     def generate_audio(self, text, voice=None, speed=1, split_pattern=r"\n+"):
         """Generate audio segments from the given text"""
         if not text:
             return []
 
+        return list(self.synthesize(text, voice, speed, split_pattern))
+
+    def synthesize(self, text, voice=None, speed=1, split_pattern=r"\n+"):
+        """
+        Yield (graphemes, phonemes, audio) segments for text, served from the
+        waveform cache when this text has been rendered before.
+        """
         voice = voice or self.default_voice
-        generator = self.pipeline(
+        cacheable = self.tts_cache is not None and len(text) <= self.max_cached_chars
+        if cacheable:
+            start_time = time.perf_counter()
+            audio = self.tts_cache.get(text, voice, speed)
+            if audio is not None:
+                tracer.record(
+                    "tts",
+                    time.perf_counter() - start_time,
+                    chars=len(text),
+                    audio_sec=len(audio) / self.sample_rate,
+                    cached=True,
+                )
+                yield text, None, audio
+                return
+
+        rendered = []
+        # synthesis time only, the clock is paused while the caller plays a segment
+        compute_sec = 0.0
+        audio_sec = 0.0
+        resume_time = time.perf_counter()
+        for graphemes, phonemes, audio in self.pipeline(
             text, voice=voice, speed=speed, split_pattern=split_pattern
+        ):
+            compute_sec += time.perf_counter() - resume_time
+            if audio is not None:
+                audio_sec += len(audio) / self.sample_rate
+            if cacheable and audio is not None:
+                rendered.append(
+                    audio.detach().cpu().numpy() if hasattr(audio, "detach") else audio
+                )
+            yield graphemes, phonemes, audio
+            resume_time = time.perf_counter()
+        compute_sec += time.perf_counter() - resume_time
+        tracer.record(
+            "tts", compute_sec, chars=len(text), audio_sec=audio_sec, cached=False
         )
-        return list(generator)
 
-    def play_audio(self, audio):
-        """Play a single audio segment"""
-        # If audio is a PyTorch tensor, convert it to a NumPy array
-        if hasattr(audio, "detach"):
-            audio = audio.detach().cpu().numpy()
+        if rendered:
+            self.tts_cache.put(text, voice, speed, np.concatenate(rendered))
 
-        # Normalize audio to the range [-1, 1] and convert to int16
-        max_val = np.max(np.abs(audio))
-        if max_val > 0:
-            audio_norm = audio / max_val
-        else:
-            audio_norm = audio
+    def prerender(self, phrases, voice=None, speed=1):
+        """Render phrases into the cache so they play with no synthesis delay"""
+        start_time = time.perf_counter()
+        for phrase in phrases:
+            for sentence in iter_sentences([phrase]):
+                for _ in self.synthesize(sentence, voice, speed):
+                    pass
+        print(
+            f"Pre-rendered {len(phrases)} phrases in {time.perf_counter() - start_time:.2f}s"
+        )
 
-        audio_int16 = np.int16(audio_norm * 32767)
-        play_obj = sa.play_buffer(audio_int16, 1, 2, self.sample_rate)
-        play_obj.wait_done()
+    def play_audio(self, audio):
+        """Play a single audio segment and wait for it to finish"""
+        self.sink.play(audio)
+        self.sink.drain()
 
-    def play_audio_segments(self, segments, pause_duration=0.1):
-        """Play all audio segments with a pause between them"""
+    def play_audio_segments(self, segments, pause_duration=0.0):
+        """Play all audio segments back to back, optionally separated by silence"""
         if not segments:
             print("No audio segments to play")
             return
 
+        silence = np.zeros(int(self.sample_rate * pause_duration), dtype=np.int16)
         for _, _, audio in segments:
-            self.play_audio(audio)
-            time.sleep(pause_duration)
+            self.sink.play(audio)
+            if silence.size:
+                self.sink.play(silence)
+        self.sink.drain()
 
     def save_audio(self, audio, filename=None):
-        """Save audio to file"""
+        """Save audio to a WAV file, in responses_dir unless a filename is given"""
         if filename is None:
             self.message_count += 1
             filename = os.path.join(
@@ -72,6 +199,7 @@ class AudioOutputProcessor:
         if hasattr(audio, "detach"):
             audio = audio.detach().cpu().numpy()
 
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
         sf.write(filename, audio, self.sample_rate)
         return filename
 
@@ -87,17 +215,138 @@ class AudioOutputProcessor:
             filenames.append(filename)
         return filenames
 
-    def speak_text(self, text, voice=None, speed=1, save=False):
-        """Complete pipeline: generate, play, and optionally save audio for text"""
+    def speak_text(self, text, voice=None, speed=1, save=False, interrupt=None):
+        """
+        Complete pipeline: generate, play, and optionally save audio for text.
+        Setting the interrupt event (barge-in) stops synthesis and playback.
+        """
 
         word_count = len(text.split())
         speed = 1
         if word_count > 30:
             speed = 1.5
 
-        segments = self.generate_audio(text, voice, speed)
-        self.play_audio_segments(segments)
+        _, segments = self._speak_sentences(
+            iter_sentences([text]),
+            voice,
+            speed,
+            keep_segments=save,
+            interrupt=interrupt,
+        )
 
         if save:
             return self.save_audio_segments(segments)
         return None
+
+    def speak_stream(self, text_chunks, voice=None, speed=1, interrupt=None):
+        """
+        Speak text as it streams in: every completed sentence is handed to the
+        synthesis worker right away, so the first sentence plays while the rest
+        of the reply is still being generated. Setting the interrupt event
+        stops reading text_chunks, synthesis and playback.
+
+        Returns:
+            str: the text that was spoken (up to the interruption)
+        """
+        sentences = iter_sentences(text_chunks)
+        try:
+            spoken, _ = self._speak_sentences(
+                sentences, voice, speed, interrupt=interrupt
+            )
+        finally:
+            # stops the LLM stream too if we were interrupted
+            sentences.close()
+            if hasattr(text_chunks, "close"):
+                text_chunks.close()
+        return " ".join(spoken)
+
+    def _speak_sentences(
+        self, sentences, voice, speed, keep_segments=False, interrupt=None
+    ):
+        """
+        Feed sentences to a synthesis worker that runs ahead of playback and
+        pushes audio into the sink, then wait until everything has played or
+        interrupt is set (whoever sets it clears the sink).
+
+        Returns:
+            tuple: (sentences spoken, synthesized segments if keep_segments)
+        """
+        voice = voice or self.default_voice
+        interrupt = interrupt or threading.Event()
+        text_queue = queue.Queue()
+        segments = []
+        stats = {}
+        with tracer.span("playback") as span:
+            # the worker's tts spans belong to the current turn
+            synthesizer = threading.Thread(
+                target=contextvars.copy_context().run,
+                args=(
+                    self._synthesis_worker,
+                    text_queue,
+                    voice,
+                    speed,
+                    segments if keep_segments else None,
+                    stats,
+                    interrupt,
+                ),
+                daemon=True,
+            )
+            synthesizer.start()
+
+            spoken = []
+            for sentence in sentences:
+                if interrupt.is_set():
+                    break
+                spoken.append(sentence)
+                text_queue.put(sentence)
+            text_queue.put(None)
+
+            # an interrupted worker drops what it is synthesizing, don't wait for it
+            while synthesizer.is_alive() and not interrupt.is_set():
+                synthesizer.join(timeout=0.05)
+            self.sink.drain()
+            if interrupt.is_set():
+                # a segment the worker queued just before it noticed
+                self.sink.clear()
+            span.set(sentences=len(spoken), interrupted=interrupt.is_set(), **stats)
+        return spoken, segments
+
+    def _synthesis_worker(
+        self, text_queue, voice, speed, segments=None, stats=None, interrupt=None
+    ):
+        """
+        Synthesize queued sentences into the sink until a None sentinel arrives
+        or interrupt is set, noting time to first audio and seconds of audio in stats
+        """
+        interrupt = interrupt or threading.Event()
+        stats = stats if stats is not None else {}
+        stats["audio_sec"] = 0.0
+        start_time = time.perf_counter()
+        first_audio = True
+        try:
+            while True:
+                sentence = text_queue.get()
+                if sentence is None or interrupt.is_set():
+                    break
+                for result in self.synthesize(sentence, voice, speed):
+                    if interrupt.is_set():
+                        return
+                    if segments is not None:
+                        segments.append(result)
+                    graphemes, _, audio = result
+                    # KPipeline yields no audio for chunks it could not phonemize
+                    if audio is None:
+                        continue
+                    if first_audio:
+                        first_audio = False
+                        stats["first_audio_sec"] = time.perf_counter() - start_time
+                        print(f"Time to first audio: {stats['first_audio_sec']:.2f}s")
+                    stats["audio_sec"] += len(audio) / self.sample_rate
+                    if self.archive is not None:
+                        self.archive.add(
+                            "assistant", audio, self.sample_rate, text=graphemes
+                        )
+                    self.sink.play(audio)
+        except Exception as e:
+            # the rest of the reply is dropped, what was queued still plays out
+            print(f"Error synthesizing speech: {e}")
@@ -0,0 +1,150 @@
+import queue
+import threading
+import time
+from collections import deque
+import numpy as np
+
+
+def to_int16(audio):
+    """Convert a float waveform (NumPy array or torch tensor) to peak-normalized int16"""
+    # If audio is a PyTorch tensor, convert it to a NumPy array
+    if hasattr(audio, "detach"):
+        audio = audio.detach().cpu().numpy()
+    if audio.dtype == np.int16:
+        return audio
+
+    # Normalize audio to the range [-1, 1] and convert to int16
+    max_val = np.max(np.abs(audio)) if audio.size else 0
+    if max_val > 0:
+        audio = audio / max_val
+    return np.int16(audio * 32767)
+
+
+class PlaybackReference:
+    """
+    Level of the audio recently sent to the output device, by wall-clock time,
+    the reference signal for the echo gate
+    """
+
+    def __init__(self, history_sec=5.0, block_sec=0.04):
+        # (time.time() the block was written, RMS of the block)
+        self.blocks = deque(maxlen=int(history_sec / block_sec) + 1)
+
+    def add(self, block):
+        rms = float(np.sqrt(np.mean(np.square(block, dtype=np.float64))))
+        self.blocks.append((time.time(), rms))
+
+    def level(self, start_time, end_time):
+        """Loudest block written between start_time and end_time, 0 if none"""
+        level = 0.0
+        # the writer thread appends while we read, iterate over a copy
+        for written, rms in reversed(list(self.blocks)):
+            if written < start_time:
+                break
+            if written <= end_time:
+                level = max(level, rms)
+        return level
+
+
+class AudioSink:
+    """
+    Gapless audio output through one persistent PyAudio stream.
+
+    Producers push segments into a bounded jitter queue, a writer thread feeds
+    them to the device back to back in small blocks. A full queue blocks the
+    producer, which keeps synthesis at most max_queued segments ahead.
+    """
+
+    def __init__(self, sample_rate=24000, max_queued=8, block_size=1024):
+        import pyaudio
+
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.audio_interface = pyaudio.PyAudio()
+        self.stream = self.audio_interface.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=sample_rate,
+            output=True,
+            frames_per_buffer=block_size,
+        )
+        self.queue = queue.Queue(maxsize=max_queued)
+        # what was played when, so the mic can tell the assistant's echo from the user
+        self.reference = PlaybackReference(block_sec=block_size / sample_rate)
+        # bumped by clear() so the writer drops the segment it is in the middle of
+        self._generation = 0
+        self._closed = threading.Event()
+        self.thread = threading.Thread(target=self._writer, daemon=True)
+        self.thread.start()
+
+    def play(self, audio):
+        """Queue a segment for playback, blocking while the jitter queue is full"""
+        self.queue.put((self._generation, to_int16(audio)))
+
+    def drain(self):
+        """Block until everything queued so far has been written to the device"""
+        self.queue.join()
+
+    def clear(self):
+        """Drop queued audio and stop the current segment after its current block"""
+        self._generation += 1
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+            self.queue.task_done()
+
+    def close(self):
+        self.clear()
+        self._closed.set()
+        self.queue.put((None, None))
+        self.thread.join(timeout=1)
+        self.stream.stop_stream()
+        self.stream.close()
+        self.audio_interface.terminate()
+
+    def _writer(self):
+        while not self._closed.is_set():
+            generation, audio = self.queue.get()
+            try:
+                if audio is None:
+                    break
+                for start in range(0, len(audio), self.block_size):
+                    if generation != self._generation:
+                        break
+                    block = audio[start : start + self.block_size]
+                    self.stream.write(block.tobytes())
+                    self.reference.add(block)
+            finally:
+                self.queue.task_done()
+
+
+class NullSink:
+    """
+    AudioSink stand-in that discards audio, for benchmarks and headless runs.
+    Records when the first sample arrived and how much audio was played.
+    """
+
+    def __init__(self, sample_rate=24000):
+        self.sample_rate = sample_rate
+        self.first_audio_time = None
+        self.samples_played = 0
+
+    def play(self, audio):
+        if self.first_audio_time is None:
+            self.first_audio_time = time.perf_counter()
+        self.samples_played += len(audio)
+
+    def drain(self):
+        pass
+
+    def clear(self):
+        pass
+
+    def close(self):
+        pass
+
+    def reset(self):
+        self.first_audio_time = None
+        self.samples_played = 0
@@ -0,0 +1,679 @@
+import contextlib
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, is_dataclass
+from multiprocessing import shared_memory
+from types import SimpleNamespace
+import numpy as np
+from src.capture_utils import AudioRingBuffer
+
+# thread pool sizes read by torch, CTranslate2 and the BLAS libraries at import
+THREAD_ENV = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+STAGES = ("main", "wakeword", "asr", "tts")
+
+
+class SharedAudioRing(AudioRingBuffer):
+    """
+    AudioRingBuffer in shared memory, written by one process and read by others.
+
+    The block holds an int64 header (write index, closed flag, consumer's read
+    index), the chunk timestamps and the samples. Readers poll the write index,
+    sleeping about as long as the missing audio takes to arrive. With
+    flow_control the writer waits instead of overwriting samples the consumer
+    has not released with consumed(). Pickling (e.g. as a Process argument)
+    attaches the other process to the same block.
+    """
+
+    HEADER = 3
+
+    def __init__(
+        self,
+        chunk_size,
+        num_chunks,
+        dtype=np.int16,
+        rate=16000,
+        flow_control=False,
+        name=None,
+    ):
+        self.chunk_size = chunk_size
+        self.num_chunks = num_chunks
+        self.capacity = chunk_size * num_chunks
+        self.dtype = np.dtype(dtype)
+        self.rate = rate
+        self.flow_control = flow_control
+        self.owner = name is None
+        header_bytes = self.HEADER * 8
+        timestamp_bytes = num_chunks * 8
+        self.shm = shared_memory.SharedMemory(
+            name=name,
+            create=self.owner,
+            size=header_bytes + timestamp_bytes + self.capacity * self.dtype.itemsize,
+        )
+        self.header = np.ndarray(self.HEADER, np.int64, self.shm.buf)
+        self.timestamps = np.ndarray(num_chunks, np.float64, self.shm.buf, header_bytes)
+        self.buffer = np.ndarray(
+            self.capacity, self.dtype, self.shm.buf, header_bytes + timestamp_bytes
+        )
+        if self.owner:
+            self.header[:] = 0
+
+    def __reduce__(self):
+        return (
+            SharedAudioRing,
+            (
+                self.chunk_size,
+                self.num_chunks,
+                self.dtype.str,
+                self.rate,
+                self.flow_control,
+                self.shm.name,
+            ),
+        )
+
+    @property
+    def write_index(self):
+        return int(self.header[0])
+
+    @property
+    def closed(self):
+        return bool(self.header[1])
+
+    def write(self, samples, timestamp=None, abort=None):
+        """
+        Append samples, any length up to the capacity. With flow control this
+        waits for the consumer, returns False if the ring is closed or abort()
+        turns true meanwhile.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        n = len(samples)
+        if self.flow_control:
+            if n > self.capacity:
+                raise ValueError(
+                    f"{n} samples do not fit in the ring ({self.capacity})"
+                )
+            while self.write_index + n - self.header[2] > self.capacity:
+                if self.closed or (abort is not None and abort()):
+                    return False
+                time.sleep(0.005)
+        write_index = self.write_index
+        start = write_index % self.capacity
+        first = min(n, self.capacity - start)
+        self.buffer[start : start + first] = samples[:first]
+        if first < n:
+            self.buffer[: n - first] = samples[first:]
+        end = write_index + n
+        self.timestamps[((end - 1) // self.chunk_size) % self.num_chunks] = timestamp
+        # publish the new index only once the samples are in place
+        self.header[0] = end
+        return True
+
+    def consumed(self, index):
+        """Release the samples before index for the flow-controlled writer"""
+        self.header[2] = index
+
+    def close(self):
+        self.header[1] = 1
+
+    def wait_for(self, index, timeout=None):
+        """Block until the sample at index - 1 has been written, False on timeout/close"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            missing = index - self.write_index
+            if missing <= 0:
+                return True
+            if self.closed:
+                return False
+            delay = min(max(missing / self.rate, 0.001), 0.02)
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                delay = min(delay, remaining)
+            time.sleep(delay)
+
+    def release(self):
+        """Detach from the shared block, and free it in the creating process"""
+        self.header = self.timestamps = self.buffer = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # a caller still holds a view, the mapping goes with the process
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def parse_cores(spec):
+    """'2-3' or '2,3' -> [2, 3]"""
+    cores = []
+    for part in spec.split(","):
+        first, _, last = part.partition("-")
+        cores.extend(range(int(first), int(last or first) + 1))
+    return cores
+
+
+def plan_budgets(specs=None):
+    """
+    CPU budget, (threads, cores or None), of every stage.
+
+    specs are 'stage=cores' strings, e.g. ['wakeword=1', 'asr=2-3', 'tts=4-5'],
+    a stage gets one thread per core. Unspecified stages share the cores: with
+    four or more the main process (VAD, LLM client, playback) and the wakeword
+    stage get one each and ASR and TTS split the rest, on smaller machines
+    nothing is pinned.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        available = sorted(os.sched_getaffinity(0))
+    else:
+        available = list(range(os.cpu_count() or 1))
+    budgets = {}
+    for spec in specs or []:
+        stage, _, cores = spec.partition("=")
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage '{stage}', expected one of {STAGES}")
+        cores = parse_cores(cores)
+        budgets[stage] = (len(cores), cores)
+
+    if len(available) >= 4:
+        taken = {core for _, cores in budgets.values() for core in cores}
+        free = [core for core in available if core not in taken] or available
+        for stage in ("main", "wakeword"):
+            if stage not in budgets:
+                cores = free[:1]
+                free = free[1:] or cores
+                budgets[stage] = (1, cores)
+        missing = [stage for stage in ("asr", "tts") if stage not in budgets]
+        if missing:
+            # split what is left evenly, the first stage gets the odd core
+            shares = np.array_split(free, min(len(missing), len(free)))
+            for i, stage in enumerate(missing):
+                cores = [int(core) for core in shares[min(i, len(shares) - 1)]]
+                budgets[stage] = (len(cores), cores)
+    else:
+        shared = max(len(available) // 2, 1)
+        for stage, threads in (("main", 1), ("wakeword", 1)):
+            budgets.setdefault(stage, (threads, None))
+        for stage in ("asr", "tts"):
+            budgets.setdefault(stage, (shared, None))
+    return budgets
+
+
+def apply_cpu_budget(threads, cores=None):
+    """
+    Pin this process to cores and size the thread pools of libraries it has
+    not imported yet. Those already imported (numpy's BLAS) keep their pools,
+    stage processes get theirs from thread_environment.
+    """
+    for name in THREAD_ENV:
+        os.environ[name] = str(threads)
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+
+@contextlib.contextmanager
+def thread_environment(threads):
+    """
+    THREAD_ENV set to threads for the processes started in the block. A spawned
+    child re-imports __main__, and numpy with it, before its target runs, so
+    the sizes have to be in the environment it inherits.
+    """
+    saved = {name: os.environ.get(name) for name in THREAD_ENV}
+    os.environ.update({name: str(threads) for name in THREAD_ENV})
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _plain(obj):
+    """Picklable copy of a faster-whisper dataclass/namedtuple result"""
+    if is_dataclass(obj):
+        return SimpleNamespace(**asdict(obj))
+    if hasattr(obj, "_asdict"):
+        return SimpleNamespace(**obj._asdict())
+    return obj
+
+
+def load_whisper(model_size, device, threads):
+    from faster_whisper import WhisperModel
+
+    model = WhisperModel(
+        model_size,
+        device=device,
+        compute_type="float16" if device == "cuda" else "float32",
+        cpu_threads=threads,
+    )
+    segments, _ = model.transcribe(np.zeros(16000, dtype=np.float32), beam_size=1)
+    list(segments)
+    return model
+
+
+def load_kokoro(lang_code, voice, threads):
+    import torch
+    from kokoro import KPipeline
+
+    torch.set_num_threads(threads)
+    pipeline = KPipeline(lang_code=lang_code, device="cpu")
+    for _ in pipeline("Hello.", voice=voice):
+        pass
+    return pipeline
+
+
+def load_onnx_kokoro(model_path, voices_path, int8, lang_code, voice, threads):
+    """load_kokoro for the ONNX backend, bind the files with functools.partial"""
+    from src.tts_onnx import load_onnx_pipeline
+
+    return load_onnx_pipeline(
+        model_path, voices_path, lang_code, voice, threads=threads, int8=int8
+    )
+
+
+def load_wakeword(model_paths, thresholds, gate_rms, threads):
+    from src.wakeword_utils import WakewordEngine
+
+    return WakewordEngine(
+        model_paths, thresholds=thresholds, gate_rms=gate_rms, ncpu=threads
+    )
+
+
+def open_microphone(rate, chunk_size):
+    """(stream, cleanup) of the default PyAudio input device"""
+    import pyaudio
+
+    audio_interface = pyaudio.PyAudio()
+    stream = audio_interface.open(
+        format=pyaudio.paInt16,
+        channels=1,
+        rate=rate,
+        input=True,
+        frames_per_buffer=chunk_size,
+    )
+
+    def cleanup():
+        stream.stop_stream()
+        stream.close()
+        audio_interface.terminate()
+
+    return stream, cleanup
+
+
+class StageProcess:
+    """
+    A model in a worker process with its own CPU budget.
+
+    Requests and replies are small (kind, request_id, payload) messages on two
+    queues, audio travels through a SharedAudioRing. The child loads the model
+    with load(*load_args, threads) and sends 'ready', calls wait for that first.
+    """
+
+    def __init__(self, name, target, ring, load, load_args, budget, context=None):
+        context = context or mp.get_context("spawn")
+        self.name = name
+        self.ring = ring
+        self.requests = context.Queue()
+        self.replies = context.Queue()
+        self.lock = threading.Lock()
+        self._ready_lock = threading.Lock()
+        self._ready = False
+        self.extra = self._extra_args(context)
+        self.process = context.Process(
+            target=target,
+            args=(self.ring, self.requests, self.replies, load, load_args, budget)
+            + self.extra,
+            name=name,
+            daemon=True,
+        )
+        with thread_environment(budget[0]):
+            self.process.start()
+
+    def _extra_args(self, context):
+        return ()
+
+    def wait_ready(self):
+        """Block until the child has loaded its model, raises if that failed"""
+        with self._ready_lock:
+            if not self._ready:
+                kind, _, payload = self._reply()
+                if kind == "error":
+                    raise RuntimeError(f"{self.name} process failed to load: {payload}")
+                self._ready = True
+                print(f"{self.name} process ready (loaded in {payload:.2f}s)")
+        return self
+
+    def _reply(self):
+        while True:
+            try:
+                return self.replies.get(timeout=0.5)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    raise RuntimeError(f"{self.name} process exited")
+
+    def close(self):
+        self.requests.put(None)
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.ring.release()
+
+
+def _child_setup(replies, load, load_args, budget):
+    """Apply the budget and load the model in a stage process, None if it failed"""
+    threads, cores = budget
+    apply_cpu_budget(threads, cores)
+    start_time = time.perf_counter()
+    try:
+        model = load(*load_args, threads)
+    except Exception as e:
+        replies.put(("error", 0, f"{type(e).__name__}: {e}"))
+        return None
+    replies.put(("ready", 0, time.perf_counter() - start_time))
+    return model
+
+
+class WhisperStage(StageProcess):
+    """
+    WhisperModel stand-in that decodes in a worker process.
+
+    transcribe() writes the audio into the shared ring and sends only its
+    sample range and the decode options, the child returns the materialized
+    segments and info as plain namespaces. Calls are serialized.
+    """
+
+    def __init__(
+        self,
+        model_size,
+        budget=(1, None),
+        device="cpu",
+        max_audio_sec=120,
+        rate=16000,
+        load=load_whisper,
+        context=None,
+    ):
+        ring = SharedAudioRing(
+            rate, max_audio_sec, dtype=np.float32, rate=rate, flow_control=True
+        )
+        super().__init__(
+            "ASR", _whisper_main, ring, load, (model_size, device), budget, context
+        )
+        self.request_ids = itertools.count(1)
+
+    def transcribe(self, audio, **kwargs):
+        audio = np.asarray(audio, dtype=np.float32)
+        with self.lock:
+            self.wait_ready()
+            start = self.ring.write_index
+            self.ring.write(audio)
+            request_id = next(self.request_ids)
+            self.requests.put((request_id, (start, start + len(audio), kwargs)))
+            kind, _, payload = self._reply()
+        if kind == "error":
+            raise RuntimeError(f"ASR process: {payload}")
+        return payload
+
+
+def _whisper_main(ring, requests, replies, load, load_args, budget):
+    model = _child_setup(replies, load, load_args, budget)
+    while model is not None:
+        request = requests.get()
+        if request is None:
+            break
+        request_id, (start, end, kwargs) = request
+        try:
+            segments, info = model.transcribe(ring.view(start, end), **kwargs)
+            # decoding happens while the segments are iterated, here
+            segments = [_plain(segment) for segment in segments]
+            replies.put(("ok", request_id, (segments, _plain(info))))
+        except Exception as e:
+            replies.put(("error", request_id, f"{type(e).__name__}: {e}"))
+        finally:
+            ring.consumed(end)
+    ring.release()
+
+
+class KokoroStage(StageProcess):
+    """
+    KPipeline stand-in that synthesizes in a worker process.
+
+    Only the text and options go over the request queue. Each synthesized
+    segment is written to the shared ring, which is flow controlled so the
+    child runs at most buffer_sec ahead of its consumer, and announced with its
+    sample range. Closing the generator early (barge-in) cancels the rest of
+    the request.
+    """
+
+    def __init__(
+        self,
+        lang_code="a",
+        voice="af_heart",
+        budget=(1, None),
+        buffer_sec=30,
+        rate=24000,
+        load=load_kokoro,
+        context=None,
+    ):
+        ring = SharedAudioRing(
+            rate, buffer_sec, dtype=np.float32, rate=rate, flow_control=True
+        )
+        super().__init__(
+            "TTS", _kokoro_main, ring, load, (lang_code, voice), budget, context
+        )
+        self.request_ids = itertools.count(1)
+
+    def _extra_args(self, context):
+        # id of the request the parent stopped reading
+        self.cancelled = context.Value("q", 0, lock=False)
+        return (self.cancelled,)
+
+    def __call__(self, text, **kwargs):
+        with self.lock:
+            self.wait_ready()
+            request_id = next(self.request_ids)
+            self.requests.put((request_id, (text, kwargs)))
+            finished = False
+            try:
+                while True:
+                    kind, _, payload = self._reply()
+                    if kind == "done":
+                        finished = True
+                        return
+                    if kind == "error":
+                        finished = True
+                        raise RuntimeError(f"TTS process: {payload}")
+                    graphemes, phonemes, start, end = payload
+                    audio = self.ring.view(start, end).copy() if end > start else None
+                    self.ring.consumed(end)
+                    yield graphemes, phonemes, audio
+            finally:
+                if not finished:
+                    self.cancelled.value = request_id
+                    self._drain()
+
+    def _drain(self):
+        """Skip the rest of a cancelled request, so the next one starts clean"""
+        while True:
+            kind, _, payload = self._reply()
+            if kind != "segment":
+                return
+            self.ring.consumed(payload[3])
+
+
+def _kokoro_main(ring, requests, replies, load, load_args, budget, cancelled):
+    pipeline = _child_setup(replies, load, load_args, budget)
+    while pipeline is not None:
+        request = requests.get()
+        if request is None:
+            break
+        request_id, (text, kwargs) = request
+        is_cancelled = lambda: cancelled.value == request_id
+        try:
+            for graphemes, phonemes, audio in pipeline(text, **kwargs):
+                if is_cancelled():
+                    break
+                start = ring.write_index
+                if audio is not None:
+                    if hasattr(audio, "detach"):
+                        audio = audio.detach().cpu().numpy()
+                    if not ring.write(audio, abort=is_cancelled):
+                        break
+                replies.put(
+                    (
+                        "segment",
+                        request_id,
+                        (graphemes, phonemes, start, ring.write_index),
+                    )
+                )
+            replies.put(("done", request_id, None))
+        except Exception as e:
+            replies.put(("error", request_id, f"{type(e).__name__}: {e}"))
+    ring.release()
+
+
+class CaptureStage:
+    """
+    Mic capture and wakeword scoring in their own process.
+
+    The child writes the mic into a SharedAudioRing, which the main process
+    reads like its local ring, scores every chunk with a WakewordEngine and
+    sends (end sample index, model, score, compute_sec) detections over a
+    queue. Stands in for AudioCapture in AudioInputProcessor.
+    """
+
+    def __init__(
+        self,
+        wakeword_paths,
+        thresholds=0.8,
+        gate_rms=100.0,
+        budget=(1, None),
+        buffer_seconds=60,
+        chunk_size=1280,
+        rate=16000,
+        open_source=open_microphone,
+        load=load_wakeword,
+        context=None,
+    ):
+        context = context or mp.get_context("spawn")
+        self.ring = SharedAudioRing(
+            chunk_size, int(buffer_seconds * rate / chunk_size), rate=rate
+        )
+        self.events = context.Queue()
+        self._stop = context.Event()
+        self.process = context.Process(
+            target=_capture_main,
+            args=(
+                self.ring,
+                self.events,
+                self._stop,
+                open_source,
+                load,
+                (wakeword_paths, thresholds, gate_rms),
+                budget,
+            ),
+            name="capture",
+            daemon=True,
+        )
+        with thread_environment(budget[0]):
+            self.process.start()
+        self.detections = deque(maxlen=16)
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(
+            target=self._collect, name="capture-events", daemon=True
+        )
+        self.thread.start()
+
+    def _collect(self):
+        while True:
+            event = self.events.get()
+            if event is None:
+                break
+            with self.cond:
+                if event[0] == "error":
+                    print(f"Capture process failed: {event[1]}")
+                else:
+                    self.detections.append(event[1:])
+                self.cond.notify_all()
+
+    def wait_for_wakeword(self, after_index, deadline_index=None):
+        """
+        First detection ending after after_index, as (index, model, score,
+        compute_sec), or None once deadline_index is captured or capture stopped
+        """
+        with self.cond:
+            while True:
+                while self.detections:
+                    detection = self.detections.popleft()
+                    if detection[0] > after_index:
+                        return detection
+                if self.ring.closed or not self.process.is_alive():
+                    return None
+                if (
+                    deadline_index is not None
+                    and self.ring.write_index >= deadline_index
+                ):
+                    return None
+                self.cond.wait(0.05)
+
+    def stop(self):
+        if self.ring.header is None:
+            return  # already stopped
+        self._stop.set()
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.events.put(None)
+        self.ring.close()
+        self.ring.release()
+
+
+def _capture_main(ring, events, stop, open_source, load, load_args, budget):
+    from src.capture_utils import AudioCapture
+
+    threads, cores = budget
+    apply_cpu_budget(threads, cores)
+    try:
+        engine = load(*load_args, threads)
+        source, cleanup = open_source(ring.rate, ring.chunk_size)
+    except Exception as e:
+        events.put(("error", f"{type(e).__name__}: {e}"))
+        ring.close()
+        ring.release()
+        return
+    stream = engine.add_stream()
+    capture = AudioCapture(source, ring, ring.chunk_size).start()
+    chunk_size = ring.chunk_size
+    index = ring.write_index
+    compute_sec = 0.0
+    try:
+        while not stop.is_set():
+            if not ring.wait_for(index + chunk_size, timeout=0.1):
+                if ring.closed:
+                    break
+                continue
+            if index < ring.oldest_index:
+                live = ring.write_index
+                index = live - live % chunk_size
+                continue
+            chunk = ring.view(index, index + chunk_size)
+            index += chunk_size
+            start_time = time.perf_counter()
+            detections = stream.predict(chunk)
+            compute_sec += time.perf_counter() - start_time
+            if detections:
+                name, score = detections[0]
+                events.put(("wakeword", index, name, float(score), compute_sec))
+                compute_sec = 0.0
+                stream.reset()
+    finally:
+        capture.stop()
+        cleanup()
+        ring.release()
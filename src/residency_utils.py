@@ -0,0 +1,80 @@
+import threading
+import time
+
+
+class ModelResidency:
+    """
+    Keeps Ollama models loaded between turns.
+
+    Ollama reloads a model whenever a request asks for a different num_ctx, and
+    unloads it once keep_alive expires. Every request for a model therefore
+    goes out with that model's one registered context size and the same
+    keep_alive, models can be loaded ahead of time with warm(), and observe()
+    logs any reload that still shows up in a response's load_duration.
+    """
+
+    def __init__(self, keep_alive="30m", default_ctx=4096, reload_threshold_sec=0.25):
+        self.keep_alive = keep_alive
+        self.default_ctx = default_ctx
+        self.reload_threshold_sec = reload_threshold_sec
+        self.contexts = {}
+        self.reloads = []
+        self.lock = threading.Lock()
+
+    def register(self, model, num_ctx):
+        """Fix the context size every request for model will use"""
+        with self.lock:
+            if model in self.contexts and self.contexts[model] != num_ctx:
+                print(
+                    f"{model}: num_ctx changed from {self.contexts[model]} to {num_ctx}, "
+                    "the next request reloads it"
+                )
+            self.contexts[model] = num_ctx
+
+    def num_ctx(self, model):
+        with self.lock:
+            return self.contexts.setdefault(model, self.default_ctx)
+
+    def request(self, model, **options):
+        """Keyword arguments (options with num_ctx, keep_alive) for a request"""
+        return {
+            "options": {"num_ctx": self.num_ctx(model), **options},
+            "keep_alive": self.keep_alive,
+        }
+
+    def observe(self, model, response):
+        """Log the request as a reload if Ollama had to load the model for it"""
+        load_duration = getattr(response, "load_duration", None)
+        if not load_duration or load_duration / 1e9 < self.reload_threshold_sec:
+            return False
+        seconds = load_duration / 1e9
+        with self.lock:
+            self.reloads.append((time.time(), model, seconds))
+        print(
+            f"Ollama (re)loaded {model} for this request ({seconds:.2f}s, "
+            f"num_ctx {self.num_ctx(model)}), it was evicted or not warmed up"
+        )
+        return True
+
+    def warm(self, client, models):
+        """Load the models with their context size and keep_alive, in order"""
+        for model in models:
+            start_time = time.perf_counter()
+            try:
+                response = client.generate(
+                    model=model, prompt="", **self.request(model)
+                )
+            except Exception as e:
+                print(f"Could not pre-load {model}: {e}")
+                continue
+            load_duration = (getattr(response, "load_duration", None) or 0) / 1e9
+            print(
+                f"{model} resident with num_ctx {self.num_ctx(model)} "
+                f"(load {load_duration:.2f}s, request "
+                f"{time.perf_counter() - start_time:.2f}s)"
+            )
+
+
+# Shared by the LLM processors and the tools, so every request for a model
+# agrees on its context size
+residency = ModelResidency()
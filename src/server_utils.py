@@ -0,0 +1,252 @@
+import asyncio
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from src.capture_utils import PushAudioSource
+from src.playback_utils import to_int16
+
+
+class ModelWorker:
+    """
+    Work queue in front of one shared model. Sessions submit calls from their
+    own threads, a fixed number of worker threads run them against the model.
+    """
+
+    def __init__(self, name, model, num_threads=1):
+        self.name = name
+        self.model = model
+        self.queue = queue.Queue()
+        self.threads = [
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True)
+            for i in range(num_threads)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(model, *args, **kwargs) and return a Future for its result"""
+        future = Future()
+        self.queue.put((future, fn, args, kwargs))
+        return future
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn(model, *args, **kwargs) on a worker thread and wait for the result"""
+        return self.submit(fn, *args, **kwargs).result()
+
+    def close(self):
+        for _ in self.threads:
+            self.queue.put(None)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            future, fn, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(self.model, *args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+
+
+class SharedWhisper:
+    """WhisperModel stand-in that runs transcriptions on a shared ModelWorker"""
+
+    def __init__(self, worker):
+        self.worker = worker
+
+    def transcribe(self, audio, **kwargs):
+        # faster-whisper decodes lazily while the segments are iterated,
+        # so materialize them on the worker thread
+        return self.worker.call(_transcribe, audio, **kwargs)
+
+
+def _transcribe(model, audio, **kwargs):
+    segments, info = model.transcribe(audio, **kwargs)
+    return list(segments), info
+
+
+class SharedPipeline:
+    """KPipeline stand-in that runs synthesis on a shared ModelWorker"""
+
+    def __init__(self, worker):
+        self.worker = worker
+
+    def __call__(self, text, **kwargs):
+        return self.worker.call(lambda pipeline: list(pipeline(text, **kwargs)))
+
+
+class ConnectionSink:
+    """Audio sink that streams int16 PCM to an asyncio connection"""
+
+    def __init__(self, writer, loop, sample_rate=24000):
+        self.writer = writer
+        self.loop = loop
+        self.sample_rate = sample_rate
+        self.closed = False
+
+    def play(self, audio):
+        if self.closed:
+            return
+        data = to_int16(audio).tobytes()
+        self.loop.call_soon_threadsafe(self.writer.write, data)
+
+    def drain(self):
+        """Block until the connection has accepted everything written so far"""
+        if self.closed:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.writer.drain(), self.loop).result()
+        except (ConnectionError, RuntimeError):
+            self.closed = True
+
+    def clear(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class VoiceServer:
+    """
+    Serves one wakeword -> VAD -> ASR -> LLM -> TTS session per TCP connection.
+
+    Clients stream 16kHz mono int16 PCM and receive the replies as 24kHz mono
+    int16 PCM on the same connection. Whisper and Kokoro are loaded once and
+    shared by every session through ModelWorker queues, the wakeword models
+    through one WakewordEngine that scores all sessions in a batch. Silero VAD
+    keeps only its streaming state per session, the ONNX backend's session is
+    shared (the torch backend's state lives in the model, so that one is
+    still created per session).
+    """
+
+    def __init__(
+        self,
+        whisper_model,
+        pipeline,
+        make_llm_processor,
+        wakeword_engine,
+        vad_mode="streaming",
+        vad_backend="onnx",
+        voice="af_heart",
+        tts_cache_dir=None,
+        stream=False,
+        streaming_asr=False,
+        asr_decoding="adaptive",
+        asr_workers=1,
+        tts_workers=1,
+        max_sessions=8,
+        asr_scheduler=None,
+        archive=None,
+        tts_options=None,
+    ):
+        self.asr_worker = ModelWorker("asr", whisper_model, asr_workers)
+        self.tts_worker = ModelWorker("tts", pipeline, tts_workers)
+        # whole utterances from all sessions can be batched through one scheduler
+        self.asr_scheduler = asr_scheduler
+        self.make_llm_processor = make_llm_processor
+        self.wakeword_engine = wakeword_engine
+        self.vad_mode = vad_mode
+        self.vad_backend = vad_backend
+        self.voice = voice
+        self.tts_cache_dir = tts_cache_dir
+        self.stream = stream
+        self.streaming_asr = streaming_asr
+        self.asr_decoding = asr_decoding
+        # one AudioArchive for all sessions, items are tagged with the session id
+        self.archive = archive
+        # TTS backend of the shared pipeline, it keys the TTS cache
+        self.tts_options = tts_options or {}
+        self.sessions = asyncio.Semaphore(max_sessions)
+        self.session_ids = itertools.count(1)
+        self.active = 0
+
+    async def serve(self, host="0.0.0.0", port=8765):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Voice server listening on {host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        session_id = next(self.session_ids)
+        peer = writer.get_extra_info("peername")
+        async with self.sessions:
+            self.active += 1
+            print(f"Session {session_id} opened from {peer} ({self.active} active)")
+            source = PushAudioSource()
+            sink = ConnectionSink(writer, asyncio.get_running_loop())
+            session = asyncio.create_task(
+                asyncio.to_thread(self.run_session, session_id, source, sink)
+            )
+            try:
+                while data := await reader.read(4096):
+                    source.feed(data)
+            except ConnectionError:
+                pass
+            finally:
+                source.close()
+                sink.close()
+                await session
+                writer.close()
+                self.active -= 1
+                print(f"Session {session_id} closed ({self.active} active)")
+
+    def run_session(self, session_id, source, sink):
+        """Build the per-session processors around the shared models and converse"""
+        # imported here so the shared-model helpers above need no audio stack
+        from src.input_utils import AudioInputProcessor
+        from src.output_utils import AudioOutputProcessor
+        from src.conversation import run_conversation
+
+        start_time = time.perf_counter()
+        input_processor = None
+        try:
+            input_processor = AudioInputProcessor(
+                wakeword_engine=self.wakeword_engine,
+                vad_mode=self.vad_mode,
+                vad_backend=self.vad_backend,
+                buffer_seconds=20,
+                audio_source=source,
+                whisper_model=SharedWhisper(self.asr_worker),
+                asr_scheduler=self.asr_scheduler,
+                asr_decoding=self.asr_decoding,
+            )
+            output_processor = AudioOutputProcessor(
+                voice=self.voice,
+                cache_dir=self.tts_cache_dir,
+                prerender_phrases=None,
+                sink=sink,
+                pipeline=SharedPipeline(self.tts_worker),
+                archive=(
+                    self.archive.tagged(session=session_id)
+                    if self.archive is not None
+                    else None
+                ),
+                **self.tts_options,
+            )
+            llm_processor = self.make_llm_processor()
+            print(
+                f"Session {session_id} ready in {time.perf_counter() - start_time:.2f}s"
+            )
+            run_conversation(
+                input_processor,
+                llm_processor,
+                output_processor,
+                stream=self.stream,
+                streaming_asr=self.streaming_asr,
+            )
+        except Exception as e:
+            print(f"Session {session_id} failed: {e}")
+        finally:
+            source.close()
+            # stop the capture thread and leave the shared wakeword batch now,
+            # a dead stream would hold up every later batch
+            if input_processor is not None:
+                input_processor.capture.stop()
+                input_processor.wakeword.close()
+            sink.close()
@@ -0,0 +1,83 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """Collects how long each startup component took, including background ones"""
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.timings = []
+        self.loaders = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def track(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.timings.append((name, elapsed, threading.current_thread().name))
+
+    def report(self, title="Startup time breakdown"):
+        with self.lock:
+            timings = list(self.timings)
+        print(f"{title} ({time.perf_counter() - self.start_time:.2f}s since start):")
+        for name, elapsed, thread in timings:
+            where = "" if thread == "MainThread" else " [background]"
+            print(f"  {name:<32} {elapsed:6.2f}s{where}")
+
+    def report_when_ready(self):
+        """Print the full breakdown once every background loader has finished"""
+
+        def wait_and_report():
+            for loader in self.loaders:
+                loader.wait()
+            self.report("All models loaded and warmed up")
+
+        threading.Thread(target=wait_and_report, daemon=True).start()
+
+
+class BackgroundLoader:
+    """
+    Runs a load function on its own thread right away, get() blocks until it
+    has finished and returns its result (re-raising any load error).
+    """
+
+    def __init__(self, name, load, timer=None):
+        self.name = name
+        self._load = load
+        self._timer = timer
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+        if timer is not None:
+            timer.loaders.append(self)
+        threading.Thread(target=self._run, name=f"load-{name}", daemon=True).start()
+
+    def _run(self):
+        try:
+            if self._timer is not None:
+                with self._timer.track(self.name):
+                    self._result = self._load()
+            else:
+                self._result = self._load()
+        except Exception as e:
+            print(f"Error loading {self.name}: {e}")
+            self._error = e
+        finally:
+            self._done.set()
+
+    def wait(self):
+        self._done.wait()
+
+    def get(self):
+        if not self._done.is_set():
+            print(f"Waiting for {self.name} to finish loading...")
+            self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._result
@@ -0,0 +1,45 @@
+import re
+
+# sentence end: terminal punctuation (optionally closed by quotes/brackets)
+# followed by whitespace, or a line break
+SENTENCE_END = re.compile(r"(?<=[.!?…])[\"')\]]*\s+|\n+")
+
+# abbreviations that end with a period but don't end a sentence
+ABBREVIATIONS = {"mr.", "mrs.", "ms.", "dr.", "st.", "vs.", "etc.", "e.g.", "i.e."}
+
+
+class SentenceSplitter:
+    """Accumulates streamed text and hands back complete sentences as they form"""
+
+    def __init__(self, min_chars=2):
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def feed(self, text):
+        """Add a piece of text and return the sentences it completed"""
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self.buffer):
+            candidate = self.buffer[start : match.end()].strip()
+            last_word = candidate.rsplit(None, 1)[-1].lower() if candidate else ""
+            if len(candidate) < self.min_chars or last_word in ABBREVIATIONS:
+                continue
+            sentences.append(candidate)
+            start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self):
+        """Return whatever text is left once the stream has ended"""
+        rest = self.buffer.strip()
+        self.buffer = ""
+        return [rest] if rest else []
+
+
+def iter_sentences(chunks, min_chars=2):
+    """Turn an iterable of streamed text pieces into an iterator of sentences"""
+    splitter = SentenceSplitter(min_chars=min_chars)
+    for chunk in chunks:
+        yield from splitter.feed(chunk)
+    yield from splitter.flush()
@@ -1,18 +1,17 @@
 import os
-import time
 import subprocess
-from ytmusicapi import YTMusic
-from yt_dlp import YoutubeDL
-import vlc
-import cv2
-import time
 import ollama
-from ollama import Client
-from pydantic import BaseModel
+from src.residency_utils import residency
 
+# Vision model that describes captured images, kept resident with a fixed context
+VISION_MODEL = "gemma3"
+# Side length the vision model resizes images to, captures are downscaled to it
+VISION_INPUT_SIZE = 896
+residency.register(VISION_MODEL, 2048)
 
-class ImageDescription(BaseModel):
-    description: str
+# Tool backends (YouTube Music client, VLC player) are heavy to import and set
+# up, they are created on first use by the getters below instead of at import
+_backends = {}
 
 
 def regenerate_vlc_cache():
@@ -33,14 +32,32 @@ def regenerate_vlc_cache():
         print("Failed to regenerate VLC plugins cache:", e)
 
 
-# Regenerate VLC plugins cache before proceeding
-regenerate_vlc_cache()
+def get_ytmusic():
+    """YouTube Music client, created on first use"""
+    if "ytmusic" not in _backends:
+        from ytmusicapi import YTMusic
 
-# Ensure VLC’s DLLs are found
-os.add_dll_directory(r"C:\Program Files\VideoLAN\VLC")
+        _backends["ytmusic"] = YTMusic("browser.json")
+    return _backends["ytmusic"]
 
 
-ytmusic = YTMusic("browser.json")
+def get_vlc():
+    """(vlc module, VLC instance, media player), set up on first use"""
+    if "vlc" not in _backends:
+        if os.name == "nt":
+            # Regenerate VLC plugins cache before proceeding
+            regenerate_vlc_cache()
+
+            # Ensure VLC’s DLLs are found
+            os.add_dll_directory(r"C:\Program Files\VideoLAN\VLC")
+
+        import vlc
+
+        # Initialize VLC instance and media player
+        vlc_instance = vlc.Instance()
+        _backends["vlc"] = (vlc, vlc_instance, vlc_instance.media_player_new())
+    return _backends["vlc"]
+
 
 # Options for yt-dlp to extract the best audio stream without downloading
 ydl_opts = {
@@ -49,61 +66,157 @@ ydl_opts = {
     "skip_download": True,
 }
 
-# Initialize VLC instance and media player
-vlc_instance = vlc.Instance()
-player = vlc_instance.media_player_new()
+
+def configure_music(library_dir=None, cache_path="./music_cache.json"):
+    """
+    Choose where music comes from: YouTube Music (default) or, with
+    library_dir, a local directory of audio files. Call before the first song.
+    """
+    _backends["music_config"] = {"library_dir": library_dir, "cache_path": cache_path}
+
+
+def get_music_resolver():
+    """MusicResolver with the configured backends, created on first use"""
+    if "music_resolver" not in _backends:
+        from src.music_cache import (
+            LocalLibrary,
+            MusicResolver,
+            YtDlpStreams,
+            YTMusicSearch,
+        )
+
+        config = _backends.get("music_config", {})
+        if config.get("library_dir"):
+            library = LocalLibrary(config["library_dir"])
+            search_backend, stream_backend = library, library
+        else:
+            search_backend = YTMusicSearch(get_ytmusic)
+            stream_backend = YtDlpStreams(ydl_opts)
+        resolver = MusicResolver(
+            search_backend,
+            stream_backend,
+            cache_path=config.get("cache_path", "./music_cache.json"),
+        )
+        # the most played songs are likely to be asked for again
+        resolver.prefetch_favourites()
+        _backends["music_resolver"] = resolver
+    return _backends["music_resolver"]
+
+
+def resolve_track(query):
+    """Look up the audio stream for query, through the resolution cache"""
+    return get_music_resolver().resolve(query)
+
+
+def get_music_player():
+    """Background MusicPlayer, created on first use"""
+    if "music" not in _backends:
+        from src.music_utils import MusicPlayer
+
+        player = MusicPlayer(
+            resolve_track, get_vlc(), prefetch=get_music_resolver().prefetch
+        )
+        if _backends.get("music_ducked"):
+            # started from inside a conversation, stay quiet until it ends
+            player.duck()
+        _backends["music"] = player
+    return _backends["music"]
+
+
+def duck_music(ducked):
+    """Lower the music volume while a conversation is going on, or restore it"""
+    if bool(_backends.get("music_ducked")) == ducked:
+        return
+    _backends["music_ducked"] = ducked
+    player = _backends.get("music")
+    if player is not None:
+        player.duck() if ducked else player.unduck()
 
 
 def play_music(query: str) -> None:
     """
     Search for the song user has requested, and play the first result.
     """
-    # Search for songs; adjust filter/limit as needed
-    results = ytmusic.search(query, filter="songs", limit=1)
-    if not results:
-        print(f"No track found for query: {query}")
-        return
+    # resolving and playing happen in the background, the conversation goes on
+    get_music_player().play(query)
 
-    track = results[0]
-    video_id = track.get("videoId")
-    if not video_id:
-        print("No video ID found in the search result.")
-        return
 
-    # Build the YouTube URL for the track
-    url = f"https://www.youtube.com/watch?v={video_id}"
+def control_music(command: str, value: str = "") -> None:
+    """
+    Control the music that is playing in the background.
+
+    Args:
+        command: one of pause, resume, stop, skip, volume, queue
+        value: the volume from 0 to 100 for volume, the song to add for queue
+    """
+    player = get_music_player()
+    command = command.strip().lower()
+    if command == "pause":
+        player.pause()
+    elif command == "resume":
+        player.resume()
+    elif command == "stop":
+        player.stop()
+    elif command == "skip":
+        player.skip()
+    elif command == "volume":
+        try:
+            player.set_volume(int(float(value)))
+        except ValueError:
+            print(f"Invalid volume: {value}")
+    elif command == "queue":
+        if value:
+            player.enqueue(value)
+    else:
+        print(f"Unknown music command: {command}")
+    print(f"Music status: {player.status()}")
+
 
-    # Use yt-dlp to get stream information (without downloading)
-    with YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=False)
-        stream_url = info.get("url")
+def configure_vision(client):
+    """Ollama client the vision model is queried through, e.g. the LLM's"""
+    _backends["vision_client"] = client
 
-    title = track.get("title", "Unknown Title")
-    print(f"Now playing: {title}")
 
-    # Create a new VLC media from the stream URL and play it
-    media = vlc_instance.media_new(stream_url)
-    player.set_media(media)
-    player.play()
+def get_vision_client():
+    """Configured Ollama client, or one for the local server"""
+    if "vision_client" not in _backends:
+        _backends["vision_client"] = ollama.Client()
+    return _backends["vision_client"]
 
-    # Allow VLC time to start playback
-    time.sleep(2)
 
-    # Wait until playback is finished
-    while True:
-        try:
-            state = player.get_state()
-            if state == vlc.State.Ended:
-                print("Playback finished.")
-                break
-            elif state == vlc.State.Error:
-                print("Error during playback.")
-                break
-            time.sleep(1)
-        except KeyboardInterrupt:
-            player.stop()
-            print("User Terminate")
-            break
+def configure_camera(
+    background=False, headless=False, countdown=0, device=0, timer=None
+):
+    """
+    Set up the camera used by capture_image_and_describe. With background the
+    camera stays open and frames are grabbed continuously, so a capture is
+    instant. countdown shows a preview (unless headless) before capturing.
+    """
+    from src.camera_utils import CameraService
+
+    camera = CameraService(
+        device=device, input_size=VISION_INPUT_SIZE, headless=headless
+    )
+    _backends["camera"] = camera
+    _backends["camera_countdown"] = countdown
+    _backends.pop("camera_loader", None)
+    if background:
+        from src.startup_utils import BackgroundLoader
+
+        # opening the camera can take a while, a capture waits for it to open
+        # rather than opening the device a second time
+        _backends["camera_loader"] = BackgroundLoader("Camera", camera.start, timer)
+    return camera
+
+
+def get_camera():
+    """CameraService, opened on demand for each capture unless configured"""
+    if "camera" not in _backends:
+        configure_camera()
+    loader = _backends.get("camera_loader")
+    if loader is not None:
+        loader.get()
+    return _backends["camera"]
 
 
 def capture_image_and_describe(question_for_image: str) -> str:
@@ -111,75 +224,33 @@ def capture_image_and_describe(question_for_image: str) -> str:
     Use the front-facing camera to capture an image,
     and describe what the image contains
     """
-    # Open the default camera (device 0)
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        raise Exception("Could not open video device")
-
-    countdown = 5  # seconds
-    start_time = time.time()
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            continue  # Skip if frame read fails
-
-        # Calculate remaining time for the countdown
-        elapsed = time.time() - start_time
-        remaining = max(int(countdown - elapsed) + 1, 0)
-
-        # Overlay the countdown timer on the frame
-        font = cv2.FONT_HERSHEY_SCRIPT_SIMPLEX
-        cv2.putText(
-            frame, f"{remaining}", (50, 50), font, 1.5, (0, 255, 0), 4, cv2.LINE_AA
-        )
-
-        # Show the camera preview window
-        cv2.imshow("Camera Preview", frame)
-
-        # When countdown is complete, capture the image
-        if elapsed >= countdown:
-            # Optionally wait a tiny bit for a final frame update
-            time.sleep(0.1)
-            ret, frame = cap.read()
-            if not ret:
-                continue
-            cv2.imwrite("temp.jpg", frame)
-            break
-
-        # Allow early exit by pressing 'q'
-        if cv2.waitKey(1) & 0xFF == ord("q"):
-            cap.release()
-            cv2.destroyAllWindows()
-            return "Cancelled by user"
-
-    # Release the camera and close the preview window
-    cap.release()
-    cv2.destroyAllWindows()
-
-    # Send the captured image to Ollama for description
-    res = ollama.chat(
-        model="gemma3",
+    image = get_camera().capture(countdown=_backends.get("camera_countdown", 0))
+    if image is None:
+        return "Cancelled by user"
+
+    # Send the captured image to Ollama as in-memory JPEG bytes and print the
+    # description as it streams in
+    stream = get_vision_client().chat(
+        model=VISION_MODEL,
         messages=[
             {
                 "role": "user",
-                "content": f"describe what is present in this image, focus on answering the following question: {question_for_image}",
-                "images": ["temp.jpg"],
+                "content": "Describe what is present in this image in a few sentences, "
+                f"focus on answering the following question: {question_for_image}",
+                "images": [image],
             }
         ],
-        options={"temperature": 0},
-        format=ImageDescription.model_json_schema(),
+        stream=True,
+        **residency.request(VISION_MODEL, temperature=0),
     )
-
-    image_description = ImageDescription.model_validate_json(
-        res.message.content
-    ).description
-
-    print(image_description)
-
-    # Delete the temporary image file
-    if os.path.exists("temp.jpg"):
-        os.remove("temp.jpg")
+    parts = []
+    for chunk in stream:
+        print(chunk.message.content, end="", flush=True)
+        parts.append(chunk.message.content)
+        if chunk.done:
+            residency.observe(VISION_MODEL, chunk)
+    print()
+    image_description = "".join(parts).strip()
 
     return f"The Image captured, has a description :{image_description}"
 
@@ -0,0 +1,296 @@
+import contextvars
+import itertools
+import json
+import queue
+import threading
+import time
+
+# Histogram buckets (seconds) for span durations
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_turn = contextvars.ContextVar("turn", default=None)
+
+
+class Span:
+    """One timed stage of a turn, with attributes set while it runs"""
+
+    __slots__ = ("tracer", "name", "attrs", "start", "cpu_start")
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def llm(self, response):
+        """Token counts and tokens/s from an Ollama response (the final chunk if streamed)"""
+        eval_count = getattr(response, "eval_count", None)
+        eval_duration = getattr(response, "eval_duration", None)
+        self.attrs["tokens"] = eval_count
+        self.attrs["prompt_tokens"] = getattr(response, "prompt_eval_count", None)
+        if eval_count and eval_duration:
+            self.attrs["tokens_per_sec"] = eval_count / (eval_duration / 1e9)
+        load_duration = getattr(response, "load_duration", None)
+        if load_duration:
+            self.attrs["load_sec"] = load_duration / 1e9
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.attrs["cpu_sec"] = time.thread_time() - self.cpu_start
+        self.tracer.record(self.name, time.perf_counter() - self.start, **self.attrs)
+        return False
+
+
+class _NoopSpan:
+    """Returned by a disabled tracer, so instrumented code costs one call"""
+
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def llm(self, response):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class Tracer:
+    """
+    Per-turn latency tracing for the voice loop.
+
+    Stages open a span (wakeword, record, asr, llm, tool, tts, playback) inside
+    turn(), which groups them under one turn id, also across threads started
+    with copy_context(). Finished spans carry their duration, CPU time of the
+    thread and stage attributes (audio_sec, rtf, tokens, tokens_per_sec, ...),
+    are appended to a JSON lines file by a writer thread and aggregated for the
+    Prometheus-style /metrics endpoint. While disabled span() hands out a
+    shared no-op span and nothing is recorded.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.exporters = []
+        self.metrics = MetricsRegistry()
+        self._turn_ids = itertools.count(1)
+
+    def enable(self, jsonl_path=None, metrics_port=None, metrics_host="0.0.0.0"):
+        if jsonl_path:
+            self.exporters.append(JsonlExporter(jsonl_path))
+        if metrics_port:
+            self.metrics.serve(metrics_host, metrics_port)
+            print(f"Metrics at http://{metrics_host}:{metrics_port}/metrics")
+        self.enabled = True
+
+    def span(self, name, **attrs):
+        if not self.enabled:
+            return _NOOP
+        return Span(self, name, attrs)
+
+    def turn(self, **attrs):
+        """Span for a whole turn, the spans opened inside it share its id"""
+        if not self.enabled:
+            return _NOOP
+        return _TurnSpan(self, attrs)
+
+    def record(self, name, duration, **attrs):
+        """Record a span measured by the caller"""
+        if not self.enabled:
+            return
+        audio_sec = attrs.get("audio_sec")
+        if audio_sec and "rtf" not in attrs:
+            # compute time per second of audio, below 1 is faster than realtime
+            attrs["rtf"] = attrs.get("compute_sec", duration) / audio_sec
+        event = {
+            "turn": _turn.get(),
+            "span": name,
+            "time": time.time(),
+            "duration": duration,
+            "thread": threading.current_thread().name,
+            **attrs,
+        }
+        self.metrics.observe(event)
+        for exporter in self.exporters:
+            exporter.export(event)
+
+    def close(self):
+        for exporter in self.exporters:
+            exporter.close()
+        self.metrics.shutdown()
+
+
+class _TurnSpan(Span):
+    __slots__ = ("token",)
+
+    def __init__(self, tracer, attrs):
+        super().__init__(tracer, "turn", attrs)
+
+    def __enter__(self):
+        self.token = _turn.set(next(self.tracer._turn_ids))
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        super().__exit__(exc_type, exc, tb)
+        _turn.reset(self.token)
+        return False
+
+
+def current_turn():
+    return _turn.get()
+
+
+def set_turn(turn_id):
+    """Attach the current context (e.g. an asyncio task) to a turn"""
+    _turn.set(turn_id)
+
+
+class JsonlExporter:
+    """Appends span events to a JSON lines file from a writer thread"""
+
+    def __init__(self, path):
+        self.path = path
+        self.events = queue.Queue()
+        self.thread = threading.Thread(target=self._write, name="trace", daemon=True)
+        self.thread.start()
+
+    def export(self, event):
+        self.events.put(event)
+
+    def close(self):
+        self.events.put(None)
+        self.thread.join(timeout=2)
+
+    def _write(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                event = self.events.get()
+                if event is None:
+                    return
+                f.write(json.dumps(event, default=str) + "\n")
+                if self.events.empty():
+                    f.flush()
+
+
+class MetricsRegistry:
+    """Span aggregates rendered in the Prometheus text format"""
+
+    # summed per span name, exported as <prefix>_<name>_total counters
+    totals = ("audio_sec", "compute_sec", "cpu_sec", "tokens", "prompt_tokens")
+
+    def __init__(self, prefix="buddy"):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.sums = {}
+        self.last = {}
+        self.server = None
+
+    def observe(self, event):
+        name = event["span"]
+        duration = event["duration"]
+        with self.lock:
+            buckets, total, count = self.histograms.get(
+                name, ([0] * len(BUCKETS), 0.0, 0)
+            )
+            for i, bound in enumerate(BUCKETS):
+                if duration <= bound:
+                    buckets[i] += 1
+            self.histograms[name] = (buckets, total + duration, count + 1)
+            for key in self.totals:
+                if event.get(key):
+                    self.sums[(name, key)] = self.sums.get((name, key), 0) + event[key]
+            for key in ("rtf", "tokens_per_sec"):
+                if event.get(key) is not None:
+                    self.last[(name, key)] = event[key]
+
+    def render(self):
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_span_seconds Duration of voice loop stages",
+            f"# TYPE {p}_span_seconds histogram",
+        ]
+        with self.lock:
+            for name, (buckets, total, count) in sorted(self.histograms.items()):
+                for bound, value in zip(BUCKETS, buckets):
+                    lines.append(
+                        f'{p}_span_seconds_bucket{{span="{name}",le="{bound}"}} {value}'
+                    )
+                lines.append(
+                    f'{p}_span_seconds_bucket{{span="{name}",le="+Inf"}} {count}'
+                )
+                lines.append(f'{p}_span_seconds_sum{{span="{name}"}} {total}')
+                lines.append(f'{p}_span_seconds_count{{span="{name}"}} {count}')
+            for key in self.totals:
+                series = [(n, v) for (n, k), v in sorted(self.sums.items()) if k == key]
+                if series:
+                    lines.append(f"# TYPE {p}_{key}_total counter")
+                    for name, value in series:
+                        lines.append(f'{p}_{key}_total{{span="{name}"}} {value}')
+            for key in ("rtf", "tokens_per_sec"):
+                series = [(n, v) for (n, k), v in sorted(self.last.items()) if k == key]
+                if series:
+                    lines.append(f"# TYPE {p}_last_{key} gauge")
+                    for name, value in series:
+                        lines.append(f'{p}_last_{key}{{span="{name}"}} {value}')
+        lines.append(f"# TYPE {p}_process_cpu_seconds_total counter")
+        lines.append(f"{p}_process_cpu_seconds_total {time.process_time()}")
+        try:
+            import resource
+
+            # ru_maxrss is in kilobytes on Linux
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            lines.append(f"# TYPE {p}_process_max_rss_bytes gauge")
+            lines.append(f"{p}_process_max_rss_bytes {rss}")
+        except ImportError:
+            pass  # not available on Windows
+        return "\n".join(lines) + "\n"
+
+    def serve(self, host, port):
+        """Serve render() at /metrics on a background thread"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(
+            target=self.server.serve_forever, name="metrics", daemon=True
+        ).start()
+
+    def shutdown(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+
+
+# Shared by every processor, enabled from the command line
+tracer = Tracer()
@@ -0,0 +1,140 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from importlib import metadata
+import numpy as np
+
+# Fixed replies and short phrases worth rendering once at startup
+COMMON_PHRASES = [
+    "Tool call executed.",
+    "Sorry, I did not understand that.",
+    "I'm having trouble connecting to the language model. Please try again.",
+    "Hello!",
+    "Hi there!",
+    "Okay.",
+    "Sure thing.",
+    "Goodbye!",
+]
+
+
+def kokoro_model_version():
+    """Version string of the installed TTS package, part of every cache key"""
+    try:
+        return f"kokoro-{metadata.version('kokoro')}"
+    except metadata.PackageNotFoundError:
+        return "kokoro-unknown"
+
+
+class TTSCache:
+    """
+    Two level LRU cache of synthesized audio keyed by (text, voice, speed, model version).
+
+    Recently used waveforms stay in memory, everything is also written to cache_dir
+    as .npy files that are memory-mapped on load. The disk level is trimmed to
+    max_disk_bytes, least recently used first.
+    """
+
+    def __init__(
+        self,
+        cache_dir="./tts_cache",
+        model_version=None,
+        max_memory_items=64,
+        max_disk_bytes=200 * 1024 * 1024,
+        dtype="float32",
+    ):
+        self.cache_dir = cache_dir
+        self.model_version = model_version or kokoro_model_version()
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        # int16 halves the disk footprint, float32 keeps the synthesized samples as is
+        self.dtype = np.dtype(dtype)
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, text, voice, speed):
+        raw = f"{self.model_version}|{voice}|{speed}|{text}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def get(self, text, voice, speed):
+        """Return the cached waveform or None"""
+        key = self.key(text, voice, speed)
+        with self.lock:
+            audio = self.memory.get(key)
+            if audio is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return audio
+
+        path = self._path(key)
+        try:
+            audio = np.load(path, mmap_mode="r")
+            # mark as recently used for disk eviction
+            os.utime(path)
+        except (FileNotFoundError, ValueError, OSError):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+            self._remember(key, audio)
+        return audio
+
+    def put(self, text, voice, speed, audio):
+        """Store a waveform (NumPy array or torch tensor) in memory and on disk"""
+        if hasattr(audio, "detach"):
+            audio = audio.detach().cpu().numpy()
+        audio = np.asarray(audio)
+        if self.dtype == np.int16 and audio.dtype != np.int16:
+            audio = np.int16(np.clip(audio, -1.0, 1.0) * 32767)
+        else:
+            audio = audio.astype(self.dtype, copy=False)
+
+        key = self.key(text, voice, speed)
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.save(f, audio)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing TTS cache entry: {e}")
+
+        with self.lock:
+            self._remember(key, audio)
+        self._evict_disk()
+        return audio
+
+    def _remember(self, key, audio):
+        self.memory[key] = audio
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_items:
+            self.memory.popitem(last=False)
+
+    def _evict_disk(self):
+        entries = []
+        total = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".npy"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        if total <= self.max_disk_bytes:
+            return
+
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_disk_bytes:
+                break
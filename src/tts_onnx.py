@@ -0,0 +1,186 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Kokoro's context is 512 tokens, two of them are the padding around the phonemes
+MAX_PHONEMES = 510
+
+
+def quantize_model(model_path, output_path=None):
+    """
+    int8 dynamic quantization of an ONNX Kokoro's weights, done once next to
+    the model (kokoro.onnx -> kokoro.int8.onnx). Returns the quantized path.
+    """
+    output_path = output_path or os.path.splitext(model_path)[0] + ".int8.onnx"
+    if not os.path.exists(output_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        print(f"Quantizing {model_path} to int8...")
+        quantize_dynamic(model_path, output_path, weight_type=QuantType.QInt8)
+    return output_path
+
+
+def load_vocab(config_path=None):
+    """Phoneme -> token id map from Kokoro's config.json (fetched from the Hub by default)"""
+    import json
+
+    if config_path is None:
+        from huggingface_hub import hf_hub_download
+
+        config_path = hf_hub_download("hexgrad/Kokoro-82M", "config.json")
+    with open(config_path, encoding="utf-8") as f:
+        return json.load(f)["vocab"]
+
+
+class OnnxKokoroPipeline:
+    """
+    KPipeline stand-in running an ONNX export of Kokoro with onnxruntime.
+
+    Text is split like KPipeline splits it (split_pattern, then chunks of at
+    most 510 phonemes) and every chunk yields (graphemes, phonemes, audio).
+    The phonemes of recently seen text are kept in an LRU cache so repeated
+    sentences skip G2P, and each voice's style vectors are read from the
+    voices file (.npz/.bin of (510, 1, 256) arrays) once.
+    """
+
+    def __init__(
+        self,
+        model_path,
+        voices_path,
+        lang_code="a",
+        config_path=None,
+        threads=None,
+        phoneme_cache_size=1024,
+    ):
+        import onnxruntime as ort
+
+        if lang_code not in ("a", "b"):
+            raise ValueError(
+                f"The ONNX backend supports English (a/b), not '{lang_code}'"
+            )
+        from misaki import en
+
+        try:
+            from misaki import espeak
+
+            fallback = espeak.EspeakFallback(british=lang_code == "b")
+        except Exception as e:
+            print(f"No espeak fallback, unknown words are skipped ({e})")
+            fallback = None
+        self.g2p = en.G2P(
+            trf=False, british=lang_code == "b", fallback=fallback, unk=""
+        )
+        self.g2p_lock = threading.Lock()
+        self.vocab = load_vocab(config_path)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"]
+        )
+        # tokens, style, speed, whatever the export named them
+        inputs = self.session.get_inputs()
+        self.input_names = [i.name for i in inputs]
+        self.speed_dtype = np.int32 if "int" in inputs[2].type else np.float32
+
+        self.voices_file = np.load(voices_path)
+        self.voices = {}
+        self.phoneme_cache = OrderedDict()
+        self.phoneme_cache_size = phoneme_cache_size
+        self.lock = threading.Lock()
+
+    def load_voice(self, voice):
+        """Style vectors of a voice, or the mean of comma-separated voices"""
+        with self.lock:
+            if voice not in self.voices:
+                packs = [
+                    np.asarray(self.voices_file[name], dtype=np.float32)
+                    for name in voice.split(",")
+                ]
+                self.voices[voice] = np.mean(packs, axis=0)
+            return self.voices[voice]
+
+    def phonemize(self, text):
+        """[(graphemes, phonemes)] chunks of text, cached"""
+        with self.lock:
+            if text in self.phoneme_cache:
+                self.phoneme_cache.move_to_end(text)
+                return self.phoneme_cache[text]
+        with self.g2p_lock:
+            _, tokens = self.g2p(text)
+
+        chunks = []
+        chunk, phonemes = [], ""
+        for token in tokens:
+            # American English: ɾ => T, as KPipeline does
+            piece = (token.phonemes or "").replace("ɾ", "T")
+            piece += " " if token.whitespace else ""
+            if chunk and len((phonemes + piece).rstrip()) > MAX_PHONEMES:
+                chunks.append((chunk, phonemes))
+                chunk, phonemes = [], ""
+            chunk.append(token)
+            phonemes += piece
+        if chunk:
+            chunks.append((chunk, phonemes))
+        result = [
+            (
+                "".join(t.text + t.whitespace for t in chunk).strip(),
+                phonemes.strip()[:MAX_PHONEMES],
+            )
+            for chunk, phonemes in chunks
+            if phonemes.strip()
+        ]
+
+        with self.lock:
+            self.phoneme_cache[text] = result
+            if len(self.phoneme_cache) > self.phoneme_cache_size:
+                self.phoneme_cache.popitem(last=False)
+        return result
+
+    def infer(self, phonemes, pack, speed=1):
+        ids = [self.vocab[p] for p in phonemes if p in self.vocab]
+        tokens = np.array([[0, *ids, 0]], dtype=np.int64)
+        # the style vector depends on the length of the utterance
+        style = pack[len(phonemes) - 1]
+        audio = self.session.run(
+            None,
+            dict(
+                zip(
+                    self.input_names,
+                    (tokens, style, np.array([speed], dtype=self.speed_dtype)),
+                )
+            ),
+        )[0]
+        return np.asarray(audio, dtype=np.float32).reshape(-1)
+
+    def __call__(self, text, voice, speed=1, split_pattern=r"\n+"):
+        pack = self.load_voice(voice)
+        pieces = re.split(split_pattern, text.strip()) if split_pattern else [text]
+        for piece in pieces:
+            for graphemes, phonemes in self.phonemize(piece):
+                yield graphemes, phonemes, self.infer(phonemes, pack, speed)
+
+
+def load_onnx_pipeline(
+    model_path, voices_path, lang_code="a", voice="af_heart", threads=None, int8=False
+):
+    """OnnxKokoroPipeline, quantized first if int8, warmed up with a short phrase"""
+    if int8:
+        model_path = quantize_model(model_path)
+    pipeline = OnnxKokoroPipeline(
+        model_path, voices_path, lang_code=lang_code, threads=threads
+    )
+    for _ in pipeline("Hello.", voice=voice):
+        pass
+    return pipeline
+
+
+def onnx_model_version(model_path, int8=False):
+    """TTS cache version of an ONNX model, its audio differs from the torch model's"""
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    return f"onnx-{name}{'-int8' if int8 else ''}"
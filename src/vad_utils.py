@@ -0,0 +1,172 @@
+import os
+import threading
+import numpy as np
+
+# Silero VAD v5 exported to ONNX (MIT, github.com/snakers4/silero-vad), bundled
+# so the VAD loads offline and without torch
+SILERO_ONNX = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "silero_vad.onnx"
+)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def silero_session(path=SILERO_ONNX):
+    """One single-threaded onnxruntime session per model file, shared by all streams"""
+    with _sessions_lock:
+        if path not in _sessions:
+            import onnxruntime as ort
+
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = 1
+            options.inter_op_num_threads = 1
+            _sessions[path] = ort.InferenceSession(
+                path, options, providers=["CPUExecutionProvider"]
+            )
+        return _sessions[path]
+
+
+class OnnxSileroVAD:
+    """
+    Silero VAD run through onnxruntime instead of torch.
+
+    The ONNX graph takes its recurrent state (and the last samples of the
+    previous frame as context) as inputs, so they live here and the session
+    itself is shared: one OnnxSileroVAD per stream costs a few KB.
+    """
+
+    def __init__(self, path=SILERO_ONNX, sampling_rate=16000):
+        self.session = silero_session(path)
+        self.sampling_rate = sampling_rate
+        self.sr = np.array(sampling_rate, dtype=np.int64)
+        self.context_size = 64 if sampling_rate == 16000 else 32
+        self.reset_states()
+
+    def reset_states(self):
+        self.state = np.zeros((2, 1, 128), dtype=np.float32)
+        self.context = np.zeros((1, self.context_size), dtype=np.float32)
+
+    def score(self, frame):
+        """Speech probability of one float32 frame (512 samples at 16kHz)"""
+        x = np.concatenate((self.context, frame.reshape(1, -1)), axis=1)
+        prob, self.state = self.session.run(
+            None, {"input": x, "state": self.state, "sr": self.sr}
+        )
+        self.context = x[:, -self.context_size :]
+        return float(prob[0, 0])
+
+
+def get_speech_timestamps(
+    audio, model, sampling_rate=16000, threshold=0.5, min_speech_ms=250
+):
+    """
+    get_speech_timestamps of silero-vad's utils for an OnnxSileroVAD and a
+    float32 NumPy array: [{"start": sample, "end": sample}] of the speech in it
+    """
+    vad = StreamingVAD(
+        model,
+        sampling_rate=sampling_rate,
+        threshold=threshold,
+        min_speech_ms=min_speech_ms,
+        min_silence_ms=100,
+    )
+    speech = []
+    for kind, index in vad.process(np.asarray(audio, dtype=np.float32) * 32768.0):
+        if kind == "start":
+            speech.append({"start": index, "end": len(audio)})
+        else:
+            speech[-1]["end"] = index
+    return speech
+
+
+class StreamingVAD:
+    """
+    Frame-by-frame Silero VAD.
+
+    Only the newly arrived audio is scored, the model keeps its recurrent state
+    between calls, and speech start/end events are emitted with hysteresis
+    (a higher threshold to enter speech, a lower one held for a while to leave it).
+    model is either OnnxSileroVAD or the torch.hub Silero model.
+    """
+
+    def __init__(
+        self,
+        model,
+        sampling_rate=16000,
+        threshold=0.5,
+        neg_threshold=None,
+        min_speech_ms=64,
+        min_silence_ms=300,
+    ):
+        self.model = model
+        self.onnx = isinstance(model, OnnxSileroVAD)
+        self.sampling_rate = sampling_rate
+        # Silero expects 512 samples per frame at 16kHz and 256 at 8kHz
+        self.frame_size = 512 if sampling_rate == 16000 else 256
+        self.threshold = threshold
+        self.neg_threshold = (
+            neg_threshold if neg_threshold is not None else max(threshold - 0.15, 0.01)
+        )
+        self.min_speech_samples = int(sampling_rate * min_speech_ms / 1000)
+        self.min_silence_samples = int(sampling_rate * min_silence_ms / 1000)
+        self.reset()
+
+    def reset(self):
+        """Clear the recurrent state, leftover samples and speech flags"""
+        self.model.reset_states()
+        self._residual = np.zeros(0, dtype=np.float32)
+        self.processed = 0  # samples scored since the last reset
+        self.triggered = False
+        self.last_prob = 0.0
+        self._speech_run = 0
+        self._silence_run = 0
+
+    def score_frame(self, frame):
+        """Run the model on a single float32 frame and return its speech probability"""
+        if self.onnx:
+            return self.model.score(frame)
+        import torch
+
+        with torch.no_grad():
+            return self.model(torch.from_numpy(frame), self.sampling_rate).item()
+
+    def process(self, chunk):
+        """
+        Feed a chunk of int16 audio and return the events it produced.
+
+        Events are (kind, sample_index) tuples where kind is "start" or "end" and
+        sample_index counts samples fed since the last reset.
+        """
+        samples = np.concatenate((self._residual, chunk.astype(np.float32) / 32768.0))
+        events = []
+        usable = len(samples) - len(samples) % self.frame_size
+
+        for offset in range(0, usable, self.frame_size):
+            frame = samples[offset : offset + self.frame_size]
+            prob = self.score_frame(frame)
+            self.last_prob = prob
+            self.processed += self.frame_size
+
+            if not self.triggered:
+                if prob >= self.threshold:
+                    self._speech_run += self.frame_size
+                    if self._speech_run >= self.min_speech_samples:
+                        self.triggered = True
+                        self._silence_run = 0
+                        events.append(("start", self.processed - self._speech_run))
+                else:
+                    self._speech_run = 0
+            else:
+                if prob < self.neg_threshold:
+                    self._silence_run += self.frame_size
+                    if self._silence_run >= self.min_silence_samples:
+                        self.triggered = False
+                        self._speech_run = 0
+                        events.append(("end", self.processed - self._silence_run))
+                elif prob >= self.threshold:
+                    self._silence_run = 0
+                # probabilities between the two thresholds keep the current state
+
+        self._residual = samples[usable:].copy()
+        return events
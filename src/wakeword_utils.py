@@ -0,0 +1,335 @@
+import os
+import threading
+from collections import deque
+import numpy as np
+
+CHUNK = 1280  # 80 ms of 16kHz audio, one embedding step
+MEL_CONTEXT = 480  # extra samples in front of a chunk the melspectrogram needs
+MEL_FRAMES = 8  # melspectrogram frames per chunk
+MEL_WINDOW = 76  # melspectrogram frames per embedding
+WARMUP_PREDICTIONS = 5  # first scores after a reset are ignored, like openWakeWord
+
+
+def _resource_model(name):
+    """Path of one of the feature models bundled with openWakeWord"""
+    import openwakeword
+
+    return os.path.join(
+        os.path.dirname(openwakeword.__file__), "resources", "models", name
+    )
+
+
+def _merge_models(paths):
+    """
+    Combine the wakeword models into one ONNX graph with a shared input and a
+    dynamic batch dimension, so every model scores every stream in one call.
+    Needs the optional onnx package, raises ValueError if the models differ.
+    """
+    import onnx
+
+    nodes, initializers, outputs = [], [], []
+    features = None
+    opset, ir_version = None, None
+    for i, path in enumerate(paths):
+        model = onnx.compose.add_prefix(onnx.load(path), prefix=f"m{i}_")
+        if opset is None:
+            opset, ir_version = model.opset_import, model.ir_version
+        elif list(model.opset_import) != list(opset):
+            raise ValueError("wakeword models use different opsets")
+
+        graph_input = model.graph.input[0]
+        shape = [d.dim_value for d in graph_input.type.tensor_type.shape.dim[1:]]
+        if features is None:
+            features = onnx.helper.make_tensor_value_info(
+                "features", graph_input.type.tensor_type.elem_type, ["batch"] + shape
+            )
+            feature_shape = shape
+        elif shape != feature_shape:
+            raise ValueError("wakeword models take different input shapes")
+
+        for node in model.graph.node:
+            node.input[:] = [
+                "features" if name == graph_input.name else name for name in node.input
+            ]
+        nodes.extend(model.graph.node)
+        initializers.extend(model.graph.initializer)
+        output = model.graph.output[0]
+        output.type.tensor_type.shape.dim[0].dim_param = "batch"
+        outputs.append(output)
+
+    graph = onnx.helper.make_graph(
+        nodes, "wakewords", [features], outputs, initializers
+    )
+    merged = onnx.helper.make_model(graph, opset_imports=opset)
+    merged.ir_version = ir_version
+    return merged.SerializeToString()
+
+
+class WakewordStream:
+    """Audio features and detection state of one stream scored by a WakewordEngine"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.reset()
+
+    def reset(self):
+        engine = self.engine
+        self.tail = np.zeros(MEL_CONTEXT, dtype=np.int16)
+        self.mel = np.ones((MEL_WINDOW, 32), dtype=np.float32)
+        self.embeddings = engine.initial_embeddings.copy()
+        # chunks skipped by the energy gate, replayed when it opens again
+        self.gated = deque(maxlen=engine.catchup_chunks)
+        self.samples = 0
+        self.predictions = 0
+        self.scores = {name: 0.0 for name in engine.names}
+        self.above = {name: 0 for name in engine.names}
+        self.last_detection = {name: -np.inf for name in engine.names}
+
+    def predict(self, chunk):
+        """Score one 80 ms int16 chunk, returns the (model, score) detections"""
+        return self.engine.predict(self, chunk)
+
+    def close(self):
+        self.engine.remove_stream(self)
+
+
+class WakewordEngine:
+    """
+    openWakeWord feature pipeline and wakeword models shared by many streams.
+
+    Every call batches all streams with pending audio through the
+    melspectrogram, embedding and wakeword models, each model scoring every
+    stream in the same pass. Chunks below gate_rms skip inference entirely and
+    are replayed through the feature models once audio gets loud again, so the
+    scores then match an ungated run. A model fires when its score stays above
+    its threshold for patience chunks, and not again within refractory_sec.
+    """
+
+    def __init__(
+        self,
+        model_paths,
+        thresholds=0.8,
+        patience=1,
+        refractory_sec=2.0,
+        gate_rms=100.0,
+        catchup_sec=2.0,
+        batch_window_sec=0.005,
+        rate=16000,
+        ncpu=1,
+    ):
+        import onnxruntime as ort
+
+        if isinstance(model_paths, str):
+            model_paths = [model_paths]
+        self.names = [os.path.splitext(os.path.basename(p))[0] for p in model_paths]
+        if isinstance(thresholds, (int, float)):
+            thresholds = [thresholds]
+        if isinstance(thresholds, (list, tuple)) and len(thresholds) == 1:
+            thresholds = list(thresholds) * len(self.names)
+        if isinstance(thresholds, dict):
+            self.thresholds = {name: thresholds.get(name, 0.8) for name in self.names}
+        else:
+            self.thresholds = dict(zip(self.names, thresholds))
+        self.patience = patience
+        self.refractory_samples = int(refractory_sec * rate)
+        self.gate_rms = gate_rms
+        self.catchup_chunks = max(int(catchup_sec * rate / CHUNK), 1)
+        self.batch_window_sec = batch_window_sec
+
+        options = ort.SessionOptions()
+        options.inter_op_num_threads = ncpu
+        options.intra_op_num_threads = ncpu
+        providers = ["CPUExecutionProvider"]
+        self.melspec = ort.InferenceSession(
+            _resource_model("melspectrogram.onnx"), options, providers=providers
+        )
+        self.embedding = ort.InferenceSession(
+            _resource_model("embedding_model.onnx"), options, providers=providers
+        )
+
+        try:
+            merged = ort.InferenceSession(
+                _merge_models(model_paths), options, providers=providers
+            )
+            self.wakeword_sessions = [merged]
+        except (ImportError, ValueError) as e:
+            print(f"Scoring wakeword models separately ({e})")
+            self.wakeword_sessions = [
+                ort.InferenceSession(path, options, providers=providers)
+                for path in model_paths
+            ]
+        self.n_embeddings = self.wakeword_sessions[0].get_inputs()[0].shape[1]
+
+        # openWakeWord starts every stream from the embeddings of quiet noise
+        noise = np.random.default_rng(0).integers(-1000, 1000, rate * 4)
+        self.initial_embeddings = self._clip_embeddings(noise.astype(np.int16))[
+            -self.n_embeddings :
+        ]
+
+        self.streams = set()
+        self.pending = {}
+        self.results = {}
+        self.leader_active = False
+        self.cond = threading.Condition()
+        self.stats = {"chunks": 0, "gated": 0, "batches": 0}
+
+    def add_stream(self):
+        stream = WakewordStream(self)
+        with self.cond:
+            self.streams.add(stream)
+        return stream
+
+    def remove_stream(self, stream):
+        with self.cond:
+            self.streams.discard(stream)
+            self.cond.notify_all()
+
+    def predict(self, stream, chunk):
+        """
+        Score a chunk of one stream. Calls from other streams arriving within
+        batch_window_sec are scored in the same batch by whichever caller came
+        first, the others wait for its results.
+        """
+        with self.cond:
+            self.pending[stream] = chunk
+            while stream not in self.results:
+                if self.leader_active:
+                    self.cond.wait()
+                    continue
+
+                self.leader_active = True
+                self.cond.wait_for(
+                    lambda: len(self.pending) >= len(self.streams),
+                    self.batch_window_sec,
+                )
+                items = list(self.pending.items())
+                self.pending.clear()
+                self.cond.release()
+                try:
+                    results = self.process(items)
+                except Exception as e:
+                    print(f"Error scoring wakewords: {e}")
+                    results = {s: [] for s, _ in items}
+                finally:
+                    self.cond.acquire()
+                    self.leader_active = False
+                self.results.update(results)
+                self.cond.notify_all()
+            return self.results.pop(stream)
+
+    def process(self, items):
+        """Score [(stream, chunk)] in one batch, returns {stream: detections}"""
+        results = {stream: [] for stream, _ in items}
+        active = []
+        for stream, chunk in items:
+            self.stats["chunks"] += 1
+            stream.samples += len(chunk)
+            rms = np.sqrt(np.mean(np.square(chunk, dtype=np.float32)))
+            if rms < self.gate_rms:
+                self.stats["gated"] += 1
+                if len(stream.gated) == stream.gated.maxlen:
+                    # the oldest chunk falls out of the replay window
+                    stream.tail = stream.gated[0][-MEL_CONTEXT:]
+                stream.gated.append(np.array(chunk, dtype=np.int16))
+                for name in self.names:
+                    stream.scores[name] = 0.0
+                    stream.above[name] = 0
+                continue
+            audio = np.concatenate(list(stream.gated) + [chunk]).astype(np.int16)
+            stream.gated.clear()
+            active.append((stream, audio))
+        if not active:
+            return results
+        self.stats["batches"] += 1
+
+        self._update_embeddings(active)
+        features = np.stack([stream.embeddings for stream, _ in active])
+        scores = self._score(features)
+
+        for (stream, _), row in zip(active, scores):
+            stream.predictions += 1
+            for name, score in zip(self.names, row):
+                score = float(score) if stream.predictions > WARMUP_PREDICTIONS else 0.0
+                stream.scores[name] = score
+                if score < self.thresholds[name]:
+                    stream.above[name] = 0
+                    continue
+                stream.above[name] += 1
+                if (
+                    stream.above[name] >= self.patience
+                    and stream.samples - stream.last_detection[name]
+                    >= self.refractory_samples
+                ):
+                    stream.last_detection[name] = stream.samples
+                    results[stream].append((name, score))
+        return results
+
+    def _update_embeddings(self, active):
+        """Append the embeddings of each stream's new audio to its buffer"""
+        # streams replaying gated audio have longer inputs, batch equal lengths
+        by_length = {}
+        for stream, audio in active:
+            by_length.setdefault(len(audio), []).append((stream, audio))
+
+        windows, owners = [], []
+        for length, group in by_length.items():
+            x = np.stack(
+                [np.concatenate((stream.tail, audio)) for stream, audio in group]
+            ).astype(np.float32)
+            spec = self._melspectrogram(x)
+            n_chunks = length // CHUNK
+            for (stream, audio), new_mel in zip(group, spec):
+                mel = np.vstack((stream.mel, new_mel))
+                for i in range(n_chunks - 1, -1, -1):
+                    end = len(mel) - MEL_FRAMES * i
+                    windows.append(mel[end - MEL_WINDOW : end])
+                    owners.append(stream)
+                stream.mel = mel[-MEL_WINDOW:]
+                stream.tail = audio[-MEL_CONTEXT:]
+
+        embeddings = self._embed(np.stack(windows))
+        new = {}
+        for stream, embedding in zip(owners, embeddings):
+            new.setdefault(stream, []).append(embedding)
+        for stream, rows in new.items():
+            stream.embeddings = np.vstack((stream.embeddings, rows))[
+                -self.n_embeddings :
+            ]
+
+    def _melspectrogram(self, x):
+        """(batch, samples) float32 audio -> (batch, frames, 32) features"""
+        out = self.melspec.run(None, {"input": x})[0]
+        return out.reshape(len(x), -1, 32) / 10 + 2
+
+    def _embed(self, windows):
+        """(batch, 76, 32) melspectrogram windows -> (batch, 96) embeddings"""
+        out = self.embedding.run(
+            None, {"input_1": windows[:, :, :, None].astype(np.float32)}
+        )[0]
+        return out.reshape(len(windows), -1)
+
+    def _clip_embeddings(self, audio):
+        spec = self._melspectrogram(audio[None].astype(np.float32))[0]
+        windows = [
+            spec[i : i + MEL_WINDOW] for i in range(0, len(spec) - MEL_WINDOW + 1, 8)
+        ]
+        return self._embed(np.stack(windows))
+
+    def _score(self, features):
+        """(batch, n_embeddings, 96) features -> (batch, n_models) scores"""
+        features = features.astype(np.float32)
+        columns = []
+        for session in self.wakeword_sessions:
+            name = session.get_inputs()[0].name
+            if isinstance(session.get_inputs()[0].shape[0], int):
+                # fixed batch of 1, score the streams one by one
+                outputs = [
+                    np.concatenate(session.run(None, {name: row[None]}), axis=1)
+                    for row in features
+                ]
+                columns.append(np.concatenate(outputs, axis=0))
+            else:
+                columns.append(
+                    np.concatenate(session.run(None, {name: features}), axis=1)
+                )
+        return np.concatenate(columns, axis=1)